@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Benchmarks of the chord training internals (no GUI needed, except for 'startup')
+'''
+
+import cProfile
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from chord import Chord
+from score import Score
+from theory import circleOfFifths, chordTones
+
+def IsRegexFunction(function):
+    """ Whether a profiler entry (file, line, name) belongs to the re module """
+    (filename, line, name) = function
+    return os.path.basename(filename) in ['re.py', 'sre_compile.py', 'sre_parse.py'] or \
+    '_sre' in name or 're.Pattern' in name
+
+def GenerateCatalogue(score, scoreRes):
+    """ Write the .ly files of all chords and of their scales """
+    for pitch in circleOfFifths:
+        for quality in chordTones:
+            chord = Chord(pitch, quality)
+            score.GenerateImage(chord, scoreRes, True, True)
+            score.GenerateScaleImage(chord, scoreRes, True, True)
+
+def BenchmarkLyGeneration(repeat=20):
+    """ Time the generation of the .ly files of the whole catalogue (lilypond is not called) """
+    directory = tempfile.mkdtemp()
+    scoreRes = 100
+    os.mkdir(os.path.join(directory, "res%d" % scoreRes))
+    score = Score(directory)
+    score.CallLilypond = lambda lyfile, scoreRes, singleThread = False: None
+
+    try:
+        start = time.time()
+        for index in range(repeat):
+            GenerateCatalogue(score, scoreRes)
+        elapsed = time.time() - start
+
+        profile = cProfile.Profile()
+        profile.enable()
+        for index in range(repeat):
+            GenerateCatalogue(score, scoreRes)
+        profile.disable()
+    finally:
+        shutil.rmtree(directory)
+
+    stats = pstats.Stats(profile)
+    total = sum(entry[2] for entry in stats.stats.values())
+    regex = sum(stats.stats[function][2] for function in stats.stats if IsRegexFunction(function))
+
+    nbFiles = 2 * len(circleOfFifths) * len(chordTones)
+    print("Catalogue .ly generation: %.2f ms per catalogue (%d files)" % (elapsed / repeat * 1000., nbFiles))
+    print("Time spent in regular expressions (profiled): %.1f%%" % (100. * regex / total))
+
+def BenchmarkSpelling(repeat=100000):
+    """ Time the conversion of the pitch names to lilypond """
+    chord = Chord('Bb', '7')
+    start = time.time()
+    for index in range(repeat):
+        chord.GetLyPitch()
+    elapsed = time.time() - start
+    print("Lilypond pitch name lookup: %.3f us per call" % (elapsed / repeat * 1e6))
+
+def BenchmarkStartup(repeat=5):
+    """ Time from the start of the program to the display of the first chord (needs wx and a display) """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chordTraining.py")
+    durations = []
+    for index in range(repeat):
+        output = subprocess.Popen([sys.executable, script, "--benchmark-startup"], stdout=subprocess.PIPE).communicate()[0]
+        for line in output.decode().splitlines():
+            if line.startswith("First chord displayed after"):
+                durations.append(float(line.split()[-2]))
+    if len(durations) == 0:
+        print("Time to the first chord: the program did not start")
+        return
+
+    durations.sort()
+    print("Time to the first chord: %.1f ms median, %.1f ms best (%d runs)" % \
+          (durations[len(durations) // 2], durations[0], len(durations)))
+
+def main():
+    benchmarks = {'ly': BenchmarkLyGeneration, 'spelling': BenchmarkSpelling, 'startup': BenchmarkStartup}
+    names = sys.argv[1:]
+    if len(names) == 0:
+        # The benchmarks needing a display are only run on demand
+        names = sorted(name for name in benchmarks.keys() if name != 'startup')
+    for name in names:
+        benchmarks[name]()
+
+if __name__ == '__main__':
+    main()
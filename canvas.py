@@ -0,0 +1,200 @@
+import wx
+
+class CanvasText():
+    """ Text drawn by the canvas, with the setters of wx.StaticText """
+    def __init__(self, canvas, label=""):
+        self.canvas = canvas
+        self.label = label
+        self.font = canvas.GetFont()
+        self.colour = wx.BLACK
+        # Area of the canvas where the text is drawn
+        self.rect = wx.Rect(0, 0, 0, 0)
+
+    def SetLabel(self, label):
+        if label != self.label:
+            self.label = label
+            self.canvas.RefreshItem(self)
+
+    def SetFont(self, font):
+        self.font = font
+        # The height of the rows depends on the fonts
+        self.canvas.UpdateLayout()
+
+    def SetForegroundColour(self, colour):
+        self.colour = colour
+        self.canvas.RefreshItem(self)
+
+    def Draw(self, dc):
+        dc.SetFont(self.font)
+        dc.SetTextForeground(self.colour)
+        dc.DrawText(self.label, self.rect.x, self.rect.y)
+
+
+class CanvasBitmap():
+    """ Bitmap drawn by the canvas, with the setters of wx.StaticBitmap """
+    def __init__(self, canvas, bitmap):
+        self.canvas = canvas
+        self.bitmap = bitmap
+        self.rect = wx.Rect(0, 0, 0, 0)
+
+    def SetBitmap(self, bitmap):
+        self.bitmap = bitmap
+        # The area of the bitmap may not be large enough anymore
+        if bitmap.GetWidth() > self.rect.width or bitmap.GetHeight() > self.rect.height:
+            self.canvas.UpdateLayout()
+        else:
+            self.canvas.RefreshItem(self)
+
+    def Draw(self, dc):
+        dc.DrawBitmap(self.bitmap, self.rect.x, self.rect.y, True)
+
+
+class CanvasGauge():
+    """ Progress bar drawn by the canvas, with the setters of wx.Gauge """
+    height = 16
+
+    def __init__(self, canvas, range):
+        self.canvas = canvas
+        self.range = range
+        self.value = 0
+        self.rect = wx.Rect(0, 0, 0, 0)
+
+    def SetRange(self, range):
+        self.range = range
+        self.canvas.RefreshItem(self)
+
+    def SetValue(self, value):
+        if value != self.value:
+            self.value = value
+            self.canvas.RefreshItem(self)
+
+    def GetSize(self):
+        return self.rect.GetSize()
+
+    def Draw(self, dc):
+        dc.SetPen(wx.GREY_PEN)
+        dc.SetBrush(wx.WHITE_BRUSH)
+        dc.DrawRectangle(self.rect.x, self.rect.y, self.rect.width, self.rect.height)
+        width = (self.rect.width - 2) * min(self.value, self.range) // max(1, self.range)
+        if width > 0:
+            dc.SetPen(wx.TRANSPARENT_PEN)
+            dc.SetBrush(self.canvas.gaugeBrush)
+            dc.DrawRectangle(self.rect.x + 1, self.rect.y + 1, width, self.rect.height - 2)
+
+
+class TrainingCanvas(wx.Panel):
+    """ Single window drawing the whole training display (chord names, time gauge,
+    scores, scale name and status) in one double-buffered paint pass
+
+    It replaces the text, gauge and image widgets of the default layout: its
+    items offer the same setters, so that the frame drives both layouts alike.
+    Only the area of the items that changed gets repainted.
+    """
+    border = 10
+
+    def __init__(self, parent, hSpacerLength, vSpacerLength, gaugeRange):
+        wx.Panel.__init__(self, parent, -1)
+        # All the drawing is done in the paint handler, on a buffer
+        self.SetBackgroundStyle(wx.BG_STYLE_CUSTOM)
+        self.SetBackgroundColour(wx.WHITE)
+        self.gaugeBrush = wx.Brush(wx.SystemSettings.GetColour(wx.SYS_COLOUR_HIGHLIGHT))
+
+        self.hSpacerLength = hSpacerLength
+        self.vSpacerLength = vSpacerLength
+        # Size reserved for the largest chord and scale scores
+        self.chordImageSize = (5, 5)
+        self.scaleImageSize = (5, 5)
+        # Text extents already measured, by (text, font)
+        self.extents = {}
+
+        emptyBitmap = wx.EmptyImage(5, 5).ConvertToBitmap()
+        self.prevChord = CanvasText(self, "Prev")
+        self.chord = CanvasText(self, "Chord")
+        self.nextChord = CanvasText(self, "Next")
+        self.timeGauge = CanvasGauge(self, gaugeRange)
+        self.chordImage = CanvasBitmap(self, emptyBitmap)
+        self.scaleTitle = CanvasText(self, "Scale:")
+        self.scale = CanvasText(self, "")
+        self.scaleImage = CanvasBitmap(self, emptyBitmap)
+        self.status = CanvasText(self, "")
+        self.items = [self.prevChord, self.chord, self.nextChord, self.timeGauge, self.chordImage, \
+                      self.scaleTitle, self.scale, self.scaleImage, self.status]
+
+        self.Bind(wx.EVT_PAINT, self.OnPaint)
+        self.Bind(wx.EVT_SIZE, self.OnSize)
+
+    def GetTextExtent(self, text, font):
+        # The fonts of the display only differ by their size
+        key = (text, font.GetPointSize())
+        extent = self.extents.get(key)
+        if extent is None:
+            (width, height, descent, leading) = self.GetFullTextExtent(text, font)
+            extent = (width, height)
+            self.extents[key] = extent
+
+        return extent
+
+    def GetLineHeight(self, items):
+        return max(self.GetTextExtent("Ag", item.font)[1] for item in items)
+
+    def SetImageSizes(self, chordImageSize, scaleImageSize):
+        """ Reserve room for scores of the given sizes """
+        self.chordImageSize = chordImageSize
+        self.scaleImageSize = scaleImageSize
+        self.UpdateLayout()
+
+    def PlaceRow(self, items, weights, y, width):
+        """ Place text items side by side, sharing the width according to their weights """
+        x = 0
+        height = self.GetLineHeight(items)
+        for (item, weight) in zip(items, weights):
+            cellWidth = width * weight // sum(weights)
+            item.rect = wx.Rect(x + self.border, y + self.border, cellWidth - 2 * self.border, height)
+            x += cellWidth
+
+        return y + height + 2 * self.border
+
+    def PlaceImage(self, item, size, y):
+        x = self.hSpacerLength + 2 * self.border
+        width = max(size[0], item.bitmap.GetWidth())
+        height = max(size[1], item.bitmap.GetHeight())
+        item.rect = wx.Rect(x, y + self.border, width, height)
+
+        return y + height + 2 * self.border
+
+    def UpdateLayout(self):
+        """ Compute the area of each item and the minimal size of the canvas """
+        margin = 2 * (self.hSpacerLength + 2 * self.border)
+        minWidth = margin + max(self.chordImageSize[0], self.scaleImageSize[0], \
+                                self.chordImage.bitmap.GetWidth(), self.scaleImage.bitmap.GetWidth())
+        width = max(minWidth, self.GetClientSize().width)
+
+        y = self.PlaceRow([self.prevChord, self.chord, self.nextChord], [1, 2, 1], 0, width)
+        self.timeGauge.rect = wx.Rect(margin // 2, y + self.border, width - margin, CanvasGauge.height)
+        y += CanvasGauge.height + 2 * self.border + self.vSpacerLength
+        y = self.PlaceImage(self.chordImage, self.chordImageSize, y) + self.vSpacerLength
+        y += self.vSpacerLength
+        y = self.PlaceRow([self.scaleTitle, self.scale], [1, 3], y, width) + self.vSpacerLength
+        y = self.PlaceImage(self.scaleImage, self.scaleImageSize, y) + self.vSpacerLength
+        y = self.PlaceRow([self.status], [1], y, width)
+
+        self.SetMinSize(wx.Size(minWidth, y))
+        self.Refresh(False)
+
+    def RefreshItem(self, item):
+        self.RefreshRect(item.rect, False)
+
+    def OnSize(self, evt):
+        self.UpdateLayout()
+        evt.Skip()
+
+    def OnPaint(self, evt):
+        dc = wx.BufferedPaintDC(self)
+        dc.SetBackground(wx.WHITE_BRUSH)
+        dc.Clear()
+
+        # Skip the items outside of the area to repaint
+        region = self.GetUpdateRegion()
+        for item in self.items:
+            if region.ContainsRect(item.rect) != wx.OutRegion:
+                item.Draw(dc)
@@ -1,20 +1,16 @@
-import re
 import random
 import os
+import collections
+import itertools
+
+from sampler import WeightedSampler
+import theory
+import spelling
+from quality import GetSymbol
+from progression import progressions, ChordEvent
 
 class Conversion:
     def __init__(self):
-        # Quality names for output in the GUI
-        self.qualityNames = {}
-        self.qualityNames['min7'] = "-7"
-        self.qualityNames['7'] = "7"
-        self.qualityNames['Maj7'] = u'\u25B3'
-        self.qualityNames['minMaj7'] = u'-\u25B3'
-        self.qualityNames['alt'] = "alt"
-        self.qualityNames['min7b5'] = u'\u2300' #u'\u00F8'
-        self.qualityNames['dim7'] = "dim"
-        self.qualityNames['7b9'] = u'7\u266D9'
-
         # Pitch names for output in the GUI
         self.pitchNames = {}
         self.pitchNames['C'] = "C "
@@ -31,10 +27,8 @@ class Conversion:
         self.pitchNames['G'] = "G "
 
     def GetQualityName(self, quality):
-        if quality not in self.qualityNames:
-            return quality
-        
-        return self.qualityNames[quality]
+        # Quality names for output in the GUI are defined in the quality registry
+        return GetSymbol(quality)
 
     def GetPitchName(self, pitch):
         if pitch not in self.pitchNames:
@@ -43,12 +37,14 @@ class Conversion:
         return self.pitchNames[pitch]
 
 class Chord:
-    def __init__(self, pitch = '-', quality = '-', mode = '-'):
+    def __init__(self, pitch = '-', quality = '-', mode = '-', key = None, last = True):
         self.pitch = pitch
         self.quality = quality
         self.mode = mode
-        
-        self.pitches = ['C', 'F', 'Bb', 'Eb', 'Ab', 'Db', 'F#', 'B', 'E', 'A', 'D', 'G']
+        # Key (pitch, quality) of the progression the chord belongs to (None: unknown)
+        self.key = key
+        # Whether the chord ends its progression
+        self.last = last
     
         self.name = None
         self.fileName = None
@@ -56,6 +52,8 @@ class Chord:
         self.scaleKind = None
         self.scaleFileName = None
         self.updateScale = True
+        # Voicing displayed for the chord (None: the standard voicings)
+        self.voicing = None
         
         self.conv = Conversion()
         
@@ -74,23 +72,8 @@ class Chord:
     def GetPitch(self):
         return self.pitch
     
-    def GetPreviousPitchAlongCircleOfFifths(self):
-        index = self.pitches.index(self.pitch)
-        prevIndex = index - 1
-        
-        return self.pitches[prevIndex]
-        
-    def GetNextPitchAlongCircleOfFifths(self):
-        index = self.pitches.index(self.pitch)
-        nextIndex = (index + 1) % len(self.pitches)
-        
-        return self.pitches[nextIndex]
-        
     def ConvertToLy(self, pitch):
-        lyPitch = pitch
-        lyPitch = re.sub(r"(.)b", r"\1f", lyPitch)
-        lyPitch = re.sub(r"(.)#", r"\1s", lyPitch)
-        return lyPitch
+        return spelling.ConvertToLy(pitch)
     
     def GetLyPitch(self):
         return self.ConvertToLy(self.pitch)
@@ -112,29 +95,19 @@ class Chord:
     
     def GetMode(self):
         return self.mode
-    
-    def GenerateRandom(self, listPitches, listQualities, currentMode, chordToAvoid=None):
-        self.SetMode(currentMode)
-        
-        if len(listPitches) == 0 or len(listQualities) == 0:
-            self.SetPitch("-")
-            self.SetQuality("-")
-            return
 
-        suitableChord = False
-        while not suitableChord:
-            pitch = random.choice(listPitches)
-            self.SetPitch(pitch)
-            
-            quality = random.choice(listQualities)
-            self.SetQuality(quality)
-            
-            if len(listPitches) * len(listQualities) < 2 or \
-            self.GetName() != chordToAvoid:
-                suitableChord = True            
-            
-        self.updateScale = True
+    def GetKey(self):
+        return self.key
+
+    def IsLast(self):
+        return self.last
+    
+    def SetVoicing(self, voicing):
+        self.voicing = voicing
 
+    def GetVoicing(self):
+        return self.voicing
+    
     def GetName(self):
         self.name = self.conv.GetPitchName(self.pitch) + self.conv.GetQualityName(self.quality)
             
@@ -145,53 +118,10 @@ class Chord:
             return
         self.updateScale = False
         
-        if self.quality == 'Maj7' or self.quality == '7' or self.quality == 'min7':
-            if self.quality == 'Maj7':
-                self.scalePitch = self.pitch
-                self.scaleKind = "Major"
-            elif self.quality == '7':
-                indexVpitch = self.pitches.index(self.pitch)
-                indexPitch = indexVpitch + 1
-                if indexPitch >= len(self.pitches): 
-                    indexPitch -= len(self.pitches)
-                self.scalePitch = self.pitches[indexPitch]
-                self.scaleKind = "Major"
-            elif self.quality == 'min7':
-                indexIIpitch = self.pitches.index(self.pitch)
-                indexPitch = indexIIpitch + 2
-                if indexPitch >= len(self.pitches): 
-                    indexPitch -= len(self.pitches)
-                self.scalePitch = self.pitches[indexPitch]
-                self.scaleKind = "Major"
-        elif self.quality == 'minMaj7' or self.quality == 'alt' or self.quality == 'min7b5':
-            if self.quality == 'minMaj7':
-                self.scalePitch = self.pitch
-                self.scaleKind = "Minor"
-            elif self.quality == 'alt':
-                indexVpitch = self.pitches.index(self.pitch)
-                indexPitch = indexVpitch + 5 
-                if indexPitch >= len(self.pitches): 
-                    indexPitch -= len(self.pitches)
-                self.scalePitch = self.pitches[indexPitch]
-                self.scaleKind = "Minor"
-            elif self.quality == 'min7b5':
-                indexIIpitch = self.pitches.index(self.pitch)
-                indexPitch = indexIIpitch + 3
-                if indexPitch >= len(self.pitches): 
-                    indexPitch -= len(self.pitches)
-                self.scalePitch = self.pitches[indexPitch]
-                self.scaleKind = "Minor"
-        elif (self.quality == 'dim7'):
-            index = self.pitches.index(self.pitch) % 3
-            self.scalePitch = self.pitches[index]
-            self.scaleKind = "Diminished"
-        elif (self.quality == '7b9'):
-            indexPitch = self.pitches.index(self.pitch) + 2
-            if indexPitch >= len(self.pitches): 
-                indexPitch -= len(self.pitches)
-            indexPitch = indexPitch % 3
-            self.scalePitch = self.pitches[indexPitch]
-            self.scaleKind = "Diminished"
+        # Look up the scale in the precomputed chord/scale table
+        scale = theory.GetScale(self.pitch, self.quality)
+        if scale is not None:
+            (self.scalePitch, self.scaleKind) = scale
         else:
             self.scaleKind = "-"
             self.scalePitch = self.pitch if self.pitch is not None else "-"
@@ -206,7 +136,11 @@ class Chord:
         return self.conv.GetPitchName(self.scalePitch) + " " + self.scaleKind
 
     def GetBaseFileName(self):
-        self.fileName = os.path.join("res%s", "chord_" + self.GetLyPitch() + "_" + self.GetQuality() + "%s")
+        baseName = "chord_" + self.GetLyPitch() + "_" + self.GetQuality()
+        if self.voicing is not None:
+            # One image per voicing
+            baseName += "_" + "_".join(str(semitone) for semitone in self.voicing.semitones)
+        self.fileName = os.path.join("res%s", baseName + "%s")
         
         return self.fileName
 
@@ -230,8 +164,90 @@ class Chord:
         return self.GetBaseScaleFileName() % (str(res), '.ly')
 
 
+class ChordStream():
+    """ Infinite lazy iterator of chord events for a given pitch set, quality set and mode """
+    def __init__(self, listPitches, listQualities, currentMode, rng=random, pitchWeights=None, qualityWeights=None, \
+                 scheduler=None, progression=None):
+        self.listPitches = list(listPitches)
+        self.listQualities = list(listQualities)
+        self.mode = currentMode
+        # Random number generator (any object providing random() and choice())
+        self.rng = rng
+        # Definition of the progression generated (restricted to the selection of this stream)
+        if progression is None:
+            progression = progressions[currentMode].GetInstance()
+        self.progression = progression
+
+        # Samplers for the keys of the progressions (weights default to 1)
+        self.pitchSampler = WeightedSampler(self.listPitches, pitchWeights)
+        if self.progression.HasFreeQuality():
+            self.qualitySampler = WeightedSampler(self.listQualities, qualityWeights)
+        else:
+            self.qualitySampler = WeightedSampler([self.progression.keyQuality])
+
+        self.progression.SetSelection(self.listPitches, self.qualitySampler.items)
+
+        # Spaced repetition scheduler picking the keys instead of the samplers
+        self.scheduler = scheduler
+        if self.scheduler is not None:
+            self.scheduler.SetSelection(self.listPitches, self.qualitySampler.items, self.mode)
+
+    def GetParameters(self):
+        return (self.listPitches, self.listQualities, self.mode)
+
+    def SetWeights(self, pitchWeights, qualityWeights):
+        """ Change the weights of the pitches and qualities for the chords still to be drawn """
+        for pitch in self.listPitches:
+            self.pitchSampler.SetWeight(pitch, pitchWeights.get(pitch, 1.))
+        if self.progression.HasFreeQuality():
+            for quality in self.listQualities:
+                self.qualitySampler.SetWeight(quality, qualityWeights.get(quality, 1.))
+
+    def DrawKey(self, keys):
+        """ Draw the key of the next progression (pitch and quality) """
+        if self.scheduler is not None:
+            (pitch, quality, mode) = self.scheduler.Pick()
+            return (pitch, quality)
+
+        # Key determined by the previous one (e.g. Markov chain)
+        if len(keys) > 0:
+            key = self.progression.NextKey(keys[-1], self.rng)
+            if key is not None:
+                return key
+
+        # Avoid generating the same key too many times in a row
+        keyToAvoid = None
+        if self.progression.avoid > 0 and len(keys) == self.progression.avoid and \
+        keys.count(keys[0]) == len(keys):
+            keyToAvoid = keys[0]
+
+        while True:
+            pitch = self.pitchSampler.Draw(self.rng)
+            quality = self.qualitySampler.Draw(self.rng)
+            if self.pitchSampler.GetNbCandidates() * self.qualitySampler.GetNbCandidates() < 2 or \
+            (pitch, quality) != keyToAvoid:
+                return (pitch, quality)
+
+    def __iter__(self):
+        # The qualities only matter when not set by the progression
+        if len(self.listPitches) == 0 or len(self.qualitySampler) == 0:
+            nbSteps = len(self.progression.steps)
+            while True:
+                for step in range(nbSteps):
+                    yield ChordEvent('-', '-', self.mode, None, step == nbSteps - 1)
+
+        # Last keys drawn
+        keys = collections.deque(maxlen=max(1, self.progression.avoid))
+        while True:
+            (pitch, quality) = self.DrawKey(keys)
+            keys.append((pitch, quality))
+
+            for event in self.progression.Generate(pitch, quality):
+                yield event
+
+
 class ChordStack():
-    def __init__(self):
+    def __init__(self, seed=None):
         # Number of previous and next items in the stack
         self.nbFurtherItems = 10
         # Total number of elements
@@ -242,87 +258,176 @@ class ChordStack():
         self.elements = []
         # Dummy Chord object to return when at end of stack
         self.dummy = Chord()
-        
-    def LookForChordToAvoid(self, indices, convertVtoI=False):
-        """ Check whether the same chord has been generated twice in a row already """
-        if len(indices) != 2:
+        # Seed of the random number generator owned by the stack
+        if seed is None:
+            seed = random.SystemRandom().randint(0, 2**31 - 1)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # Source of new chords and the iterator currently drawn from
+        self.stream = None
+        self.events = None
+        # Number of chord events drawn from the streams so far
+        self.drawn = 0
+        # Position in the streams of each element of the stack
+        self.drawnIndices = []
+        # Spaced repetition scheduler (None: random selection)
+        self.scheduler = None
+        # Relative frequencies of the pitches and qualities (default: 1)
+        self.pitchWeights = {}
+        self.qualityWeights = {}
+        # Definitions in use, as (drawn, listPitches, listQualities, currentMode,
+        # pitchWeights, qualityWeights) for each change of the stream
+        self.segments = []
+        # Optimiser of the voicings of the elements (None: standard voicings)
+        self.voiceLeading = None
+        # Progression of each mode used by the streams, kept so as to update
+        # their selection rather than start from scratch
+        self.progressions = {}
+
+    def RecordSegment(self):
+        self.segments.append((self.drawn,) + self.stream.GetParameters() + \
+                             (dict(self.pitchWeights), dict(self.qualityWeights)))
+
+    def RenewStream(self, listPitches, listQualities, currentMode):
+        """ Start drawing chords according to new definitions """
+        if currentMode not in self.progressions:
+            self.progressions[currentMode] = progressions[currentMode].GetInstance()
+        self.stream = ChordStream(listPitches, listQualities, currentMode, self.rng, \
+                                  self.pitchWeights, self.qualityWeights, self.scheduler, \
+                                  self.progressions[currentMode])
+        self.events = iter(self.stream)
+        self.RecordSegment()
+
+    def SetScheduler(self, scheduler):
+        """ Pick the chords still to be drawn with a spaced repetition scheduler (None: at random) """
+        if scheduler is self.scheduler:
+            return
+
+        self.scheduler = scheduler
+        # Renew the stream on the next draw
+        self.stream = None
+
+    def SetWeights(self, pitchWeights, qualityWeights):
+        """ Set the relative frequencies of pitches and qualities for the chords still to be drawn """
+        if dict(pitchWeights) == self.pitchWeights and dict(qualityWeights) == self.qualityWeights:
+            return
+
+        self.pitchWeights = dict(pitchWeights)
+        self.qualityWeights = dict(qualityWeights)
+        if self.stream is not None:
+            self.stream.SetWeights(self.pitchWeights, self.qualityWeights)
+            self.RecordSegment()
+
+    def SetVoiceLeading(self, voiceLeading):
+        """ Choose the voicings of the elements with a VoiceLeading optimiser (None: standard voicings) """
+        if voiceLeading is self.voiceLeading:
+            return
+
+        self.voiceLeading = voiceLeading
+        for element in self.elements:
+            element.SetVoicing(None)
+        if self.voiceLeading is not None:
+            self.voiceLeading.Truncate(0)
+            for element in self.elements:
+                self.AppendVoicing(element.GetPitch(), element.GetQuality())
+
+    def AppendVoicing(self, pitch, quality):
+        # Voicings spelled as the key signature of the chord
+        self.voiceLeading.Append(pitch, quality, spelling.GetChordSpelling(pitch, quality).enharmonic)
+
+    def GetCurrentVoicing(self):
+        """ Return the voicing of the current chord, kept from now on (None: standard voicings) """
+        if self.voiceLeading is None or self.curr >= len(self.elements):
             return None
-        
-        maxIndex = 0
-        for index in indices:
-            maxIndex = max(maxIndex, abs(index))
-            
-        if len(self.elements) >= maxIndex:
-            prevChord = self.elements[indices[0]].GetName()
-            if self.elements[indices[1]].GetName() == prevChord:
-                if convertVtoI:
-                    # Return the corresponding major chord instead
-                    Vchord = self.elements[indices[0]]
-                    pitch = self.elements[indices[0]].GetNextPitchAlongCircleOfFifths()
-                    IchordName = Vchord.conv.GetPitchName(pitch) + Vchord.conv.GetQualityName("Maj7")
-                    return IchordName
-                else:
-                    return prevChord
-            
-        return None
-        
+
+        current = self.elements[self.curr]
+        if current.GetVoicing() is None:
+            voicing = self.voiceLeading.GetVoicing(self.curr)
+            if voicing is not None:
+                self.voiceLeading.Pin(self.curr, voicing)
+                current.SetVoicing(voicing)
+
+        return current.GetVoicing()
+
+    def GetStream(self, listPitches, listQualities, currentMode):
+        """ Return the chord event iterator, renewed in case the definitions changed """
+        if self.stream is None or \
+        self.stream.GetParameters() != (list(listPitches), list(listQualities), currentMode):
+            self.RenewStream(listPitches, listQualities, currentMode)
+
+        return self.events
+
     def AddElement(self, listPitches, listQualities, currentMode):
-        """ Add one or more items to the stack """
-        if currentMode == 'Chord':
-            chordToAvoid = self.LookForChordToAvoid([-1, -2])
-            
-            self.elements.append(Chord())
-            self.elements[-1].GenerateRandom(listPitches, listQualities, currentMode, chordToAvoid)
-            
-        elif currentMode == 'II-V-I':
-            chordToAvoid = self.LookForChordToAvoid([-3, -6])
+        """ Add one progression (one or more items) to the stack """
+        events = self.GetStream(listPitches, listQualities, currentMode)
+        for event in events:
+            self.elements.append(Chord(event.pitch, event.quality, event.mode, event.key, event.last))
+            self.drawnIndices.append(self.drawn)
+            self.drawn += 1
+            if self.voiceLeading is not None:
+                self.AppendVoicing(event.pitch, event.quality)
+            if event.last:
+                break
 
-            self.elements.append(Chord())
-            self.elements.append(Chord())
-            self.elements.append(Chord())
-            
-            self.elements[-1].GenerateRandom(listPitches, ['Maj7'], currentMode, chordToAvoid)
-            
-            pitchV = self.elements[-1].GetPreviousPitchAlongCircleOfFifths()            
-            self.elements[-2].SetPitch(pitchV)
-            self.elements[-2].SetQuality('7')
-            self.elements[-2].SetMode(currentMode)
-            
-            pitchII = self.elements[-2].GetPreviousPitchAlongCircleOfFifths()
-            self.elements[-3].SetPitch(pitchII)
-            self.elements[-3].SetQuality('min7')
-            self.elements[-3].SetMode(currentMode)
-
-        elif currentMode == 'II-V':
-            chordToAvoid = self.LookForChordToAvoid([-1, -3], convertVtoI=True)
-
-            self.elements.append(Chord())
-            self.elements.append(Chord())
-           
-            self.elements[-1].GenerateRandom(listPitches, ['Maj7'], currentMode, chordToAvoid)
-            
-            pitchV = self.elements[-1].GetPreviousPitchAlongCircleOfFifths()
-            self.elements[-1].SetPitch(pitchV)
-            self.elements[-1].SetQuality('7')
-            self.elements[-1].SetMode(currentMode)
-            
-            pitchII = self.elements[-1].GetPreviousPitchAlongCircleOfFifths()
-            self.elements[-2].SetPitch(pitchII)
-            self.elements[-2].SetQuality('min7')
-            self.elements[-2].SetMode(currentMode)
- 
-        elif currentMode == 'V-I':
-            chordToAvoid = self.LookForChordToAvoid([-1, -3])
-
-            self.elements.append(Chord())
-            self.elements.append(Chord())
-           
-            self.elements[-1].GenerateRandom(listPitches, ['Maj7'], currentMode, chordToAvoid)
-            
-            pitchV = self.elements[-1].GetPreviousPitchAlongCircleOfFifths()
-            self.elements[-2].SetPitch(pitchV)
-            self.elements[-2].SetQuality('7')
-            self.elements[-2].SetMode(currentMode)
+    def GetSession(self):
+        """ Return the data needed to regenerate the stack in its current state
+        (chords picked by a spaced repetition scheduler cannot be regenerated) """
+        return (self.seed, list(self.segments), self.drawn, list(self.drawnIndices), self.curr)
+
+    @classmethod
+    def FromSession(cls, session):
+        """ Regenerate a stack from the output of GetSession by fast-forwarding its streams """
+        (seed, segments, drawn, drawnIndices, curr) = session
+        stack = cls(seed)
+
+        # Only the chords still in the stack are turned into Chord objects
+        kept = set(drawnIndices)
+        for index in range(len(segments)):
+            (start, listPitches, listQualities, currentMode, pitchWeights, qualityWeights) = segments[index]
+            if index + 1 < len(segments):
+                end = segments[index + 1][0]
+            else:
+                end = drawn
+            if stack.stream is not None and \
+            stack.stream.GetParameters() == (listPitches, listQualities, currentMode):
+                stack.SetWeights(pitchWeights, qualityWeights)
+            else:
+                stack.pitchWeights = dict(pitchWeights)
+                stack.qualityWeights = dict(qualityWeights)
+                stack.RenewStream(listPitches, listQualities, currentMode)
+
+            for event in itertools.islice(stack.events, end - start):
+                if stack.drawn in kept:
+                    stack.elements.append(Chord(event.pitch, event.quality, event.mode, event.key, event.last))
+                    stack.drawnIndices.append(stack.drawn)
+                stack.drawn += 1
+
+        stack.curr = curr
+        return stack
+
+    def GetSnapshot(self):
+        """ Return the state of the stack, restored by FromSnapshot without regenerating the chords
+        (the chords drawn afterwards start a new stream from the saved random generator state) """
+        return {'seed': self.seed, 'curr': self.curr, 'drawn': self.drawn, \
+                'chords': [(element.GetPitch(), element.GetQuality(), element.GetMode(), element.GetKey(), element.IsLast()) \
+                           for element in self.elements], \
+                'drawnIndices': list(self.drawnIndices), 'segments': list(self.segments), \
+                'rng': self.rng.getstate()}
+
+    @classmethod
+    def FromSnapshot(cls, snapshot):
+        """ Restore a stack from the output of GetSnapshot (possibly read back from JSON) """
+        stack = cls(snapshot['seed'])
+        stack.elements = [Chord(str(pitch), str(quality), str(mode), None if key is None else (str(key[0]), str(key[1])), last) \
+                          for (pitch, quality, mode, key, last) in snapshot['chords']]
+        stack.drawnIndices = list(snapshot['drawnIndices'])
+        stack.drawn = snapshot['drawn']
+        stack.segments = [tuple(segment) for segment in snapshot['segments']]
+        stack.curr = snapshot['curr']
+        (version, internalState, gaussNext) = snapshot['rng']
+        stack.rng.setstate((version, tuple(internalState), gaussNext))
+
+        return stack
 
     def Initialize(self, listPitches, listQualities, currentMode):
         """ Allocate items according to the current definitions """
@@ -365,7 +470,10 @@ class ChordStack():
             # Prune the chord list (keep the last nbElements)
             nbElementsOld = len(self.elements)
             self.elements = self.elements[-self.nbElements:]
+            self.drawnIndices = self.drawnIndices[-self.nbElements:]
             nbElementsNew = len(self.elements)
+            if self.voiceLeading is not None:
+                self.voiceLeading.DropFirst(nbElementsOld - nbElementsNew)
             
             # Adjust the index of the current chord
             self.curr -= nbElementsOld - nbElementsNew - 1
@@ -374,6 +482,9 @@ class ChordStack():
         """ Redefine elements up the list in case of a change in properties """
         # Remove the last elements in the list up to the next chord
         del self.elements[self.curr + 1:]
+        del self.drawnIndices[self.curr + 1:]
+        if self.voiceLeading is not None:
+            self.voiceLeading.Truncate(self.curr + 1)
         # Add new elements conforming to the new prescriptions
         self.UpdateStack(listPitches, listQualities, currentMode, recreating=True)
 
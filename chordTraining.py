@@ -6,78 +6,64 @@ Random chord generator to train with jazz voicings
 TV 2013-07-28
 '''
 
+import time
+# Start of the program (for the time to the first chord)
+startTime = time.time()
+
 import wx
 import collections
 import os
+import platform
+import sys
+import threading
 
 from stayon import StayOn
-from score import Score
 from settings import Settings
-from chord import Chord, ChordStack, Conversion
-
-# Exception thrown when no image may be determined for the score of a chord/progression
-class NoImage(Exception):
-	def __init__(self):
-	    pass
+from chord import Chord, Conversion
+from repetition import ReviewScheduler
+from progression import progressions
+from quality import groups, scaleQualities, IsInGroup
+from engine import TrainingEngine
+from view import ViewModel
+from canvas import TrainingCanvas
+from loader import ImageLoader, GetImageSize
+from timing import Timed
+from profiling import SessionProfiler, GetProfileDuration
+from control import ControlServer
 
 class ChordTraining(wx.Frame):
 
 	def __init__(self, *args, **kwargs):
 		super(ChordTraining, self).__init__(*args, **kwargs) 
 
-		# Default settings (overridden by settings from file ~/.chord_training/settings, if it exists)
-		self.pitches = collections.OrderedDict()
-		self.pitches['C'] = True
-		self.pitches['F'] = True
-		self.pitches['Bb'] = True
-		self.pitches['Eb'] = True
-		self.pitches['Ab'] = True
-		self.pitches['Db'] = True
-		self.pitches['F#'] = True
-		self.pitches['B'] = True
-		self.pitches['E'] = True
-		self.pitches['A'] = True
-		self.pitches['D'] = True
-		self.pitches['G'] = True
-		
-		self.qualities = collections.OrderedDict()
-		self.qualities['min7'] = True
-		self.qualities['7'] = True
-		self.qualities['Maj7'] = True
-		self.qualities['minMaj7'] = False
-		self.qualities['alt'] = False
-		self.qualities['min7b5'] = False
-		self.qualities['dim7'] = False
-		self.qualities['7b9'] = False
-		#self.qualities['min'] = False
-		#self.qualities['Maj'] = False
-		#self.qualities['7sus4'] = False
-		#self.qualities['aug'] = False
-		
-		self.modes = collections.OrderedDict()
-		self.modes['Chord'] = True
-		self.modes['II-V-I'] = False
-		self.modes['II-V'] = False
-		self.modes['V-I'] = False
-
+		# State and logic of the training, independent of wx (the frame being a view over it)
+		self.engine = TrainingEngine()
+		self.timings = self.engine.timings
+		
 		self.conv = Conversion()
 		
-		self.durationMin = 1  # s
-		self.durationMax = 10  # s
-		self.duration = 5  # s
-		self.elapsedTime = 0  # ms
-		self.refreshPeriod = 50  # ms
-		# Indicator for manual manipulation of the chord stack
-		self.manualChange = False 
-		
-		#  Display chord/scale score by default
-		self.displayScore = True
-		self.displayScale = True
+		# Shortest period between two updates of the time gauge
+		self.gaugeMinPeriod = 50  # ms
+		# Show the durations of the hot paths in the status bar
+		self.timingOverlay = False
+		# Size of the score images (by path in the directory), kept across sessions when resumed
+		self.imageSizes = {}
+		# Time of the last chord change requested from the keyboard (or the control socket),
+		# until it is displayed, and name of the duration recorded
+		self.keyTime = None
+		self.latencyName = "Key to display"
+		# Profile of the session, if requested
+		self.profiler = None
+		# Whether the first chord was displayed, quit right after it (startup benchmark)
+		self.started = False
+		self.startupBenchmark = False
+		
+		# Draw the whole display on a single custom canvas instead of widgets
+		# (taken into account at the next start)
+		self.canvasDisplay = False
 		# Default image in case no proper chord is selected or when the score 
 		# is inactive
 		self.defaultImage = wx.EmptyImage(5, 5).ConvertToBitmap()
-		# Resolution for the score images
-		self.scoreRes = 150
 		
 		self.hSpacerLength = 50
 		self.vSpacerLength = 25
@@ -86,19 +72,8 @@ class ChordTraining(wx.Frame):
 		self.windowSizeX = 500
 		self.windowSizeY = 400
 		
-		# Use only one thread on slower machines 
-		# when generating scores using lilypond
-		self.singleThread = True
-
-		# Path to file where the settings are saved		
-		home = os.path.expanduser("~")
-		self.directory = os.path.join(home, ".chord_training")
-		# Create directory in case it doesn't exist
-		if not os.path.isdir(self.directory):
-			os.makedirs(self.directory)
-		self.savefile = os.path.join(self.directory, "settings")	
-		self.settings = Settings(self)
-
+		self.settings = Settings(self.engine, self)
+		
 		# Default font size for chord names
 		self.fontSize = 64
 		self.fontSizes = collections.OrderedDict()
@@ -113,43 +88,18 @@ class ChordTraining(wx.Frame):
 		self.fontSizeMin = int(self.fontSizes.keys()[0])
 		self.fontSizeMax = int(self.fontSizes.keys()[-1])
 		
-		# Default resolution for scores
-		self.scoreRes = 150
-		self.scoreRess = collections.OrderedDict()
-		self.scoreRess['100'] = False
-		self.scoreRess['150'] = True
-		self.scoreRess['200'] = False
-		self.scoreRess['300'] = False
-		self.scoreResMin = int(self.scoreRess.keys()[0])
-		self.scoreResMax = int(self.scoreRess.keys()[-1])
-
-		# Make sure the subdirectory exists
-		for scoreRes in self.scoreRess.keys():
-			targetDir = os.path.join(self.directory, "res" + scoreRes)
-			if not os.path.isdir(targetDir):
-				os.mkdir(targetDir)	
-		
-		# Framework creating the needed score images for chord voicings and corresponding scales
-		self.score = Score(self.directory)
-		
 		# Trick the system to disable screen savers during training
 		self.moveMouse = True
 		
-		# Prevent the screensaver from starting
+		# Prevent the screensaver from starting (service started in the background)
 		self.stayOn = StayOn()
 		
-		# Set pause to off
-		self.pause = False  
-		
-		# Override setting in case the feature is unavailable
-		if not self.stayOn.isEnabled():
-			self.moveMouse = False
-		
 		# Set up the menus
 		self.InitMenus()
 		
 		# Attempt to read other settings from the savefile, in case it exists
 		self.settings.LoadSettings()
+		self.SyncMenus()
 		
 		self.SetChord()
 
@@ -161,19 +111,24 @@ class ChordTraining(wx.Frame):
 
 		# Define keyboard shortcuts
 		self.KeyBindings()
+		# Commands of external tools (foot pedals, scripts) on a local socket
+		self.control = ControlServer(lambda: wx.CallAfter(self.OnControlCommands), self.timings)
+		self.control.Start()
 
-		# Set elapsed time so that the layout is refreshed immediately at the start of the program
-		self.elapsedTime = self.duration * 1000
+		# The first deadline is immediate, so that the layout is refreshed at the start of the program
+		self.StartTimers()
 		self.changedLayout = True
+		# Sizes for which the window was last fitted (None: fit on the next refresh)
+		self.fittedLayout = None
 		
-		# Indicators for new parameters (when True leads to a renewal of the upcoming chords in the stack)
-		self.changedParameters = False
+		# Leave the slow steps of the initialisation until the window is displayed
+		wx.CallAfter(self.StartDeferredInit)
 		
 		self.Centre()
 		self.Show(True)
 
 	def SaveFile(self, event):
-		saveFileDialog = wx.FileDialog(self, "Save As", self.directory, self.savefile, "*", wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+		saveFileDialog = wx.FileDialog(self, "Save As", self.engine.directory, self.engine.savefile, "*", wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
 		saveFileDialog.ShowModal()
 		savefile = saveFileDialog.GetPath()
 		
@@ -182,30 +137,105 @@ class ChordTraining(wx.Frame):
 		saveFileDialog.Destroy()
 		
 	def LoadFile(self, event):
-		openFileDialog = wx.FileDialog(self, "Open", self.directory, self.savefile, "*", wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
+		openFileDialog = wx.FileDialog(self, "Open", self.engine.directory, self.engine.savefile, "*", wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
 		openFileDialog.ShowModal()
 		savefile = openFileDialog.GetPath()
 		
 		self.settings.LoadSettings(event, savefile)
+		self.SyncMenus()
 
 		# Mark the current parameters as new, so as to renew the chord stack 
-		self.changedParameters = True
+		self.engine.changedParameters = True
 		
 		openFileDialog.Destroy()
 
+	def SyncMenus(self):
+		# Synchronize the menus to the data just read
+		for tone in self.engine.pitches.keys():
+			self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
+
+		for tone in self.engine.pitchWeights.keys():
+			weight = self.engine.pitchWeights[tone]
+			if weight in self.toneWeightsMenuId[tone]:
+				self.toneWeightsMenu.Check(self.toneWeightsMenuId[tone][weight], True)
+
+		for quality in self.engine.qualityWeights.keys():
+			weight = self.engine.qualityWeights[quality]
+			if weight in self.qualityWeightsMenuId[quality]:
+				self.qualityWeightsMenu.Check(self.qualityWeightsMenuId[quality][weight], True)
+
+		for mode in self.engine.modes.keys():
+			self.modeMenu.Check(self.modeMenuId[mode], self.engine.modes[mode])
+		
+		for quality in self.engine.qualities.keys():
+			self.qualitiesMenu.Check(self.qualitiesMenuId[quality], \
+									  self.engine.qualities[quality])
+
+		try:
+			self.durationMenu.Check(self.durationMenuId[self.engine.duration], True)
+		except:
+			pass
+		
+		try:
+			self.fontSizeMenu.Check(self.fontSizeMenuId[str(self.fontSize)], True)
+		except:
+			pass
+
+		try:
+			self.scoreResMenu.Check(self.scoreResMenuId[str(self.engine.scoreRes)], True)
+		except:
+			pass
+		
+		self.settingsMenu.Check(self.singleThreadId, self.engine.singleThread)
+		self.settingsMenu.Check(self.displayScoreId, self.engine.displayScore)
+		self.settingsMenu.Check(self.displayScaleId, self.engine.displayScale)
+		self.settingsMenu.Check(self.canvasDisplayId, self.canvasDisplay)
+		self.settingsMenu.Check(self.stayOnId, self.moveMouse)
+		self.settingsMenu.Check(self.spacedRepetitionId, self.engine.spacedRepetition)
+		self.settingsMenu.Check(self.voiceLeadingId, self.engine.voiceLeading)
+		self.settingsMenu.Check(self.timingOverlayId, self.timingOverlay)
+		self.settingsMenu.Check(self.resumeSessionId, self.engine.resumeSession)
+
+	def StartDeferredInit(self):
+		worker = threading.Thread(target=self.DeferredInit)
+		worker.daemon = True
+		worker.start()
+		
+	def DeferredInit(self):
+		# Slow steps of the initialisation (on a worker thread): choice of the screensaver backend 
+		# (e.g. import of pymouse), import of PIL, search for lilypond
+		self.stayOn.start()
+		self.stayOn.waitReady()
+		lilypond = self.engine.score.FindLilypond()
+		imageToolsAvailable = self.engine.score.FindImageTools()
+		wx.CallAfter(self.OnDeferredInitDone, lilypond, imageToolsAvailable)
+		
+	def OnDeferredInitDone(self, lilypond, imageToolsAvailable):
+		# Keep the path to lilypond if selected by the user in the meantime
+		if self.engine.score.lilypond == "lilypond":
+			self.engine.score.lilypond = lilypond
+			self.lilypondPathMenu.SetLabel(self.lilypondPathId, self.engine.score.lilypond)
+		self.engine.score.imageToolsAvailable = imageToolsAvailable
+		
+		# Update the availability of the options depending on them in the menu
+		generateScoreIsPossible = self.engine.score.IsLilypondAvailable() and self.engine.score.AreImageToolsAvailable()
+		self.settingsMenu.Enable(self.generateScoresId, generateScoreIsPossible)
+		self.settingsMenu.Enable(self.stayOnId, self.stayOn.isEnabled())
+		self.UpdateStayOn()
+		
 	def PickLilypond(self, event):		
-		lilypondDir = os.path.dirname(self.score.lilypond) 
-		lilypondProg = self.score.lilypond
+		lilypondDir = os.path.dirname(self.engine.score.lilypond) 
+		lilypondProg = self.engine.score.lilypond
 		openFileDialog = wx.FileDialog(self, "Select the location of the lilypond program", \
 									lilypondDir, lilypondProg, "*", wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
 		openFileDialog.ShowModal()
-		self.score.lilypond = openFileDialog.GetPath()
+		self.engine.score.lilypond = openFileDialog.GetPath()
 
 		# Reset the path in the menu
-		self.lilypondPathMenu.SetLabel(self.lilypondPathId, self.score.lilypond)
+		self.lilypondPathMenu.SetLabel(self.lilypondPathId, self.engine.score.lilypond)
 		
 		# Update the availability of the option to generate the score images in the menu
-		generateScoreIsPossible = self.score.IsLilypondAvailable() and self.score.AreImageToolsAvailable()
+		generateScoreIsPossible = self.engine.score.IsLilypondAvailable() and self.engine.score.AreImageToolsAvailable()
  		self.settingsMenu.Enable(self.generateScoresId, generateScoreIsPossible)
 		
 		openFileDialog.Destroy()
@@ -237,17 +267,17 @@ class ChordTraining(wx.Frame):
 		# Generate images for all possible chords and scales in all available resolutions
 		from PIL import Image
 		
-		for scoreRes in self.scoreRess:
+		for scoreRes in self.engine.scoreRess:
 			# Scores
 			maxWidth = 0
 			maxHeight = 0
 			imgList = []
-			for pitch in self.pitches:
-				for quality in self.qualities:
+			for pitch in self.engine.pitches:
+				for quality in self.engine.qualities:
 					chord = Chord(pitch, quality, "Chord")
-					self.score.GenerateImage(chord, scoreRes, True, False)
+					self.engine.score.GenerateImage(chord, scoreRes, True, False)
 					imgFile = chord.GetImgName(scoreRes)
-					imgFile = os.path.join(self.directory, imgFile)
+					imgFile = os.path.join(self.engine.directory, imgFile)
  					
 					imgList.append(imgFile)
 					img = Image.open(imgFile)
@@ -263,16 +293,15 @@ class ChordTraining(wx.Frame):
 			maxHeight = 0
 			imgList = []
 			# Qualities leading to the generation of all possible scales (Major, Minor, Diminished)
-			qualities = ["Maj7", "minMaj7", "dim7"] 
-			for pitch in self.pitches:
-				for quality in qualities:
+			for pitch in self.engine.pitches:
+				for (kind, quality) in scaleQualities.items():
 					# For the diminished scale, only a subset of all possibilities is needed
-					if quality == "dim7" and self.pitches.keys().index(pitch) != self.pitches.keys().index(pitch) % 3:
+					if kind == "Diminished" and self.engine.pitches.keys().index(pitch) != self.engine.pitches.keys().index(pitch) % 3:
 						continue
 					chord = Chord(pitch, quality, "Chord")
-					self.score.GenerateScaleImage(chord, scoreRes, True, False)
+					self.engine.score.GenerateScaleImage(chord, scoreRes, True, False)
 					imgFile = chord.GetScaleImgName(scoreRes)
-					imgFile = os.path.join(self.directory, imgFile)
+					imgFile = os.path.join(self.engine.directory, imgFile)
 					
 					imgList.append(imgFile)
 					img = Image.open(imgFile)
@@ -282,7 +311,9 @@ class ChordTraining(wx.Frame):
 					
 			for imgFile in imgList:
 				self.resizeImgCanvas(imgFile, maxWidth, maxHeight)
-					
+
+		# The images were resized
+		self.imageSizes = {}
 			
 	def UpdateFontSize(self):
 		if self.fontSize != self.fontSizeOld:
@@ -302,111 +333,100 @@ class ChordTraining(wx.Frame):
 			self.fontSizeOld = self.fontSize
 # 			self.changedLayout = True
 			
-	def PrepareImage(self, currChord, imageMode):
-		try:
-			# Set the image for the score
-			if imageMode == "Chord" and not self.displayScore:
-				raise NoImage
-			elif imageMode == "Scale" and not self.displayScale:
-				raise NoImage
-			else:
-				try:
-					if imageMode == "Chord":
-						imageFile = currChord.GetImgName(self.scoreRes)
-					elif imageMode == "Scale":
-						imageFile = currChord.GetScaleImgName(self.scoreRes)
-					else:
-						raise
-				except:
-					raise NoImage
-			imageFile = os.path.join(self.directory, imageFile)
-			try:
-				with open(imageFile): pass
-				png = wx.Image(imageFile, wx.BITMAP_TYPE_ANY).ConvertToBitmap()
-			except IOError:
-				raise NoImage
-
-		except NoImage:
-			png = self.defaultImage
-			# Only attempt to generate the score if: 
-			# - there is a proper chord
-			# - the score is enabled
-			if imageMode == "Chord" and currChord.GetPitch() != "-" and self.displayScore:
-				self.score.GenerateImage(currChord, self.scoreRes, self.singleThread)
-			elif imageMode == "Scale" and currChord.GetPitch() != "-" and self.displayScale:
-				self.score.GenerateScaleImage(currChord, self.scoreRes, self.singleThread)
-				
+	def PrepareImage(self, currChord, imageMode, imageFile):
+		# Display the image: existing images are decoded in the background and displayed once
+		# ready (see OnImageLoaded), missing ones are first generated in the background, the
+		# default image (then that of the standard voicings, if any) standing in meanwhile
+		if imageFile is None:
+			self.imageLoader.Cancel(imageMode)
+			self.SetImage(imageMode, self.defaultImage)
+		elif os.path.isfile(imageFile):
+			self.imageLoader.Load(imageMode, imageFile)
+		elif not self.imageLoader.IsWanted(imageMode, imageFile):
+			self.SetImage(imageMode, self.defaultImage)
+			self.imageLoader.Generate(imageMode, imageFile, lambda: self.engine.GenerateImage(currChord, imageMode), \
+									  self.engine.GetPlaceholderImageFile(currChord, imageMode))
+	
+	def OnImageLoaded(self, imageMode, imageFile, image):
+		# Display an image decoded in the background (only called while it is still wanted)
+		if not image.IsOk():
+			self.SetImage(imageMode, self.defaultImage)
+			return
+		self.SetImage(imageMode, image.ConvertToBitmap())
+		self.view.SetRendered(self.viewImageFields[imageMode], imageFile)
+		if imageMode == "Chord":
+			self.RecordKeyLatency()
+		
+	def RecordKeyLatency(self):
+		# Time from the key press to the display of the chord and its score
+		if self.keyTime is not None:
+			self.timings.Record(self.latencyName, self.timings.now() - self.keyTime)
+			self.keyTime = None
+		
+	def SetImage(self, imageMode, png):
 		if imageMode == "Chord":		
 			self.chordImage.SetBitmap(png)
 		elif imageMode == "Scale":		
 			self.scaleImage.SetBitmap(png)
 					
+	@Timed("RefreshChord")
 	def RefreshChord(self):
-		# Renew upcoming chords in the stack upon changes in the parameters
-		if self.changedParameters:
-			self.chordStack.RecreateNext(self.AvailablePitches(), self.AvailableQualities(), self.CurrentMode())
-			self.changedParameters = False
-			# Avoid skipping the next chord
-			self.chordStack.Prev()
-
-		# Current chord
-		currChord = self.chordStack.GetCurrent()
-		
-		# Previous and next chords
-		prevChord = self.chordStack.GetPrev()
-		nextChord = self.chordStack.GetNext()
-		
-		# Update mode
-		currChord.SetMode(self.CurrentMode())
-		prevChord.SetMode(self.CurrentMode())
-		nextChord.SetMode(self.CurrentMode())
-		
-		# Update chord display
-		self.chordDisplay.SetLabel(currChord.GetName())
-		self.chordDisplayPrev.SetLabel(prevChord.GetName())
-		self.chordDisplayNext.SetLabel(nextChord.GetName())
-		
-		# Update scale name
-		self.scaleName.SetLabel(currChord.GetScale())
-		
-		self.PrepareImage(currChord, "Chord")
-
-		self.PrepareImage(currChord, "Scale")
+		state = self.engine.GetDisplayState()
+		currChord = self.engine.displayedChord
+
+		# Update only the widgets whose content differs from the last refresh
+		for field in self.view.GetChanges(state):
+			value = getattr(state, field)
+			if field in self.viewLabels:
+				self.viewLabels[field].SetLabel(value)
+				self.view.SetRendered(field, value)
+			elif field in self.viewImages:
+				# Images are marked as displayed once decoded, missing ones are looked for again 
+				# on the next refresh (unless there is no image to display)
+				self.PrepareImage(currChord, self.viewImages[field], value)
+				if value is None:
+					self.view.SetRendered(field, value)
 
 		self.UpdateFontSize()
+		
+		# Otherwise done once the score is decoded
+		if self.view.IsRendered('chordImage', state.chordImage):
+			self.RecordKeyLatency()
+		if not self.started:
+			self.started = True
+			self.timings.Record("Startup", time.time() - startTime)
+			if self.startupBenchmark:
+				print("First chord displayed after %.1f ms" % ((time.time() - startTime) * 1000.))
+				wx.CallAfter(self.Destroy)
+		if self.timingOverlay:
+			self.UpdateStatus()
 			
 		# Reset the sizer's size (so that the text window has the right size)		
 		if self.changedLayout:
 			self.changedLayout = False
 			self.FitLayout()
 		
-	def OnTimer(self, whatever):
-		if self.pause:
-			return
-		self.elapsedTime += self.refreshPeriod
-
-		# Move the mouse by one pixel so as to avoid the screensaver
-		if self.moveMouse:
-			self.stayOn.moveMouse(self.refreshPeriod/1000.)
-
-		# Update time gauge
-		value = self.elapsedTime/self.duration/1000.*100.
-		self.timeGauge.SetValue(min(value, self.timeGaugeMax))
-		
-		if self.elapsedTime <= self.duration * 1000:
+	def OnGaugeTimer(self, evt):
+		self.UpdateGauge()
+
+	def UpdateGauge(self):
+		# Only touch the widget when the displayed value changes
+		value = int(self.engine.clock.GetProgress() * self.timeGaugeMax)
+		if value != self.timeGaugeCurrent:
+			self.timeGaugeCurrent = value
+			self.timeGauge.SetValue(value)
+
+	@Timed("OnDeadline")
+	def OnDeadline(self, evt):
+		if not self.engine.Advance():
 			return
-		self.elapsedTime = 0
-		
-		# Explicitly switch to the next chord in the stack in case we have 
-		# manually changed the current chord
-		if self.manualChange:
-			self.manualChange = False
-			self.chordStack.Next()
 
 		self.RefreshChord()
 
- 		# Append a new chord to the stack		
- 		self.chordStack.UpdateStack(self.AvailablePitches(), self.AvailableQualities(), self.CurrentMode())
+		# Append a new chord to the stack and schedule the deadline of the new chord
+		self.engine.ScheduleNext()
+		self.UpdateGauge()
+		self.StartTimers()
 		
 	def getSmallerFontsize(self, fontsize):
 		return fontsize/2
@@ -446,11 +466,11 @@ class ChordTraining(wx.Frame):
 		self.modeMenu = wx.Menu()
 		self.modeMenuId = {}
 		self.modeMenuIdRev = {}
-		for mode in self.modes.keys():
+		for mode in self.engine.modes.keys():
 			self.modeMenuId[mode] = wx.NewId()
 			self.modeMenuIdRev[self.modeMenuId[mode]] = mode
 			self.modeMenu.Append(self.modeMenuId[mode], mode, "", wx.ITEM_RADIO)
-			self.modeMenu.Check(self.modeMenuId[mode], self.modes[mode])
+			self.modeMenu.Check(self.modeMenuId[mode], self.engine.modes[mode])
 			self.Bind(wx.EVT_MENU, self.MenuSetMode, id=self.modeMenuId[mode])
 		menubar.Append(self.modeMenu, '&Mode')
 
@@ -487,11 +507,11 @@ class ChordTraining(wx.Frame):
 
 		self.tonesMenu.AppendSeparator()
 		
-		for tone in self.pitches.keys():
+		for tone in self.engine.pitches.keys():
 			self.tonesMenuId[tone] = wx.NewId()
 			self.tonesMenuIdRev[self.tonesMenuId[tone]] = tone
 			self.tonesMenu.Append(self.tonesMenuId[tone], self.conv.GetPitchName(tone), "", wx.ITEM_CHECK)
-			self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+			self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 			self.Bind(wx.EVT_MENU, self.MenuSetTones, id=self.tonesMenuId[tone])
 			
 		self.toneGroupsMenu.Append(self.tonesFuncId["1-3"], "1-3")
@@ -519,6 +539,10 @@ class ChordTraining(wx.Frame):
 		self.toneGroupsMenu.Append(self.tonesFuncId["7-12"], "7-12")
 		self.Bind(wx.EVT_MENU, self.MenuSetTones, id=self.tonesFuncId["7-12"])
 
+		(self.toneWeightsMenu, self.toneWeightsMenuId, self.toneWeightsMenuIdRev) = \
+			self.InitWeightsMenu(self.engine.pitchWeights, self.conv.GetPitchName, self.MenuSetToneWeight)
+		self.tonesMenu.InsertMenu(4, wx.ID_ANY, '&Weights', self.toneWeightsMenu)
+
 		menubar.Append(self.tonesMenu, '&Tones')
 
 		# Menu: QUALITIES
@@ -527,12 +551,13 @@ class ChordTraining(wx.Frame):
 		self.qualitiesMenuIdRev = {}
 
 		self.qualitiesFuncId = {\
-						"maj" : wx.NewId(),\
-						"min" : wx.NewId(),\
-						"dim" : wx.NewId(),\
 						"all" : wx.NewId(),\
 						"none" : wx.NewId()\
 						}
+		# Groups of qualities (Major, Minor, Diminished)
+		self.qualitiesGroupId = {}
+		for group in groups:
+			self.qualitiesGroupId[wx.NewId()] = group
 
 		self.qualitiesMenu.Append(self.qualitiesFuncId["all"], "All")
 		self.Bind(wx.EVT_MENU, self.MenuSetQualities, id=self.qualitiesFuncId["all"])
@@ -541,22 +566,25 @@ class ChordTraining(wx.Frame):
 
 		self.qualitiesMenu.AppendSeparator()
 
-		self.qualitiesMenu.Append(self.qualitiesFuncId["maj"], "Major")
-		self.Bind(wx.EVT_MENU, self.MenuSetQualities, id=self.qualitiesFuncId["maj"])
-		self.qualitiesMenu.Append(self.qualitiesFuncId["min"], "Minor")
-		self.Bind(wx.EVT_MENU, self.MenuSetQualities, id=self.qualitiesFuncId["min"])
-		self.qualitiesMenu.Append(self.qualitiesFuncId["dim"], "Diminished")
-		self.Bind(wx.EVT_MENU, self.MenuSetQualities, id=self.qualitiesFuncId["dim"])
+		for (groupId, group) in sorted(self.qualitiesGroupId.items(), key=lambda item: groups.index(item[1])):
+			self.qualitiesMenu.Append(groupId, group)
+			self.Bind(wx.EVT_MENU, self.MenuSetQualities, id=groupId)
 					
 		self.qualitiesMenu.AppendSeparator()
 
-		for quality in self.qualities.keys():
+		(self.qualityWeightsMenu, self.qualityWeightsMenuId, self.qualityWeightsMenuIdRev) = \
+			self.InitWeightsMenu(self.engine.qualityWeights, self.conv.GetQualityName, self.MenuSetQualityWeight)
+		self.qualitiesMenu.AppendMenu(wx.ID_ANY, '&Weights', self.qualityWeightsMenu)
+
+		self.qualitiesMenu.AppendSeparator()
+
+		for quality in self.engine.qualities.keys():
 			self.qualitiesMenuId[quality] = wx.NewId()
 			self.qualitiesMenuIdRev[self.qualitiesMenuId[quality]] = quality
 			self.qualitiesMenu.Append(self.qualitiesMenuId[quality], self.conv.GetQualityName(quality), "", wx.ITEM_CHECK)
-			self.qualitiesMenu.Check(self.qualitiesMenuId[quality], self.qualities[quality])
+			self.qualitiesMenu.Check(self.qualitiesMenuId[quality], self.engine.qualities[quality])
 			self.Bind(wx.EVT_MENU, self.MenuSetQualities, id=self.qualitiesMenuId[quality])
-			self.qualitiesMenu.Enable(self.qualitiesMenuId[quality], self.modes['Chord'])
+			self.qualitiesMenu.Enable(self.qualitiesMenuId[quality], progressions[self.engine.CurrentMode()].HasFreeQuality())
 				
 		
 		menubar.Append(self.qualitiesMenu, '&Qualities')
@@ -565,14 +593,14 @@ class ChordTraining(wx.Frame):
 		self.durationMenu = wx.Menu()
 		self.durationMenuId = {}
 		self.durationMenuIdRev = {}
-		self.duration = int(self.duration)
-		if self.duration < self.durationMin or self.duration > self.durationMax:
-			self.duration = int(0.5 * (self.durationMax - self.durationMin + 1))
-		for duration in range(self.durationMin, self.durationMax + 1):
+		self.engine.duration = int(self.engine.duration)
+		if self.engine.duration < self.engine.durationMin or self.engine.duration > self.engine.durationMax:
+			self.engine.duration = int(0.5 * (self.engine.durationMax - self.engine.durationMin + 1))
+		for duration in range(self.engine.durationMin, self.engine.durationMax + 1):
 			self.durationMenuId[duration] = wx.NewId()
 			self.durationMenuIdRev[self.durationMenuId[duration]] = duration
 			self.durationMenu.Append(self.durationMenuId[duration], "%d" % duration, "", wx.ITEM_RADIO)
-			if duration == self.duration:
+			if duration == self.engine.duration:
 				self.durationMenu.Check(self.durationMenuId[duration], True)
 			self.Bind(wx.EVT_MENU, self.MenuSetDuration, id=self.durationMenuId[duration])
 
@@ -594,35 +622,60 @@ class ChordTraining(wx.Frame):
 		self.scoreResMenu = wx.Menu()
 		self.scoreResMenuId = {}
 		self.scoreResMenuIdRev = {}
-		for scoreRes in self.scoreRess.keys():
+		for scoreRes in self.engine.scoreRess.keys():
 			self.scoreResMenuId[scoreRes] = wx.NewId()
 			self.scoreResMenuIdRev[self.scoreResMenuId[scoreRes]] = scoreRes
 			self.scoreResMenu.Append(self.scoreResMenuId[scoreRes], "%s" % scoreRes, "", wx.ITEM_RADIO)
-			if int(scoreRes) == self.scoreRes:
+			if int(scoreRes) == self.engine.scoreRes:
 				self.scoreResMenu.Check(self.scoreResMenuId[scoreRes], True)
 			self.Bind(wx.EVT_MENU, self.MenuSetScoreRes, id=self.scoreResMenuId[scoreRes])
 
 		self.singleThreadId = wx.NewId()
 		self.settingsMenu.Append(self.singleThreadId, "Single &thread", "", wx.ITEM_CHECK)
-		self.settingsMenu.Check(self.singleThreadId, self.singleThread)
+		self.settingsMenu.Check(self.singleThreadId, self.engine.singleThread)
 		self.Bind(wx.EVT_MENU, self.MenuSetSingleThread, id=self.singleThreadId)
 
 		self.displayScoreId = wx.NewId()
 		self.settingsMenu.Append(self.displayScoreId, "&Display score", "", wx.ITEM_CHECK)
-		self.settingsMenu.Check(self.displayScoreId, self.displayScore)
+		self.settingsMenu.Check(self.displayScoreId, self.engine.displayScore)
 		self.Bind(wx.EVT_MENU, self.MenuSetDisplayScore, id=self.displayScoreId)
 
 		self.displayScaleId = wx.NewId()
 		self.settingsMenu.Append(self.displayScaleId, "D&isplay scale", "", wx.ITEM_CHECK)
-		self.settingsMenu.Check(self.displayScaleId, self.displayScale)
+		self.settingsMenu.Check(self.displayScaleId, self.engine.displayScale)
 		self.Bind(wx.EVT_MENU, self.MenuSetDisplayScale, id=self.displayScaleId)
 
+		self.canvasDisplayId = wx.NewId()
+		self.settingsMenu.Append(self.canvasDisplayId, "Custom-drawn display (at next start)", "", wx.ITEM_CHECK)
+		self.settingsMenu.Check(self.canvasDisplayId, self.canvasDisplay)
+		self.Bind(wx.EVT_MENU, self.MenuSetCanvasDisplay, id=self.canvasDisplayId)
+
 		self.stayOnId = wx.NewId()
 		self.settingsMenu.Append(self.stayOnId, "Disable &Screensaver", "", wx.ITEM_CHECK)
 		self.settingsMenu.Check(self.stayOnId, self.moveMouse)
 		self.Bind(wx.EVT_MENU, self.MenuSetStayOn, id=self.stayOnId)
 		self.settingsMenu.Enable(self.stayOnId, self.stayOn.isEnabled())
 
+		self.spacedRepetitionId = wx.NewId()
+		self.settingsMenu.Append(self.spacedRepetitionId, "Spaced &repetition", "", wx.ITEM_CHECK)
+		self.settingsMenu.Check(self.spacedRepetitionId, self.engine.spacedRepetition)
+		self.Bind(wx.EVT_MENU, self.MenuSetSpacedRepetition, id=self.spacedRepetitionId)
+
+		self.voiceLeadingId = wx.NewId()
+		self.settingsMenu.Append(self.voiceLeadingId, "&Voice leading", "", wx.ITEM_CHECK)
+		self.settingsMenu.Check(self.voiceLeadingId, self.engine.voiceLeading)
+		self.Bind(wx.EVT_MENU, self.MenuSetVoiceLeading, id=self.voiceLeadingId)
+
+		self.timingOverlayId = wx.NewId()
+		self.settingsMenu.Append(self.timingOverlayId, "&Timing overlay", "", wx.ITEM_CHECK)
+		self.settingsMenu.Check(self.timingOverlayId, self.timingOverlay)
+		self.Bind(wx.EVT_MENU, self.MenuSetTimingOverlay, id=self.timingOverlayId)
+
+		self.resumeSessionId = wx.NewId()
+		self.settingsMenu.Append(self.resumeSessionId, "Resume the s&ession at startup", "", wx.ITEM_CHECK)
+		self.settingsMenu.Check(self.resumeSessionId, self.engine.resumeSession)
+		self.Bind(wx.EVT_MENU, self.MenuSetResumeSession, id=self.resumeSessionId)
+
 		self.settingsMenu.AppendSeparator()
 
 		self.settingsMenu.AppendMenu(wx.ID_ANY, '&Font size', self.fontSizeMenu)
@@ -631,7 +684,7 @@ class ChordTraining(wx.Frame):
 
 		self.lilypondPathMenu = wx.Menu()
 		self.lilypondPathId = wx.NewId()
-		pathToLilypond = self.score.lilypond
+		pathToLilypond = self.engine.score.lilypond
 		self.lilypondPathMenu.Append(self.lilypondPathId, "%s" % pathToLilypond)
 		self.lilypondPathMenu.Enable(self.lilypondPathId, False)
 		self.lilypondPathMenu.AppendSeparator()
@@ -645,7 +698,7 @@ class ChordTraining(wx.Frame):
 		self.settingsMenu.AppendSeparator()
 		self.generateScoresId = wx.NewId()
 		self.settingsMenu.Append(self.generateScoresId, "&Generate Score images")
-		generateScoreIsPossible =  self.score.AreImageToolsAvailable() and self.score.IsLilypondAvailable()
+		generateScoreIsPossible =  self.engine.score.AreImageToolsAvailable() and self.engine.score.IsLilypondAvailable()
  		self.settingsMenu.Enable(self.generateScoresId, generateScoreIsPossible)
 
 		self.Bind(wx.EVT_MENU, self.GenerateScores, id=self.generateScoresId)
@@ -654,9 +707,30 @@ class ChordTraining(wx.Frame):
 
 		self.SetMenuBar(menubar)
 
+	def InitWeightsMenu(self, weights, getName, handler):
+		# One submenu per item, to pick its weight among the available levels
+		menu = wx.Menu()
+		menuId = {}
+		menuIdRev = {}
+		for item in weights.keys():
+			itemMenu = wx.Menu()
+			menuId[item] = {}
+			for weight in self.engine.weightLevels:
+				menuId[item][weight] = wx.NewId()
+				menuIdRev[menuId[item][weight]] = (item, weight)
+				itemMenu.Append(menuId[item][weight], "%d" % weight, "", wx.ITEM_RADIO)
+				if weights[item] == weight:
+					itemMenu.Check(menuId[item][weight], True)
+				self.Bind(wx.EVT_MENU, handler, id=menuId[item][weight])
+			menu.AppendMenu(wx.ID_ANY, getName(item), itemMenu)
+			
+		return (menu, menuId, menuIdRev)
+
 	def SetChord(self):
-		self.chordStack = ChordStack()
-		self.chordStack.Initialize(self.AvailablePitches(), self.AvailableQualities(), self.CurrentMode())
+		self.engine.Start()
+		# Sizes of the images measured in the resumed session
+		for (name, size) in self.engine.sessionView.get('imageSizes', {}).items():
+			self.imageSizes[name] = tuple(size)
 		
 		# Chord
 		self.fontSize = 0
@@ -692,12 +766,60 @@ class ChordTraining(wx.Frame):
 		
 		self.panel = wx.Panel(self, -1)
 
+		self.SetBackgroundColour(wx.WHITE)
+		self.layout = wx.BoxSizer(wx.VERTICAL)
+		
+		if self.canvasDisplay:
+			self.InitCanvas()
+		else:
+			self.InitWidgets()
+
+		# Content last displayed by each widget, to only update those that changed
+		self.view = ViewModel()
+		self.viewLabels = {'chord': self.chordDisplay, 'prevChord': self.chordDisplayPrev, \
+						   'nextChord': self.chordDisplayNext, 'scale': self.scaleName}
+		self.viewImages = {'chordImage': "Chord", 'scaleImage': "Scale"}
+		self.viewImageFields = dict((imageMode, field) for (field, imageMode) in self.viewImages.items())
+		
+		# Decoding of the score images on a worker thread
+		self.imageLoader = ImageLoader(self.OnImageLoaded, self.timings)
+		# Start decoding the images displayed when the session was left, before the first refresh
+		for (imageMode, name) in self.engine.sessionView.get('hotImages', {}).items():
+			imageFile = os.path.join(self.engine.directory, name)
+			if os.path.isfile(imageFile):
+				self.imageLoader.Load(imageMode, imageFile)
+
+	def InitCanvas(self):
+		# Single window drawing all the elements, which stand in for the widgets
+		self.timeGaugeMax = 100
+		self.timeGaugeCurrent = 0
+		self.canvas = TrainingCanvas(self, self.hSpacerLength, self.vSpacerLength, self.timeGaugeMax)
+		self.toneIndex = 0
+
+		self.chordDisplayPrev = self.canvas.prevChord
+		self.chordDisplayPrev.SetFont(self.fontSmaller)
+		self.chordDisplayPrev.SetForegroundColour('GREY')
+		self.chordDisplay = self.canvas.chord
+		self.chordDisplay.SetFont(self.font)
+		self.chordDisplayNext = self.canvas.nextChord
+		self.chordDisplayNext.SetFont(self.fontSmaller)
+		self.chordDisplayNext.SetForegroundColour('GREY')
+		self.timeGauge = self.canvas.timeGauge
+		self.chordImage = self.canvas.chordImage
+		self.scaleImage = self.canvas.scaleImage
+		self.scaleNameTitle = self.canvas.scaleTitle
+		self.scaleNameTitle.SetFont(self.fontSmaller)
+		self.scaleName = self.canvas.scale
+		self.scaleName.SetFont(self.font)
+		self.status = self.canvas.status
+		self.status.SetFont(self.fontStatus)
+
+		self.layout.Add(self.canvas, 1, wx.EXPAND)
+
+	def InitWidgets(self):
  		# Spacers to add room around objects 
  		hSpacer = wx.Size(self.hSpacerLength, 0)
  		vSpacer = wx.Size(0, self.vSpacerLength)
- 		
-		self.SetBackgroundColour(wx.WHITE)
-		self.layout = wx.BoxSizer(wx.VERTICAL)
 
 		# Current chord, previous and next
 		row = wx.BoxSizer(wx.HORIZONTAL)
@@ -796,6 +918,19 @@ class ChordTraining(wx.Frame):
 		statBar.Add(self.status, 1, wx.EXPAND|wx.ALL,10)
 		self.layout.Add(statBar, 0, wx.EXPAND)
 
+	def GetImageSize(self, imageFile):
+		# Known sizes first, otherwise read from the header of the image (only decoded if not a PNG)
+		name = os.path.relpath(imageFile, self.engine.directory)
+		size = self.imageSizes.get(name)
+		if size is None:
+			size = GetImageSize(imageFile)
+			if size is None:
+				png = wx.Image(imageFile, wx.BITMAP_TYPE_ANY)
+				size = (png.GetWidth(), png.GetHeight())
+			self.imageSizes[name] = size
+		
+		return size
+	
 	def GetMaxSizeChord(self):
 		# Determine the size of the largest image
 		maxWidth = 5
@@ -803,23 +938,23 @@ class ChordTraining(wx.Frame):
 
 		chord = Chord()
 		
-		listPitches = self.AvailablePitches()
+		listPitches = self.engine.AvailablePitches()
 		
-		mode = self.CurrentMode()
+		mode = self.engine.CurrentMode()
 		chord.SetMode(mode)
 		
-		listQualities = self.AvailableQualities()
+		listQualities = self.engine.AvailableQualities()
 			
 		for pitch in listPitches:
 			chord.SetPitch(pitch)
 			for quality in listQualities:
 				chord.SetQuality(quality)
-				imageFile = chord.GetImgName(self.scoreRes)
-				imageFile = os.path.join(self.directory, imageFile)
+				imageFile = chord.GetImgName(self.engine.scoreRes)
+				imageFile = os.path.join(self.engine.directory, imageFile)
 				try:
-					png = wx.Image(imageFile, wx.BITMAP_TYPE_ANY).ConvertToBitmap()
-					maxWidth = max(maxWidth, png.GetWidth())
-					maxHeight = max(maxHeight, png.GetHeight())
+					(width, height) = self.GetImageSize(imageFile)
+					maxWidth = max(maxWidth, width)
+					maxHeight = max(maxHeight, height)
 				except:
 					pass
 		
@@ -832,46 +967,96 @@ class ChordTraining(wx.Frame):
 
 		chord = Chord()
 		
-		listPitches = self.AvailablePitches()
+		listPitches = self.engine.AvailablePitches()
 		
-		mode = self.CurrentMode()
+		mode = self.engine.CurrentMode()
 		chord.SetMode(mode)
 		
-		listQualities = self.AvailableQualities()
+		listQualities = self.engine.AvailableQualities()
 			
 		for pitch in listPitches:
 			chord.SetPitch(pitch)
 			for quality in listQualities:
 				chord.SetQuality(quality)
-				imageFile = chord.GetScaleImgName(self.scoreRes)
-				imageFile = os.path.join(self.directory, imageFile)
+				imageFile = chord.GetScaleImgName(self.engine.scoreRes)
+				imageFile = os.path.join(self.engine.directory, imageFile)
 				try:
-					png = wx.Image(imageFile, wx.BITMAP_TYPE_ANY).ConvertToBitmap()
-					maxWidth = max(maxWidth, png.GetWidth())
-					maxHeight = max(maxHeight, png.GetHeight())
+					(width, height) = self.GetImageSize(imageFile)
+					maxWidth = max(maxWidth, width)
+					maxHeight = max(maxHeight, height)
 				except:
 					pass
 		
 		return (maxWidth, maxHeight)
 	
+	@Timed("FitLayout")
 	def FitLayout(self):
 		"""Update layout when some objects changed size"""
 		
-		(maxWidth, maxHeight) = self.GetMaxSizeChord()
+		maxSizeChord = self.GetMaxSizeChord()
+		maxSizeScale = self.GetMaxSizeScale()
+		
+		# Only fit the window again if the sizes actually changed
+		fittedLayout = (maxSizeChord, maxSizeScale, self.fontSize, self.engine.displayScore, self.engine.displayScale)
+		if fittedLayout == self.fittedLayout:
+			return
+		self.fittedLayout = fittedLayout
+		
+		(maxWidth, maxHeight) = maxSizeChord
 		self.maxWidthChord = wx.Size(maxWidth, 0)
 		self.maxHeightChord = wx.Size(0, maxHeight)
 
-		(maxWidth, maxHeight) = self.GetMaxSizeScale()
+		(maxWidth, maxHeight) = maxSizeScale
 		self.maxWidthScale = wx.Size(maxWidth, 0)
 		self.maxHeightScale = wx.Size(0, maxHeight)
 
+		if self.canvasDisplay:
+			self.canvas.SetImageSizes(maxSizeChord, maxSizeScale)
+
 		self.SetSizerAndFit(self.layout)
 
 	def SetTimer(self):
-		timerId = wx.NewId()
-		self.timer = wx.Timer(self, timerId)  # message will be sent to the self.panel
-		self.timer.Start(self.refreshPeriod)  # milliseconds
-		wx.EVT_TIMER(self, timerId, self.OnTimer)  # call the OnTimer function
+		# One-shot timer firing at the deadline of the chord
+		self.deadlineTimer = wx.Timer(self, wx.NewId())
+		self.Bind(wx.EVT_TIMER, self.OnDeadline, self.deadlineTimer)
+
+		# Periodic timer animating the time gauge
+		self.gaugeTimer = wx.Timer(self, wx.NewId())
+		self.Bind(wx.EVT_TIMER, self.OnGaugeTimer, self.gaugeTimer)
+
+		# Stop all work while the window is minimised or hidden
+		self.Bind(wx.EVT_ICONIZE, self.OnVisibilityChange)
+		self.Bind(wx.EVT_SHOW, self.OnVisibilityChange)
+
+	def GetGaugePeriod(self):
+		# One update per step the gauge is able to display
+		steps = max(1, min(self.timeGaugeMax, self.timeGauge.GetSize().width))
+		return max(self.gaugeMinPeriod, int(self.engine.duration * 1000. / steps))
+
+	def StartTimers(self):
+		# (Re)schedule the timers according to the clock, unless paused or suspended
+		if not self.engine.IsRunning():
+			return
+		self.deadlineTimer.Start(max(1, int(self.engine.clock.GetRemaining() * 1000)), wx.TIMER_ONE_SHOT)
+		self.gaugeTimer.Start(self.GetGaugePeriod())
+
+	def UpdateTiming(self):
+		# Run the timers unless paused or suspended (the engine keeping the time left)
+		if not self.engine.IsRunning():
+			self.deadlineTimer.Stop()
+			self.gaugeTimer.Stop()
+		else:
+			self.StartTimers()
+		self.UpdateStayOn()
+
+	def UpdateStayOn(self):
+		# Keep the screen on while training
+		self.stayOn.setActive(self.moveMouse and self.engine.IsRunning())
+
+	def OnVisibilityChange(self, evt):
+		self.engine.SetSuspended(self.IsIconized() or not self.IsShown())
+		self.UpdateTiming()
+		evt.Skip()
 
 
 	def KeyBindings(self):		
@@ -880,170 +1065,160 @@ class ChordTraining(wx.Frame):
 		 
 		# Quit upon pressing ESC
  		self.panel.Bind(wx.EVT_KEY_DOWN, self.OnKeyDown)
+		# The canvas may get the focus when clicked
+		if self.canvasDisplay:
+			self.canvas.Bind(wx.EVT_KEY_DOWN, self.OnKeyDown)
 
 	def MenuSetTones(self, evt):
 		if evt.GetId() == self.tonesFuncId["all"]:
-			for tone in self.pitches.keys():
-				self.pitches[tone] = True
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+			for tone in self.engine.pitches.keys():
+				self.engine.pitches[tone] = True
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 		elif evt.GetId() == self.tonesFuncId["none"]:
-			for tone in self.pitches.keys():
-				self.pitches[tone] = False
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+			for tone in self.engine.pitches.keys():
+				self.engine.pitches[tone] = False
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 		elif evt.GetId() == self.tonesFuncId["invert"]:
-			for tone in self.pitches.keys():
-				self.pitches[tone] = not self.pitches[tone]
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+			for tone in self.engine.pitches.keys():
+				self.engine.pitches[tone] = not self.engine.pitches[tone]
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 		elif evt.GetId() == self.tonesFuncId["1-3"]:
 			index = 0
-			for tone in self.pitches.keys():
+			for tone in self.engine.pitches.keys():
 				if index < 3:
-					self.pitches[tone] = True
+					self.engine.pitches[tone] = True
 				else:
-					self.pitches[tone] = False
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+					self.engine.pitches[tone] = False
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 				index += 1
 		elif evt.GetId() == self.tonesFuncId["4-6"]:
 			index = 0
-			for tone in self.pitches.keys():
+			for tone in self.engine.pitches.keys():
 				if index >= 3 and index < 6:
-					self.pitches[tone] = True
+					self.engine.pitches[tone] = True
 				else:
-					self.pitches[tone] = False
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+					self.engine.pitches[tone] = False
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 				index += 1
 		elif evt.GetId() == self.tonesFuncId["7-9"]:
 			index = 0
-			for tone in self.pitches.keys():
+			for tone in self.engine.pitches.keys():
 				if index >= 6 and index < 9:
-					self.pitches[tone] = True
+					self.engine.pitches[tone] = True
 				else:
-					self.pitches[tone] = False
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+					self.engine.pitches[tone] = False
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 				index += 1
 		elif evt.GetId() == self.tonesFuncId["10-12"]:
 			index = 0
-			for tone in self.pitches.keys():
+			for tone in self.engine.pitches.keys():
 				if index >= 9:
-					self.pitches[tone] = True
+					self.engine.pitches[tone] = True
 				else:
-					self.pitches[tone] = False
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+					self.engine.pitches[tone] = False
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 				index += 1
 		elif evt.GetId() == self.tonesFuncId["1-4"]:
 			index = 0
-			for tone in self.pitches.keys():
+			for tone in self.engine.pitches.keys():
 				if index < 4:
-					self.pitches[tone] = True
+					self.engine.pitches[tone] = True
 				else:
-					self.pitches[tone] = False
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+					self.engine.pitches[tone] = False
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 				index += 1
 		elif evt.GetId() == self.tonesFuncId["5-8"]:
 			index = 0
-			for tone in self.pitches.keys():
+			for tone in self.engine.pitches.keys():
 				if index >= 4 and index < 8:
-					self.pitches[tone] = True
+					self.engine.pitches[tone] = True
 				else:
-					self.pitches[tone] = False
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+					self.engine.pitches[tone] = False
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 				index += 1
 		elif evt.GetId() == self.tonesFuncId["9-12"]:
 			index = 0
-			for tone in self.pitches.keys():
+			for tone in self.engine.pitches.keys():
 				if index >= 8:
-					self.pitches[tone] = True
+					self.engine.pitches[tone] = True
 				else:
-					self.pitches[tone] = False
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+					self.engine.pitches[tone] = False
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 				index += 1
 		elif evt.GetId() == self.tonesFuncId["1-6"]:
 			index = 0
-			for tone in self.pitches.keys():
+			for tone in self.engine.pitches.keys():
 				if index < 6:
-					self.pitches[tone] = True
+					self.engine.pitches[tone] = True
 				else:
-					self.pitches[tone] = False
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+					self.engine.pitches[tone] = False
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 				index += 1
 		elif evt.GetId() == self.tonesFuncId["7-12"]:
 			index = 0
-			for tone in self.pitches.keys():
+			for tone in self.engine.pitches.keys():
 				if index >= 6:
-					self.pitches[tone] = True
+					self.engine.pitches[tone] = True
 				else:
-					self.pitches[tone] = False
-				self.tonesMenu.Check(self.tonesMenuId[tone], self.pitches[tone])
+					self.engine.pitches[tone] = False
+				self.tonesMenu.Check(self.tonesMenuId[tone], self.engine.pitches[tone])
 				index += 1
 		else:
 			tone = self.tonesMenuIdRev[evt.GetId()]
-			self.pitches[tone] = evt.IsChecked()
+			self.engine.pitches[tone] = evt.IsChecked()
 		# Mark the current parameters as new, so as to renew the chord stack 
-		self.changedParameters = True
+		self.engine.changedParameters = True
 
 	def MenuSetQualities(self, evt):
-		if evt.GetId() == self.qualitiesFuncId["maj"]:
-			for quality in self.qualities.keys():
-				if quality == "Maj7" or \
-				quality == "7" or \
-				quality == "min7":
-					self.qualities[quality] = True
-				else:
-					self.qualities[quality] = False
-				self.qualitiesMenu.Check(self.qualitiesMenuId[quality], self.qualities[quality])
-		elif evt.GetId() == self.qualitiesFuncId["min"]:
-			for quality in self.qualities.keys():
-				if quality == "minMaj7" or \
-				quality == "alt" or \
-				quality == "min7b5":
-					self.qualities[quality] = True
-				else:
-					self.qualities[quality] = False
-				self.qualitiesMenu.Check(self.qualitiesMenuId[quality], self.qualities[quality])
-		elif evt.GetId() == self.qualitiesFuncId["dim"]:
-			for quality in self.qualities.keys():
-				if quality == "dim7" or \
-				quality == "7b9":
-					self.qualities[quality] = True
-				else:
-					self.qualities[quality] = False
-				self.qualitiesMenu.Check(self.qualitiesMenuId[quality], self.qualities[quality])
+		if evt.GetId() in self.qualitiesGroupId:
+			group = self.qualitiesGroupId[evt.GetId()]
+			for quality in self.engine.qualities.keys():
+				self.engine.qualities[quality] = IsInGroup(quality, group)
+				self.qualitiesMenu.Check(self.qualitiesMenuId[quality], self.engine.qualities[quality])
 		elif evt.GetId() == self.qualitiesFuncId["all"]:
-			for quality in self.qualities.keys():
-				self.qualities[quality] = True
-				self.qualitiesMenu.Check(self.qualitiesMenuId[quality], self.qualities[quality])
+			for quality in self.engine.qualities.keys():
+				self.engine.qualities[quality] = True
+				self.qualitiesMenu.Check(self.qualitiesMenuId[quality], self.engine.qualities[quality])
 		elif evt.GetId() == self.qualitiesFuncId["none"]:
-			for quality in self.qualities.keys():
-				self.qualities[quality] = False
-				self.qualitiesMenu.Check(self.qualitiesMenuId[quality], self.qualities[quality])
+			for quality in self.engine.qualities.keys():
+				self.engine.qualities[quality] = False
+				self.qualitiesMenu.Check(self.qualitiesMenuId[quality], self.engine.qualities[quality])
 		else:
 			quality = self.qualitiesMenuIdRev[evt.GetId()]
-			self.qualities[quality] = evt.IsChecked()
+			self.engine.qualities[quality] = evt.IsChecked()
 		# Mark the current parameters as new, so as to renew the chord stack 
-		self.changedParameters = True
+		self.engine.changedParameters = True
+
+	def MenuSetToneWeight(self, evt):
+		(tone, weight) = self.toneWeightsMenuIdRev[evt.GetId()]
+		self.engine.pitchWeights[tone] = weight
+		# Mark the current parameters as new, so as to renew the chord stack 
+		self.engine.changedParameters = True
+
+	def MenuSetQualityWeight(self, evt):
+		(quality, weight) = self.qualityWeightsMenuIdRev[evt.GetId()]
+		self.engine.qualityWeights[quality] = weight
+		# Mark the current parameters as new, so as to renew the chord stack 
+		self.engine.changedParameters = True
 
 	def MenuSetMode(self, evt):
-		mode = self.modeMenuIdRev[evt.GetId()]
-		for modeLoop in self.modes.keys():
-			if modeLoop == mode:
-				self.modes[modeLoop] = True
-			else:
-				self.modes[modeLoop] = False
+		self.SetMode(self.modeMenuIdRev[evt.GetId()])
+
+	def SetMode(self, mode):
+		self.engine.SetMode(mode)
 				
 		# Disable items in the qualities menu in case the mode 
-		# is not set to 'Chord'
-		for quality in self.qualities.keys():
-		 	self.qualitiesMenu.Enable(self.qualitiesMenuId[quality], self.modes['Chord'])
+		# prescribes the qualities (e.g. 'II-V-I')
+		for quality in self.engine.qualities.keys():
+		 	self.qualitiesMenu.Enable(self.qualitiesMenuId[quality], progressions[mode].HasFreeQuality())
 
 		# Update the layout
 		self.changedLayout = True
 		
-		# Mark the current parameters as new, so as to renew the chord stack 
-		self.changedParameters = True		
-		
 	def MenuSetDuration(self, evt):
 		duration = self.durationMenuIdRev[evt.GetId()]
-		self.duration = duration
+		self.engine.SetDuration(duration)
+		self.StartTimers()
 
 	def MenuSetFontSize(self, evt):
 		fontSize = self.fontSizeMenuIdRev[evt.GetId()]
@@ -1059,78 +1234,176 @@ class ChordTraining(wx.Frame):
 
 	def MenuSetScoreRes(self, evt):
 		scoreRes = self.scoreResMenuIdRev[evt.GetId()]
-		for scoreResLoop in self.scoreRess.keys():
+		for scoreResLoop in self.engine.scoreRess.keys():
 			if scoreResLoop == scoreRes:
-				self.scoreRess[scoreResLoop] = True
-				self.scoreRes = int(scoreResLoop)
+				self.engine.scoreRess[scoreResLoop] = True
+				self.engine.scoreRes = int(scoreResLoop)
 			else:
-				self.scoreRess[scoreResLoop] = False
+				self.engine.scoreRess[scoreResLoop] = False
 
 		# Update the layout
 		self.changedLayout = True
 
 	def MenuSetSingleThread(self, evt):
-		self.singleThread = evt.IsChecked()
+		self.engine.singleThread = evt.IsChecked()
 		
 	def MenuSetDisplayScore(self, evt):
-		self.displayScore = evt.IsChecked()
+		self.engine.displayScore = evt.IsChecked()
 
 		# Update the layout
 		self.changedLayout = True
 	
 	def MenuSetDisplayScale(self, evt):
-		self.displayScale = evt.IsChecked()
+		self.engine.displayScale = evt.IsChecked()
 
 		# Update the layout
 		self.changedLayout = True
 
+	def MenuSetCanvasDisplay(self, evt):
+		# The layout is only built at the start
+		self.canvasDisplay = evt.IsChecked()
+
 	def MenuSetStayOn(self, evt):
 		self.moveMouse = evt.IsChecked()
+		self.UpdateStayOn()
+
+	def MenuSetSpacedRepetition(self, evt):
+		self.engine.spacedRepetition = evt.IsChecked()
+		# Mark the current parameters as new, so as to renew the chord stack 
+		self.engine.changedParameters = True
+			
+	def MenuSetVoiceLeading(self, evt):
+		self.engine.voiceLeading = evt.IsChecked()
+		self.RefreshChord()
+			
+	def MenuSetTimingOverlay(self, evt):
+		self.timingOverlay = evt.IsChecked()
+		self.UpdateStatus()
+
+	def MenuSetResumeSession(self, evt):
+		self.engine.resumeSession = evt.IsChecked()
 			
+	def StartProfiling(self, duration):
+		# Profile the session for a bounded period, the report being written when it ends
+		self.profiler = SessionProfiler(duration)
+		self.profiler.Start()
+		wx.CallLater(int(duration * 1000), self.StopProfiling)
+
+	def StopProfiling(self):
+		if self.profiler is None or not self.profiler.Stop():
+			return
+		tags = collections.OrderedDict()
+		tags['scoreRes'] = self.engine.scoreRes
+		tags['singleThread'] = self.engine.singleThread
+		tags['mode'] = self.engine.CurrentMode()
+		tags['fontSize'] = self.fontSize
+		tags['duration'] = self.engine.duration
+		tags['voiceLeading'] = self.engine.voiceLeading
+		tags['canvasDisplay'] = self.canvasDisplay
+		tags['python'] = platform.python_version()
+		tags['wx'] = wx.version()
+		tags['platform'] = platform.platform()
+		path = self.profiler.Write(self.engine.directory, tags)
+		self.profiler = None
+		print("Profile written to %s.collapsed and %s.stats" % (path, path))
+
 	def OnQuit(self, e):
+		self.StopProfiling()
+		self.control.Stop()
+		self.stayOn.stop()
 		self.settings.SaveSettings()
+		self.engine.Save()
+		if self.engine.resumeSession:
+			self.SaveSession()
 		self.Close()
 
+	def SaveSession(self):
+		# Chord stack, sizes of the images and images on display, to resume the session at the next start
+		hotImages = {}
+		if self.engine.displayedChord is not None:
+			for imageMode in self.viewImages.values():
+				imageFile = self.engine.GetImageFile(self.engine.displayedChord, imageMode)
+				if imageFile is not None and os.path.isfile(imageFile):
+					hotImages[imageMode] = os.path.relpath(imageFile, self.engine.directory)
+		self.engine.SaveSession({'imageSizes': self.imageSizes, 'hotImages': hotImages})
+
 	def TogglePause(self, e):
-		self.pause = not self.pause
-		pauseLabel = "(Paused)"
-		if self.pause:
-			self.timer.Stop()
-			label = pauseLabel
-		else:
-			self.timer.Start(self.refreshPeriod)  # milliseconds
-			label = ""
+		self.engine.SetPause(not self.engine.pause)
+		self.UpdateTiming()
+		self.UpdateStatus()
+
+	def UpdateStatus(self):
+		label = ""
+		if self.engine.pause:
+			label = "(Paused)"
+		if self.timingOverlay:
+			# Median and 95th percentile of the durations, in ms
+			label = (label + " " + self.timings.GetSummary()).strip()
 		self.status.SetLabel(label)
 
 	def FlagLayoutRedraw(self, e):
 		self.changedLayout = True
+		# Redraw everything, even if nothing seems to have changed
+		self.fittedLayout = None
+		self.view.Invalidate()
 
 	def NextChord(self, e):
-		# Do not explicitly call the function the first time
-		if not self.manualChange:
-			nextChordExists = True
-		else:
-			nextChordExists = self.chordStack.Next()
-		
-		if nextChordExists:
+		if self.engine.Next():
 			self.RefreshChord()
-		self.manualChange = True
+		else:
+			# Nothing to display: no latency to record
+			self.keyTime = None
 		
 	def PrevChord(self, e):
-		# Call the function twice the first time
-		if not self.manualChange:
-			self.chordStack.Prev()
-			self.chordStack.Prev()
-			prevChordExists = True
-		else:
-			prevChordExists = self.chordStack.Prev()
-
-		if prevChordExists:
+		if self.engine.Prev():
 			self.RefreshChord()
-		self.manualChange = True
+			# Going back to a chord counts as not knowing it
+			self.engine.ReviewDisplayed(ReviewScheduler.again)
+		else:
+			self.keyTime = None
+
+	def OnControlCommands(self):
+		# Run the commands of the control socket, leaving room for the other events in between
+		if self.control.Process(self.RunCommand):
+			wx.CallAfter(self.OnControlCommands)
+
+	def RunCommand(self, name, arguments, receiveTime):
+		# Command of the control socket (see control.py): return an error message, None if done
+		if name in ["next", "prev"]:
+			self.keyTime = receiveTime
+			self.latencyName = "Command to display"
+			if name == "next":
+				self.NextChord(None)
+			else:
+				self.PrevChord(None)
+		elif name == "pause":
+			self.TogglePause(None)
+		elif name == "mode":
+			if arguments[0] not in self.engine.modes.keys():
+				return "unknown mode " + arguments[0]
+			self.SetMode(arguments[0])
+			self.SyncMenus()
+		elif name in ["tones", "qualities"]:
+			if name == "tones":
+				selection = self.engine.pitches
+			else:
+				selection = self.engine.qualities
+			unknown = [item for item in arguments if item not in selection.keys()]
+			if len(unknown) > 0:
+				return "unknown " + " ".join(unknown)
+			for item in selection.keys():
+				selection[item] = item in arguments
+			# Mark the current parameters as new, so as to renew the chord stack 
+			self.engine.changedParameters = True
+			self.SyncMenus()
+
+		return None
 
 	def OnKeyDown(self, e):
 		key = e.GetKeyCode()
+		if key in [wx.WXK_LEFT, wx.WXK_RIGHT]:
+			self.keyTime = self.timings.now()
+			self.latencyName = "Key to display"
 
 		if key == wx.WXK_ESCAPE:
 			self.OnQuit(e)
@@ -1143,34 +1416,16 @@ class ChordTraining(wx.Frame):
 		elif key == wx.WXK_F5:
 			self.FlagLayoutRedraw(e)
 	
-	def AvailablePitches(self):
-		list = []
-		for pitch in self.pitches.keys():
-			if self.pitches[pitch]:
-				list.append(pitch)
-	
-		return list
-	
-	def AvailableQualities(self):
-		list = []
-		for quality in self.qualities.keys():
-			if self.qualities[quality]:
-				list.append(quality)
-	
-		return list
-	
-	def CurrentMode(self):
-		mode = None
-		for modeLoop in self.modes.keys():
-			if self.modes[modeLoop]:
-				mode = modeLoop
-				break
-			
-		return mode
-	
 def main():
 	mw = wx.App()
-	ChordTraining(None)
+	chordTraining = ChordTraining(None)
+	# Only measure the time to the first chord (see benchmark.py)
+	chordTraining.startupBenchmark = "--benchmark-startup" in sys.argv[1:]
+	
+	# Profile the session if requested (--profile[=<s>] or CHORD_TRAINING_PROFILE=<s>)
+	duration = GetProfileDuration(sys.argv[1:], os.environ)
+	if duration is not None:
+		chordTraining.StartProfiling(duration)
 	mw.MainLoop()    
 
 
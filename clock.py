@@ -0,0 +1,138 @@
+import ctypes
+import ctypes.util
+import os
+import sys
+import time
+
+# Identifier of the monotonic clock for clock_gettime on each platform
+clockMonotonicIds = {'linux': 1, 'darwin': 6, 'freebsd': 4}
+
+class Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+def LoadClockGettime():
+    """ Monotonic clock read with clock_gettime through ctypes (s), None if not available """
+    clockId = None
+    for (platform, platformId) in clockMonotonicIds.items():
+        if sys.platform.startswith(platform):
+            clockId = platformId
+    if clockId is None:
+        return None
+
+    # clock_gettime is in librt with older versions of glibc
+    for name in ['c', 'rt']:
+        path = ctypes.util.find_library(name)
+        if path is None:
+            continue
+        try:
+            clockGettime = ctypes.CDLL(path, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        clockGettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+
+        def monotonic():
+            timespec = Timespec()
+            if clockGettime(clockId, ctypes.byref(timespec)) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return timespec.tv_sec + timespec.tv_nsec * 1e-9
+
+        try:
+            monotonic()
+        except OSError:
+            continue
+        return monotonic
+
+    return None
+
+def GetMonotonicFallback():
+    """ Monotonic clock for Python 2, which has none in its standard library:
+    clock_gettime(CLOCK_MONOTONIC) where available, else the performance counter
+    on Windows (time.clock), else the elapsed time of os.times (POSIX times(),
+    in clock ticks, usually 10 ms) """
+    monotonic = LoadClockGettime()
+    if monotonic is not None:
+        return monotonic
+    if sys.platform == 'win32':
+        return time.clock
+
+    return lambda: os.times()[4]
+
+try:
+    from time import monotonic
+except ImportError:
+    # Python 2
+    monotonic = GetMonotonicFallback()
+
+class DeadlineClock():
+    """ Time left before switching to the next chord, measured on a monotonic clock
+
+    The deadline of each chord is computed from the previous deadline rather
+    than from the time the switch actually happened, so that the delays of
+    the event loop do not add up over a session. The clock may be suspended
+    (pause, window minimised) and resumed with the time that was left.
+    """
+    def __init__(self, duration, now=monotonic):
+        # Time each chord is displayed (s)
+        self.duration = duration
+        # Source of the current time (s)
+        self.now = now
+        # Time at which the current chord was displayed and its deadline
+        self.start = self.now()
+        self.deadline = self.start + duration
+        # Time left when suspended (None: running)
+        self.remaining = None
+
+    def IsRunning(self):
+        return self.remaining is None
+
+    def Restart(self, delay=None):
+        """ Start the period of a new chord, due after the given delay (default: the duration) """
+        if delay is None:
+            delay = self.duration
+        self.start = self.now()
+        self.deadline = self.start + delay
+        if not self.IsRunning():
+            self.remaining = delay
+
+    def Advance(self):
+        """ Start the period of the next chord right after the deadline of the current one """
+        now = self.now()
+        if now - self.deadline < self.duration:
+            self.start = self.deadline
+        else:
+            # Far too late (e.g. the system was asleep): start from now
+            self.start = now
+        self.deadline = self.start + self.duration
+
+    def SetDuration(self, duration):
+        """ Change the duration, the current chord keeping the time already elapsed """
+        self.deadline += duration - self.duration
+        if not self.IsRunning():
+            self.remaining += duration - self.duration
+        self.duration = duration
+
+    def Suspend(self):
+        if self.IsRunning():
+            self.remaining = self.deadline - self.now()
+
+    def Resume(self):
+        if not self.IsRunning():
+            now = self.now()
+            self.deadline = now + self.remaining
+            self.start = self.deadline - self.duration
+            self.remaining = None
+
+    def GetRemaining(self):
+        """ Time left before the deadline (s, negative once it has passed) """
+        if not self.IsRunning():
+            return self.remaining
+
+        return self.deadline - self.now()
+
+    def GetProgress(self):
+        """ Fraction of the duration elapsed, between 0 and 1 """
+        if self.duration <= 0:
+            return 1.
+
+        return min(1., max(0., 1. - self.GetRemaining() / float(self.duration)))
@@ -0,0 +1,184 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Control of the chord training by external tools (foot pedals, scripts)
+through a local Unix domain socket: one command per line, each answered
+by a line ('ok' or 'error <reason>').
+    next, prev, pause
+    mode <mode>                  e.g. mode II-V-I
+    tones <tone> ...             e.g. tones C F Bb
+    qualities <quality> ...      e.g. qualities min7 7 Maj7
+Used from the command line, sends the commands given and prints the
+answers with their round trip time.
+'''
+
+import os
+import socket
+import sys
+import threading
+import time
+try:
+    import Queue as queue
+except ImportError:
+    # Python 3
+    import queue
+
+from engine import GetDefaultDirectory
+
+# Commands and their number of arguments (None: any, at least one)
+commands = {'next': 0, 'prev': 0, 'pause': 0, 'mode': 1, 'tones': None, 'qualities': None}
+
+def GetDefaultPath():
+    """ Path of the socket (environment variable CHORD_TRAINING_CONTROL, by default ~/.chord_training/control) """
+    return os.environ.get("CHORD_TRAINING_CONTROL", os.path.join(GetDefaultDirectory(), "control"))
+
+def ParseCommand(line):
+    """ Name and arguments of a command line, None if not a valid command """
+    items = line.split()
+    if len(items) == 0 or items[0] not in commands:
+        return None
+    (name, arguments) = (items[0], items[1:])
+    nbArguments = commands[name]
+    if (nbArguments is None and len(arguments) == 0) or (nbArguments is not None and len(arguments) != nbArguments):
+        return None
+
+    return (name, arguments)
+
+class ControlServer():
+    """ Commands received on a Unix domain socket, run on the thread of the view
+
+    The connections are read on threads of their own. The commands are
+    queued, and the view is notified (e.g. through wx.CallAfter) only when
+    the queue was empty; it then runs them in batches bounded in time, so
+    that a flood of commands cannot starve its event loop.
+    """
+    def __init__(self, notify, timings, path=None):
+        # Called on a reader thread when commands are waiting to be processed
+        self.notify = notify
+        # Time spent by the commands in the queue
+        self.timings = timings
+        if path is None:
+            path = GetDefaultPath()
+        self.path = path
+        self.commands = queue.Queue()
+        # Whether the view was notified and has not yet processed the queue
+        self.notified = False
+        self.lock = threading.Lock()
+        self.listener = None
+
+    @staticmethod
+    def IsAvailable():
+        return hasattr(socket, "AF_UNIX")
+
+    def Start(self):
+        """ Listen on the socket (in the background), return whether possible """
+        if not self.IsAvailable():
+            return False
+        # Remove the socket left by a previous run (but not that of another instance)
+        if os.path.exists(self.path):
+            if self.IsInUse():
+                return False
+            os.remove(self.path)
+        try:
+            self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.listener.bind(self.path)
+            self.listener.listen(5)
+        except (IOError, OSError):
+            self.listener = None
+            return False
+
+        thread = threading.Thread(target=self.Accept)
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def IsInUse(self):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+            return True
+        except (IOError, OSError):
+            return False
+        finally:
+            probe.close()
+
+    def Stop(self):
+        if self.listener is None:
+            return
+        self.listener.close()
+        self.listener = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def Accept(self):
+        while self.listener is not None:
+            try:
+                (connection, address) = self.listener.accept()
+            except (IOError, OSError):
+                break
+            thread = threading.Thread(target=self.Read, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def Read(self, connection):
+        lines = connection.makefile('r')
+        try:
+            for line in lines:
+                # Invalid commands are queued too, so that the answers keep the order of the commands
+                command = ParseCommand(line)
+                self.commands.put((command, connection, self.timings.now()))
+                with self.lock:
+                    notify = not self.notified
+                    self.notified = True
+                if notify:
+                    self.notify()
+        except (IOError, OSError):
+            pass
+        lines.close()
+        connection.close()
+
+    def Reply(self, connection, answer):
+        try:
+            connection.sendall((answer + "\n").encode('utf-8'))
+        except (IOError, OSError):
+            pass
+
+    def Process(self, handler, budget=.01):
+        """ Run the queued commands through handler(name, arguments, receiveTime), which returns an
+        error message (None: done), for at most budget s; return whether commands are left """
+        end = self.timings.now() + budget
+        while self.timings.now() < end:
+            try:
+                (command, connection, receiveTime) = self.commands.get_nowait()
+            except queue.Empty:
+                break
+            self.timings.Record("Command queue", self.timings.now() - receiveTime)
+            if command is None:
+                error = "unknown command"
+            else:
+                error = handler(command[0], command[1], receiveTime)
+            if error is None:
+                self.Reply(connection, "ok")
+            else:
+                self.Reply(connection, "error " + error)
+
+        with self.lock:
+            self.notified = not self.commands.empty()
+            return self.notified
+
+def main():
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(GetDefaultPath())
+    answers = connection.makefile('r')
+    for command in sys.argv[1:]:
+        start = time.time()
+        connection.sendall((command + "\n").encode('utf-8'))
+        answer = answers.readline().strip()
+        print("%s: %s (%.1f ms)" % (command, answer, (time.time() - start) * 1000.))
+    connection.close()
+
+if __name__ == '__main__':
+    main()
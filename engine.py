@@ -0,0 +1,414 @@
+import collections
+import copy
+import json
+import os
+import zlib
+
+from chord import Chord, ChordStack
+from clock import DeadlineClock
+from progression import progressions
+from quality import qualities, listedQualities
+from repetition import ReviewScheduler
+from score import Score
+from timing import Timings
+from view import DisplayState
+from voicing import VoiceLeading
+
+# Format of the session file (see SaveSession)
+sessionVersion = 2
+
+def GetDefaultDirectory():
+    """ Directory of the settings, review state and score images (~/.chord_training) """
+    return os.path.join(os.path.expanduser("~"), ".chord_training")
+
+class TrainingEngine():
+    """ State and logic of a training session, independent of any GUI toolkit
+
+    Holds the practice settings, the chord stack and its scheduling, the clock
+    of the chord switches and the score images. A view (the wx frame, or any
+    headless driver) displays the state returned by GetDisplayState and
+    forwards the requests of the user (Advance at the deadlines, Next, Prev,
+    pause, changes of the settings).
+    """
+    def __init__(self, directory=None):
+        # Default settings (overridden by settings from file ~/.chord_training/settings, if it exists)
+        self.pitches = collections.OrderedDict()
+        self.pitches['C'] = True
+        self.pitches['F'] = True
+        self.pitches['Bb'] = True
+        self.pitches['Eb'] = True
+        self.pitches['Ab'] = True
+        self.pitches['Db'] = True
+        self.pitches['F#'] = True
+        self.pitches['B'] = True
+        self.pitches['E'] = True
+        self.pitches['A'] = True
+        self.pitches['D'] = True
+        self.pitches['G'] = True
+
+        # Qualities offered in the menus, as defined in the quality registry
+        self.qualities = collections.OrderedDict()
+        for quality in listedQualities:
+            self.qualities[quality] = qualities[quality].selected
+
+        # Relative frequencies of the pitches and qualities
+        self.weightLevels = [1, 2, 3, 4]
+        self.pitchWeights = collections.OrderedDict()
+        for pitch in self.pitches.keys():
+            self.pitchWeights[pitch] = 1
+        self.qualityWeights = collections.OrderedDict()
+        for quality in self.qualities.keys():
+            self.qualityWeights[quality] = 1
+
+        # Modes: one per progression definition
+        self.modes = collections.OrderedDict()
+        for mode in progressions.keys():
+            self.modes[mode] = False
+        self.modes['Chord'] = True
+
+        self.durationMin = 1  # s
+        self.durationMax = 10  # s
+        self.duration = 5  # s
+        # Paused by the user, or suspended by the view (e.g. window minimised)
+        self.pause = False
+        self.suspended = False
+        # Indicator for manual manipulation of the chord stack
+        self.manualChange = False
+        # Indicator for new parameters (when True leads to a renewal of the upcoming chords in the stack)
+        self.changedParameters = False
+        # Seed of the chord sequence (None: new random sequence for each session)
+        self.seed = None
+        # Pick the chords by spaced repetition instead of at random
+        self.spacedRepetition = False
+        # Chord currently on display (graded for spaced repetition when left)
+        self.displayedChord = None
+        # Key (with the mode) of the progression on display and the lowest grade given
+        # to its chords so far, reviewed once the progression is over
+        self.pendingReview = None
+        # Choose the voicings so as to minimise the motion of the voices
+        self.voiceLeading = False
+        self.voiceLeadingOptimiser = VoiceLeading()
+        # Durations of the hot paths (always recorded)
+        self.timings = Timings()
+
+        # Display chord/scale score by default
+        self.displayScore = True
+        self.displayScale = True
+
+        # Default resolution for scores
+        self.scoreRes = 150
+        self.scoreRess = collections.OrderedDict()
+        self.scoreRess['100'] = False
+        self.scoreRess['150'] = True
+        self.scoreRess['200'] = False
+        self.scoreRess['300'] = False
+        self.scoreResMin = int(list(self.scoreRess.keys())[0])
+        self.scoreResMax = int(list(self.scoreRess.keys())[-1])
+
+        # Use only one thread on slower machines
+        # when generating scores using lilypond
+        self.singleThread = True
+
+        # Path to file where the settings are saved
+        if directory is None:
+            directory = GetDefaultDirectory()
+        self.directory = directory
+        # Create directory in case it doesn't exist
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.savefile = os.path.join(self.directory, "settings")
+
+        # Resume the chord stack of the previous session at startup
+        self.resumeSession = False
+        self.sessionfile = os.path.join(self.directory, "session")
+        # Data saved by the view with the session that was resumed
+        self.sessionView = {}
+
+        # Review state for spaced repetition, saved next to the settings
+        self.reviewfile = os.path.join(self.directory, "review")
+        self.scheduler = ReviewScheduler()
+        self.scheduler.Load(self.reviewfile)
+
+        # User-supplied transitions for the Markov mode (replacing the default ones)
+        markovfile = os.path.join(self.directory, "markov")
+        if os.path.isfile(markovfile):
+            progressions['Markov'].chain.Load(markovfile)
+
+        # Make sure the subdirectory exists
+        for scoreRes in self.scoreRess.keys():
+            targetDir = os.path.join(self.directory, "res" + scoreRes)
+            if not os.path.isdir(targetDir):
+                os.mkdir(targetDir)
+
+        # Framework creating the needed score images for chord voicings and corresponding scales
+        self.score = Score(self.directory)
+
+        # Created by Start, once the settings are known
+        self.chordStack = None
+        self.clock = None
+
+    def Start(self):
+        """ Create the chord stack (or resume that of the previous session) and the clock, once the settings are loaded """
+        self.chordStack = None
+        if self.resumeSession:
+            self.chordStack = self.LoadSession()
+        if self.chordStack is None:
+            self.chordStack = ChordStack(self.seed)
+        self.chordStack.SetWeights(self.pitchWeights, self.qualityWeights)
+        self.chordStack.SetScheduler(self.GetScheduler())
+        self.chordStack.SetVoiceLeading(self.GetVoiceLeading())
+        self.chordStack.Initialize(self.AvailablePitches(), self.AvailableQualities(), self.CurrentMode())
+
+        # Reach the deadline immediately so that the first chord is displayed at once
+        self.clock = DeadlineClock(self.duration)
+        self.clock.Restart(0)
+
+    def Fork(self):
+        """ New session sharing the settings and the score images of this one, with its own
+        chords, clock and review state (kept in memory), to be started with Start """
+        session = copy.copy(self)
+        session.pause = False
+        session.suspended = False
+        session.resumeSession = False
+        session.manualChange = False
+        session.changedParameters = False
+        session.displayedChord = None
+        session.pendingReview = None
+        session.voiceLeadingOptimiser = VoiceLeading()
+        session.scheduler = ReviewScheduler()
+        session.chordStack = None
+        session.clock = None
+
+        return session
+
+    def Save(self):
+        """ Save the review state (the settings are saved by Settings) """
+        self.scheduler.Save(self.reviewfile)
+
+    def SaveSession(self, view=None):
+        """ Save the chord stack, positioned on the chord displayed, and the data of the view (JSON) """
+        snapshot = self.chordStack.GetSnapshot()
+        # The stack is one chord ahead of the display until the next deadline
+        for index in range(len(self.chordStack.elements)):
+            if self.chordStack.elements[index] is self.displayedChord:
+                snapshot['curr'] = index
+        session = {'version': sessionVersion, 'stack': snapshot, 'view': view or {}}
+
+        with open(self.sessionfile, "wb") as f:
+            f.write(zlib.compress(json.dumps(session, separators=(',', ':')).encode('utf-8')))
+
+    def LoadSession(self):
+        """ Chord stack saved by SaveSession, None if none or saved with another selection
+        of chords (the data of the view is put in sessionView) """
+        try:
+            with open(self.sessionfile, "rb") as f:
+                session = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            if session['version'] != sessionVersion:
+                return None
+            segments = session['stack']['segments']
+            if len(segments) == 0 or \
+            list(segments[-1][1:4]) != [self.AvailablePitches(), self.AvailableQualities(), self.CurrentMode()]:
+                return None
+            chordStack = ChordStack.FromSnapshot(session['stack'])
+        except (IOError, OSError, ValueError, zlib.error, KeyError, TypeError):
+            # Missing, damaged or incompatible file
+            return None
+
+        self.sessionView = session['view']
+        return chordStack
+
+    def IsRunning(self):
+        return not self.pause and not self.suspended
+
+    def SetPause(self, pause):
+        self.pause = pause
+        self.UpdateClock()
+
+    def SetSuspended(self, suspended):
+        self.suspended = suspended
+        self.UpdateClock()
+
+    def UpdateClock(self):
+        # Keep the time left to the current chord while paused or suspended
+        if self.IsRunning():
+            self.clock.Resume()
+        else:
+            self.clock.Suspend()
+
+    def SetDuration(self, duration):
+        self.duration = duration
+        self.clock.SetDuration(duration)
+
+    def SetMode(self, mode):
+        for modeLoop in self.modes.keys():
+            self.modes[modeLoop] = modeLoop == mode
+        # Mark the current parameters as new, so as to renew the chord stack
+        self.changedParameters = True
+
+    def GetCurrentChords(self):
+        """ Current, previous and next chords, the upcoming ones being renewed first if the parameters changed """
+        # Renew upcoming chords in the stack upon changes in the parameters
+        if self.changedParameters:
+            self.chordStack.SetWeights(self.pitchWeights, self.qualityWeights)
+            self.chordStack.SetScheduler(self.GetScheduler())
+            self.chordStack.RecreateNext(self.AvailablePitches(), self.AvailableQualities(), self.CurrentMode())
+            self.changedParameters = False
+            # Avoid skipping the next chord
+            self.chordStack.Prev()
+
+        # Current chord (with its voicing, if chosen by voice leading)
+        self.chordStack.SetVoiceLeading(self.GetVoiceLeading())
+        self.chordStack.GetCurrentVoicing()
+        currChord = self.chordStack.GetCurrent()
+
+        # Previous and next chords
+        prevChord = self.chordStack.GetPrev()
+        nextChord = self.chordStack.GetNext()
+
+        # Update mode (only if changed, since it makes the chords determine their scale again)
+        mode = self.CurrentMode()
+        for chord in [currChord, prevChord, nextChord]:
+            if chord.GetMode() != mode:
+                chord.SetMode(mode)
+
+        self.displayedChord = currChord
+
+        return (currChord, prevChord, nextChord)
+
+    def GetDisplayState(self):
+        """ Content to display for the current chord """
+        (currChord, prevChord, nextChord) = self.GetCurrentChords()
+        return DisplayState(currChord.GetName(), prevChord.GetName(), nextChord.GetName(), currChord.GetScale(), \
+                            self.GetImageFile(currChord, "Chord"), self.GetImageFile(currChord, "Scale"))
+
+    def GetImageFile(self, currChord, imageMode):
+        """ Path of the score image of the chord or of its scale (None: no image to display) """
+        if imageMode == "Chord" and not self.displayScore:
+            return None
+        elif imageMode == "Scale" and not self.displayScale:
+            return None
+        try:
+            if imageMode == "Chord":
+                imageFile = currChord.GetImgName(self.scoreRes)
+            elif imageMode == "Scale":
+                imageFile = currChord.GetScaleImgName(self.scoreRes)
+            else:
+                return None
+        except:
+            return None
+
+        return os.path.join(self.directory, imageFile)
+
+    def GetPlaceholderImageFile(self, currChord, imageMode):
+        """ Path of the score image with the standard voicings of a chord given a voicing of its own
+        (displayed while the latter is generated), None if not applicable """
+        if imageMode != "Chord" or currChord.GetVoicing() is None:
+            return None
+
+        return self.GetImageFile(Chord(currChord.GetPitch(), currChord.GetQuality(), currChord.GetMode()), imageMode)
+
+    def GenerateImage(self, currChord, imageMode):
+        """ Have lilypond generate the missing score image of the chord or of its scale """
+        # Only attempt to generate the score if:
+        # - there is a proper chord
+        # - the score is enabled
+        with self.timings.Measure("Lilypond"):
+            if imageMode == "Chord" and currChord.GetPitch() != "-" and self.displayScore:
+                self.score.GenerateImage(currChord, self.scoreRes, self.singleThread)
+            elif imageMode == "Scale" and currChord.GetPitch() != "-" and self.displayScale:
+                self.score.GenerateScaleImage(currChord, self.scoreRes, self.singleThread)
+
+    def Advance(self):
+        """ Leave the current chord at its deadline, return False if paused (nothing done) """
+        if not self.IsRunning():
+            return False
+
+        self.ReviewChord(self.displayedChord, ReviewScheduler.good)
+
+        # Explicitly switch to the next chord in the stack in case we have
+        # manually changed the current chord
+        if self.manualChange:
+            self.manualChange = False
+            self.chordStack.Next()
+
+        return True
+
+    def ScheduleNext(self):
+        """ Once the new chord is displayed: append a chord to the stack and schedule the next deadline """
+        self.chordStack.UpdateStack(self.AvailablePitches(), self.AvailableQualities(), self.CurrentMode())
+        self.clock.Advance()
+
+    def Next(self):
+        """ Skip to the next chord, return whether there is one """
+        # Do not explicitly call the function the first time
+        if not self.manualChange:
+            nextChordExists = True
+        else:
+            nextChordExists = self.chordStack.Next()
+
+        if nextChordExists:
+            # Skipping a chord counts as knowing it well
+            self.ReviewChord(self.displayedChord, ReviewScheduler.easy)
+        self.manualChange = True
+
+        return nextChordExists
+
+    def Prev(self):
+        """ Go back to the previous chord, return whether there is one (to be graded with
+        ReviewDisplayed once displayed) """
+        # Call the function twice the first time
+        if not self.manualChange:
+            self.chordStack.Prev()
+            self.chordStack.Prev()
+            prevChordExists = True
+        else:
+            prevChordExists = self.chordStack.Prev()
+        self.manualChange = True
+
+        return prevChordExists
+
+    def ReviewDisplayed(self, grade):
+        self.ReviewChord(self.displayedChord, grade)
+
+    def GetScheduler(self):
+        if self.spacedRepetition:
+            return self.scheduler
+
+        return None
+
+    def GetVoiceLeading(self):
+        if self.voiceLeading:
+            return self.voiceLeadingOptimiser
+
+        return None
+
+    def ReviewChord(self, chord, grade):
+        # Report how well the chord was known to the spaced repetition scheduler, which
+        # schedules the keys of the progressions (e.g. the key of a II-V, not its chords):
+        # each key is graded once per progression, with the lowest grade of its chords
+        if not self.spacedRepetition or chord is None or chord.GetKey() is None:
+            return
+
+        key = chord.GetKey() + (chord.GetMode(),)
+        if self.pendingReview is not None and self.pendingReview[0] == key:
+            grade = min(grade, self.pendingReview[1])
+        if chord.IsLast():
+            self.pendingReview = None
+            self.scheduler.Review(key, grade)
+        else:
+            self.pendingReview = (key, grade)
+
+    def AvailablePitches(self):
+        return [pitch for pitch in self.pitches.keys() if self.pitches[pitch]]
+
+    def AvailableQualities(self):
+        return [quality for quality in self.qualities.keys() if self.qualities[quality]]
+
+    def CurrentMode(self):
+        mode = None
+        for modeLoop in self.modes.keys():
+            if self.modes[modeLoop]:
+                mode = modeLoop
+                break
+
+        return mode
@@ -0,0 +1,107 @@
+import os
+import struct
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    # Python 3
+    import queue
+
+import wx
+
+pngSignature = b'\x89PNG\r\n\x1a\n'
+
+def GetImageSize(imageFile):
+    """ Size of a PNG image, read from its header without decoding it (None if not a PNG) """
+    with open(imageFile, 'rb') as f:
+        header = f.read(24)
+    if len(header) < 24 or header[:8] != pngSignature or header[12:16] != b'IHDR':
+        return None
+
+    return struct.unpack('>II', header[16:24])
+
+class ImageLoader():
+    """ Decoding (and generation) of the score images on a worker thread
+
+    Only the conversion of the decoded image to a bitmap, which has to happen
+    on the GUI thread, is left to the callback, called through wx.CallAfter.
+    Each target (e.g. the chord score) displays a single image: a request
+    supersedes the previous one for the same target, whose result is discarded.
+    """
+    def __init__(self, callback, timings):
+        # Called on the GUI thread with the target, the image file and the decoded image
+        self.callback = callback
+        # Time spent waiting in the queues and decoding
+        self.timings = timings
+        # Image file currently wanted for each target
+        self.requested = {}
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+
+        self.worker = threading.Thread(target=self.Run)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def Load(self, target, imageFile):
+        """ Request the decoding of the image file for the target (ignored if already requested) """
+        with self.lock:
+            if self.requested.get(target) == imageFile:
+                return
+            self.requested[target] = imageFile
+        self.requests.put((target, imageFile, self.timings.now(), None, None))
+
+    def Generate(self, target, imageFile, generate, placeholderFile=None):
+        """ Request the generation of a missing image file (by calling generate) and its decoding
+        for the target; the placeholder image, if any, is displayed in the meantime """
+        with self.lock:
+            if self.requested.get(target) == imageFile:
+                return
+            self.requested[target] = imageFile
+        self.requests.put((target, imageFile, self.timings.now(), generate, placeholderFile))
+
+    def Cancel(self, target):
+        """ Discard the pending request of the target, if any """
+        with self.lock:
+            self.requested.pop(target, None)
+
+    def IsWanted(self, target, imageFile):
+        with self.lock:
+            return self.requested.get(target) == imageFile
+
+    def Decode(self, imageFile):
+        with self.timings.Measure("Decode"):
+            return wx.Image(imageFile, wx.BITMAP_TYPE_ANY)
+
+    def Run(self):
+        while True:
+            (target, imageFile, requestTime, generate, placeholderFile) = self.requests.get()
+            # Skip the requests superseded while waiting in the queue
+            if not self.IsWanted(target, imageFile):
+                continue
+            self.timings.Record("Decode queue", self.timings.now() - requestTime)
+            if generate is not None:
+                if placeholderFile is not None and os.path.isfile(placeholderFile):
+                    wx.CallAfter(self.Deliver, target, imageFile, self.Decode(placeholderFile), self.timings.now(), \
+                                 placeholderFile)
+                generate()
+                if not os.path.isfile(imageFile):
+                    # Still being generated (or failed): looked for again on the next request
+                    with self.lock:
+                        if self.requested.get(target) == imageFile:
+                            del self.requested[target]
+                    continue
+            wx.CallAfter(self.Deliver, target, imageFile, self.Decode(imageFile), self.timings.now())
+
+    def Deliver(self, target, imageFile, image, decodeTime, placeholderFile=None):
+        self.timings.Record("Handoff", self.timings.now() - decodeTime)
+        # On the GUI thread: drop the images the user has already moved on from
+        with self.lock:
+            if self.requested.get(target) != imageFile:
+                return
+            if placeholderFile is None:
+                del self.requested[target]
+        if placeholderFile is None:
+            self.callback(target, imageFile, image)
+        else:
+            # Stands in for the image requested, which is still wanted
+            self.callback(target, placeholderFile, image)
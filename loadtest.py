@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+'''
+Load test of the training server (Python 3): starts it on one core, connects
+many local clients and measures how late their chord updates arrive and the
+processor time the server takes.
+Options: --sessions=<number of clients> --time=<s> --duration=<s per chord>
+'''
+
+import asyncio
+import base64
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from engine import TrainingEngine
+from server import WebSocket, ParseOptions
+from settings import Settings
+from timing import Timings
+
+def WriteSettings(directory, duration):
+    """ Settings of the server: chords switched every 'duration' s, no score images (no lilypond needed) """
+    engine = TrainingEngine(directory)
+    engine.duration = duration
+    engine.displayScore = False
+    engine.displayScale = False
+    Settings(engine).SaveSettings()
+
+def GetFreePort():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def GetProcessorTime(pid):
+    """ Processor time used by a process so far (s), None if unknown (Linux only) """
+    try:
+        with open("/proc/%d/stat" % pid) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (IOError, OSError):
+        return None
+    # utime and stime, in clock ticks
+    return (int(fields[11]) + int(fields[12])) / float(os.sysconf('SC_CLK_TCK'))
+
+async def RunClient(port, duration, end, timings, counts):
+    """ Follow the chords of a session until the end, recording how late each one arrived """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    key = base64.b64encode(os.urandom(16)).decode('ascii')
+    writer.write(("GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n" \
+                  "Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n" % key).encode('ascii'))
+    response = (await reader.readuntil(b"\r\n\r\n")).decode('latin-1')
+    if WebSocket.GetAccept(key) not in response:
+        counts['failed'] += 1
+        writer.close()
+        return
+    counts['connected'] += 1
+
+    websocket = WebSocket(reader, writer, mask=True)
+    previous = None
+    while True:
+        try:
+            message = await asyncio.wait_for(websocket.Receive(), end - timings.now())
+        except asyncio.TimeoutError:
+            break
+        if message is None:
+            counts['dropped'] += 1
+            break
+        arrival = timings.now()
+        counts['messages'] += 1
+        if previous is not None:
+            # Lateness relative to the previous chord (the deadlines follow each other by 'duration')
+            timings.Record("Lateness", abs(arrival - previous - duration))
+        previous = arrival
+    websocket.Close()
+
+async def RunClients(port, nbSessions, testTime, duration, timings, counts):
+    end = timings.now() + testTime
+    clients = []
+    for index in range(nbSessions):
+        clients.append(asyncio.ensure_future(RunClient(port, duration, end, timings, counts)))
+        # Spread the connections (and thus the deadlines) over the duration of a chord
+        await asyncio.sleep(float(duration) / nbSessions)
+    await asyncio.gather(*clients, return_exceptions=True)
+
+def WaitForServer(port, timeout=10.):
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            socket.create_connection(("127.0.0.1", port), 1.).close()
+            return True
+        except (IOError, OSError):
+            time.sleep(.1)
+    return False
+
+def main():
+    options = ParseOptions(sys.argv[1:])
+    nbSessions = int(options.get('sessions', 300))
+    testTime = float(options.get('time', 20))
+    duration = int(options.get('duration', 1))
+
+    directory = tempfile.mkdtemp()
+    port = GetFreePort()
+    server = None
+    try:
+        WriteSettings(directory, duration)
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+        server = subprocess.Popen([sys.executable, script, "--host=127.0.0.1", "--port=%d" % port, \
+                                   "--directory=" + directory], stdout=subprocess.DEVNULL)
+        # Keep the server on a single core
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(server.pid, [min(os.sched_getaffinity(0))])
+        if not WaitForServer(port):
+            print("The server did not start")
+            return
+
+        timings = Timings(size=nbSessions * int(testTime / duration + 1))
+        counts = {'connected': 0, 'failed': 0, 'dropped': 0, 'messages': 0}
+        startTime = GetProcessorTime(server.pid)
+        start = time.time()
+        asyncio.run(RunClients(port, nbSessions, testTime, duration, timings, counts))
+        elapsed = time.time() - start
+        processorTime = GetProcessorTime(server.pid)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(directory)
+
+    print("Sessions: %d connected, %d failed, %d dropped" % (counts['connected'], counts['failed'], counts['dropped']))
+    print("Chord updates: %d (%.0f/s)" % (counts['messages'], counts['messages'] / elapsed))
+    percentiles = timings.GetPercentiles("Lateness", (.5, .95, 1.))
+    if percentiles is not None:
+        print("Lateness of the updates: %.1f ms median, %.1f ms 95th percentile, %.1f ms max" % \
+              tuple(lateness * 1000. for lateness in percentiles))
+    if startTime is not None and processorTime is not None:
+        print("Server processor time: %.1f%% of one core" % (100. * (processorTime - startTime) / elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import cProfile
+import collections
+import os
+import pstats
+import sys
+import threading
+import time
+
+# Profiling of a session: command-line flag ('--profile' or '--profile=<s>')
+# or environment variable (number of seconds)
+profileFlag = "--profile"
+profileVariable = "CHORD_TRAINING_PROFILE"
+# Default duration of the profile (s)
+profileDuration = 60.
+
+def GetProfileDuration(argv, environ):
+    """ Duration (s) of the profile requested on the command line or in the environment, None if none """
+    value = None
+    for argument in argv:
+        if argument == profileFlag:
+            value = ""
+        elif argument.startswith(profileFlag + "="):
+            value = argument[len(profileFlag) + 1:]
+    if value is None:
+        value = environ.get(profileVariable)
+    if value is None:
+        return None
+
+    try:
+        return max(1., float(value))
+    except ValueError:
+        return profileDuration
+
+def GetStack(frame):
+    """ Stack of the frame, from the outermost call, in the collapsed format ('a;b;c') """
+    calls = []
+    while frame is not None:
+        code = frame.f_code
+        calls.append("%s:%s" % (os.path.basename(code.co_filename), code.co_name))
+        frame = frame.f_back
+
+    return ";".join(reversed(calls))
+
+class SessionProfiler():
+    """ Profile of a practice session, for a bounded period
+
+    The code run by the GUI thread is profiled deterministically (statistics
+    per function), while a second thread samples its stack (collapsed stacks,
+    as read by the flame graph tools).
+    """
+    def __init__(self, duration, interval=.005):
+        # Duration of the profile and period of the stack samples (s)
+        self.duration = duration
+        self.interval = interval
+        self.profile = cProfile.Profile()
+        # Number of samples of each stack
+        self.stacks = collections.Counter()
+        self.running = False
+
+    def Start(self):
+        """ Start profiling the calling thread """
+        self.threadId = threading.current_thread().ident
+        self.running = True
+        self.sampler = threading.Thread(target=self.Sample)
+        self.sampler.daemon = True
+        self.sampler.start()
+        self.profile.enable()
+
+    def Stop(self):
+        """ Stop profiling (from the thread that started it), return whether it was running """
+        if not self.running:
+            return False
+        self.profile.disable()
+        self.running = False
+        self.sampler.join()
+        return True
+
+    def Sample(self):
+        end = time.time() + self.duration
+        while self.running and time.time() < end:
+            frame = sys._current_frames().get(self.threadId)
+            if frame is not None:
+                self.stacks[GetStack(frame)] += 1
+            time.sleep(self.interval)
+
+    def Write(self, directory, tags):
+        """ Write the collapsed stacks and the statistics of the functions, tagged with
+        the given settings, and return the path of the files (without extension) """
+        path = os.path.join(directory, "profile-" + time.strftime("%Y%m%d-%H%M%S"))
+
+        with open(path + ".collapsed", "w") as f:
+            for (stack, count) in sorted(self.stacks.items()):
+                f.write("%s %d\n" % (stack, count))
+
+        with open(path + ".stats", "w") as f:
+            for key in sorted(tags.keys()):
+                f.write("%s: %s\n" % (key, tags[key]))
+            f.write("\n")
+            stats = pstats.Stats(self.profile, stream=f)
+            stats.sort_stats('cumulative').print_stats(100)
+            stats.sort_stats('tottime').print_stats(100)
+
+        return path
@@ -0,0 +1,220 @@
+import collections
+
+from sampler import WeightedSampler
+from theory import circleOfFifths
+
+# Position of each pitch along the circle of fifths
+pitchIndex = dict((pitch, index) for (index, pitch) in enumerate(circleOfFifths))
+
+# Chord event produced by a ChordStream; 'key' is the (pitch, quality) of the
+# progression it belongs to, 'last' marks the end of the progression
+ChordEvent = collections.namedtuple('ChordEvent', ['pitch', 'quality', 'mode', 'key', 'last'])
+
+class Progression():
+    """ Chord progression described as data
+
+    Each step is given as (interval above the key in semitones, quality), a
+    quality of None standing for the quality of the key. The quality of the
+    key is drawn among the available qualities if keyQuality is None. The
+    same key is drawn at most 'avoid' times in a row (0: no restriction).
+
+    The chords of the progression are computed once per key quality, for
+    all keys, so that generating a progression is a table lookup.
+    """
+    def __init__(self, name, steps, keyQuality=None, avoid=2):
+        self.name = name
+        self.steps = list(steps)
+        self.keyQuality = keyQuality
+        self.avoid = avoid
+
+        # Events of the progression for each key quality, indexed by the key
+        # position along the circle of fifths
+        self.tables = {}
+        if keyQuality is not None:
+            self.Compile(keyQuality)
+
+    def GetInstance(self):
+        """ Progression to be used by one stream, with a selection of its own """
+        return self
+
+    def SetSelection(self, listPitches, listQualities):
+        """ Restrict the chords generated to the available pitches and qualities """
+        pass
+
+    def NextKey(self, key, rng):
+        """ Key following the given one (None: drawn among the available keys) """
+        return None
+
+    def HasFreeQuality(self):
+        """ Whether the quality of the key is drawn among the available qualities """
+        return self.keyQuality is None
+
+    def Compile(self, quality):
+        table = []
+        for keyIndex in range(len(circleOfFifths)):
+            key = (circleOfFifths[keyIndex], quality)
+            events = []
+            for (step, (interval, stepQuality)) in enumerate(self.steps):
+                # A semitone up is 5 steps along the circle of fifths (ascending in fourths)
+                pitch = circleOfFifths[(keyIndex + 5 * interval) % len(circleOfFifths)]
+                if stepQuality is None:
+                    stepQuality = quality
+                events.append(ChordEvent(pitch, stepQuality, self.name, key, step == len(self.steps) - 1))
+            table.append(tuple(events))
+        self.tables[quality] = table
+
+        return table
+
+    def Generate(self, pitch, quality):
+        """ Return the chord events of the progression in the given key """
+        if quality not in self.tables:
+            self.Compile(quality)
+
+        return self.tables[quality][pitchIndex[pitch]]
+
+
+class MarkovChain():
+    """ Sparse transition matrix between chords (pitch, quality)
+
+    The successors of each chord are kept with their weights in a
+    WeightedSampler, so that drawing the next chord takes O(log k) for k
+    successors. Restricting the chain to a selection of pitches and
+    qualities only updates the transitions to the chords whose pitch or
+    quality changed, the tables are not rebuilt.
+    """
+    def __init__(self):
+        # Weights of the transitions: chord -> {next chord: weight}
+        self.weights = collections.OrderedDict()
+        # Samplers of the next chord (weights of unselected chords set to 0)
+        self.samplers = {}
+        # Transitions (chord, next chord) to each pitch and each quality
+        self.byPitch = {}
+        self.byQuality = {}
+        self.compiled = False
+        # Selected pitches and qualities
+        self.selection = (frozenset(), frozenset())
+
+    def AddTransition(self, state, nextState, weight=1.):
+        if state not in self.weights:
+            self.weights[state] = collections.OrderedDict()
+        self.weights[state][nextState] = self.weights[state].get(nextState, 0.) + weight
+        self.compiled = False
+
+    def Copy(self):
+        """ Chain with a selection of its own, sharing the transitions (left unchanged from then on) """
+        chain = MarkovChain()
+        chain.weights = self.weights
+
+        return chain
+
+    def Learn(self, sequence):
+        """ Count the transitions in a sequence of chords (pitch, quality) """
+        for index in range(1, len(sequence)):
+            self.AddTransition(sequence[index - 1], sequence[index])
+
+    def Clear(self):
+        self.weights = collections.OrderedDict()
+        self.compiled = False
+
+    def Load(self, savefile):
+        """ Replace the transitions with those of a file with lines 'pitch quality nextPitch nextQuality weight' """
+        self.Clear()
+        with open(savefile) as f:
+            for line in f:
+                items = line.split()
+                if len(items) < 5 or items[0].startswith("#"):
+                    continue
+                self.AddTransition((items[0], items[1]), (items[2], items[3]), float(items[4]))
+
+    def IsSelected(self, state):
+        return state[0] in self.selection[0] and state[1] in self.selection[1]
+
+    def GetWeight(self, state, nextState):
+        if not self.IsSelected(nextState):
+            return 0.
+
+        return self.weights[state][nextState]
+
+    def Compile(self):
+        self.samplers = {}
+        self.byPitch = {}
+        self.byQuality = {}
+        for state in self.weights:
+            successors = list(self.weights[state].keys())
+            self.samplers[state] = WeightedSampler(successors, \
+                dict((nextState, self.GetWeight(state, nextState)) for nextState in successors))
+            for nextState in successors:
+                self.byPitch.setdefault(nextState[0], []).append((state, nextState))
+                self.byQuality.setdefault(nextState[1], []).append((state, nextState))
+        self.compiled = True
+
+    def SetSelection(self, listPitches, listQualities):
+        selection = (frozenset(listPitches), frozenset(listQualities))
+        changedPitches = selection[0] ^ self.selection[0]
+        changedQualities = selection[1] ^ self.selection[1]
+        self.selection = selection
+        if not self.compiled:
+            return
+
+        transitions = set()
+        for pitch in changedPitches:
+            transitions.update(self.byPitch.get(pitch, []))
+        for quality in changedQualities:
+            transitions.update(self.byQuality.get(quality, []))
+        for (state, nextState) in transitions:
+            self.samplers[state].SetWeight(nextState, self.GetWeight(state, nextState))
+
+    def Draw(self, state, rng):
+        """ Return the chord following the given one (None if it has no selected successor) """
+        if not self.compiled:
+            self.Compile()
+
+        sampler = self.samplers.get(state)
+        if sampler is None or sampler.nbPositive == 0:
+            return None
+
+        return sampler.Draw(rng)
+
+class MarkovProgression(Progression):
+    """ Chords drawn one at a time, each following the previous one along a Markov chain """
+    def __init__(self, name, chain):
+        Progression.__init__(self, name, [(0, None)], None, 0)
+        self.chain = chain
+
+    def GetInstance(self):
+        return MarkovProgression(self.name, self.chain.Copy())
+
+    def SetSelection(self, listPitches, listQualities):
+        self.chain.SetSelection(listPitches, listQualities)
+
+    def NextKey(self, key, rng):
+        if key is None:
+            return None
+
+        return self.chain.Draw(key, rng)
+
+
+# Available progressions (modes), by name
+progressions = collections.OrderedDict()
+
+def AddProgression(progression):
+    progressions[progression.name] = progression
+
+AddProgression(Progression('Chord', [(0, None)]))
+AddProgression(Progression('II-V-I', [(2, 'min7'), (7, '7'), (0, 'Maj7')], 'Maj7'))
+AddProgression(Progression('II-V', [(2, 'min7'), (7, '7')], 'Maj7'))
+AddProgression(Progression('V-I', [(7, '7'), (0, 'Maj7')], 'Maj7'))
+AddProgression(Progression('II-V-I-minor', [(2, 'min7b5'), (7, 'alt'), (0, 'minMaj7')], 'minMaj7'))
+AddProgression(Progression('I-VI-II-V', [(0, 'Maj7'), (9, '7'), (2, 'min7'), (7, '7')], 'Maj7'))
+AddProgression(Progression('III-VI-II-V', [(4, 'min7'), (9, '7'), (2, 'min7'), (7, '7')], 'Maj7'))
+AddProgression(Progression('Dominant-cycle', [(0, '7'), (5, '7'), (10, '7'), (3, '7')], '7'))
+
+def LearnProgressions(chain):
+    """ Add the transitions found in the progressions with a fixed key quality, in all keys """
+    for progression in list(progressions.values()):
+        if not progression.HasFreeQuality():
+            for events in progression.tables[progression.keyQuality]:
+                chain.Learn([(event.pitch, event.quality) for event in events])
+
+AddProgression(MarkovProgression('Markov', MarkovChain()))
+LearnProgressions(progressions['Markov'].chain)
@@ -0,0 +1,119 @@
+import collections
+
+class Quality():
+    """ Definition of a chord quality
+
+    symbol: name shown in the GUI
+    intervals: chord tones (semitones above the root)
+    scale: scale played over the chord, as (kind, semitones from the chord root
+           to the scale root), None if the quality has no scale
+    voicing: degrees of the 'A' rootless voicing, from the lowest note up (the
+             'B' voicing starts from the second half of the tones)
+    chordDegrees: chord tones as degrees, for the closed voicing in root position
+    specialVoicings: voicings deviating from the rule above, {family: degrees}
+    enharmonicVoicing: alternative (sharp) spelling of the voicing, if any
+    keys: candidate key signatures, as (staff steps and semitones above the root,
+          scale kind); the one with the fewest accidentals once transposed is
+          taken, the others meaning the enharmonic voicing (None: no key signature)
+    lowRoots: roots for which the upper voicings are written an octave lower
+    group: group of the quality in the menus (None: in no group)
+    selected: whether the quality is practised by default
+    listed: whether the quality is offered in the menus
+    """
+    def __init__(self, name, symbol, intervals, scale, voicing, chordDegrees, specialVoicings=None, \
+                 enharmonicVoicing=None, keys=(((0, 0), 'Major'),), lowRoots=(), group=None, selected=False, \
+                 listed=True):
+        self.name = name
+        self.symbol = symbol
+        self.intervals = intervals
+        self.scale = scale
+        self.voicing = voicing
+        self.chordDegrees = chordDegrees
+        self.specialVoicings = specialVoicings if specialVoicings is not None else {}
+        self.enharmonicVoicing = enharmonicVoicing
+        self.keys = keys
+        self.lowRoots = lowRoots
+        self.group = group
+        self.selected = selected
+        self.listed = listed
+
+
+# Registry of the qualities, by name
+qualities = collections.OrderedDict()
+
+def AddQuality(quality):
+    qualities[quality.name] = quality
+
+AddQuality(Quality('min7', "-7", [0, 3, 7, 10], ('Major', 10), \
+                   ['b3', '5', 'b7', '9'], ['1', 'b3', '5', 'b7'], \
+                   keys=[((6, 10), 'Major')], group='Major', selected=True))
+AddQuality(Quality('7', "7", [0, 4, 7, 10], ('Major', 5), \
+                   ['3', '13', 'b7', '9'], ['1', '3', '5', 'b7'], \
+                   keys=[((3, 5), 'Major')], group='Major', selected=True))
+AddQuality(Quality('Maj7', u'\u25B3', [0, 4, 7, 11], ('Major', 0), \
+                   ['7', '1', '3', '5'], ['1', '3', '5', '7'], \
+                   specialVoicings={'B': ['3', '5', '6', '9']}, \
+                   keys=[((0, 0), 'Major')], group='Major', selected=True))
+AddQuality(Quality('minMaj7', u'-\u25B3', [0, 3, 7, 11], ('Minor', 0), \
+                   ['b3', '5', '7', '9'], ['1', 'b3', '5', '7'], \
+                   keys=[((0, 0), 'Minor')], group='Minor'))
+AddQuality(Quality('alt', "alt", [0, 3, 4, 8, 10], ('Minor', 1), \
+                   ['b4', 'b6', 'b7', 'b3'], ['1', '3', 'b7', '#9', 'b13'], \
+                   enharmonicVoicing=['3', '#5', '#6', '#2'], \
+                   keys=[((1, 1), 'Minor'), ((0, 1), 'Minor')], \
+                   lowRoots=['G', 'Ab', 'A', 'Bb', 'B'], group='Minor'))
+AddQuality(Quality('min7b5', u'\u2300', [0, 3, 6, 10], ('Minor', 3), \
+                   ['b3', 'b5', 'b7', '9'], ['1', 'b3', 'b5', 'b7'], \
+                   enharmonicVoicing=['#2', '#4', '#6', '##1'], \
+                   keys=[((2, 3), 'Minor'), ((1, 3), 'Minor')], group='Minor'))
+AddQuality(Quality('dim7', "dim", [0, 3, 6, 9], ('Diminished', 0), \
+                   ['1', 'b3', 'b5', '6'], ['1', 'b3', 'b5', 'bb7'], \
+                   specialVoicings={'B': ['1', 'b3', 'b5', '7']}, \
+                   keys=None, group='Diminished'))
+AddQuality(Quality('7b9', u'7\u266D9', [0, 1, 4, 7, 10], ('Diminished', 1), \
+                   ['3', '13', 'b7', 'b9'], ['1', '3', '5', 'b7', 'b9'], \
+                   keys=None, group='Diminished'))
+AddQuality(Quality('7sus4', "7sus4", [0, 5, 7, 10], None, \
+                   ['4', '5', 'b7', '9'], ['1', '4', '5', 'b7'], listed=False))
+AddQuality(Quality('aug', "aug", [0, 4, 8], None, \
+                   ['3', '#5', '7', '9'], ['1', '3', '#5'], listed=False))
+
+
+# Integer codes of the qualities and lookup tables indexed by them
+qualityNames = list(qualities.keys())
+qualityCodes = dict((name, code) for (code, name) in enumerate(qualityNames))
+qualitySymbols = [qualities[name].symbol for name in qualityNames]
+
+# Groups of qualities in the menus, as bit masks of the quality codes
+groups = ['Major', 'Minor', 'Diminished']
+groupMasks = dict((group, 0) for group in groups)
+for (code, name) in enumerate(qualityNames):
+    if qualities[name].group is not None:
+        groupMasks[qualities[name].group] |= 1 << code
+
+# Qualities offered in the menus
+listedQualities = [name for name in qualityNames if qualities[name].listed]
+
+# Quality whose chords share their root with each scale kind (e.g. Maj7 for Major)
+scaleQualities = collections.OrderedDict()
+for name in qualityNames:
+    scale = qualities[name].scale
+    if scale is not None and scale[1] == 0 and scale[0] not in scaleQualities:
+        scaleQualities[scale[0]] = name
+
+def GetCode(name):
+    """ Integer code of a quality, None if unknown """
+    return qualityCodes.get(name)
+
+def GetSymbol(name):
+    """ Name of the quality for the GUI (the name itself if unknown) """
+    code = qualityCodes.get(name)
+    if code is None:
+        return name
+
+    return qualitySymbols[code]
+
+def IsInGroup(name, group):
+    """ Whether the quality belongs to the group of the menus """
+    code = qualityCodes.get(name)
+    return code is not None and groupMasks[group] >> code & 1 == 1
@@ -0,0 +1,154 @@
+import heapq
+import itertools
+import random
+import time
+
+class ReviewItem():
+    def __init__(self, interval=0., ease=2.5, due=0., reps=0):
+        # Time until the next review (s)
+        self.interval = interval
+        # Growth factor of the interval after a successful review
+        self.ease = ease
+        # Time of the next review (s since the epoch)
+        self.due = due
+        # Number of reviews so far
+        self.reps = reps
+        # Order of the valid entry for this item in the priority queue
+        self.order = None
+
+class ReviewScheduler():
+    """ Spaced repetition of chords identified by (pitch, quality, mode)
+
+    The items of the current selection are kept in a priority queue ordered
+    by the time of their next review. Outdated queue entries are skipped
+    lazily, so that picking and reviewing an item both take O(log n); the
+    queue is only rebuilt when the selection changes.
+    """
+    # Grades given to a review
+    again = 0
+    good = 1
+    easy = 2
+
+    def __init__(self, rng=random):
+        # Random number generator ordering the new items
+        self.rng = rng
+        # Review state of each (pitch, quality, mode)
+        self.items = {}
+        # Priority queue of (due, order, key) for the selected items
+        self.queue = []
+        self.counter = itertools.count()
+        # Selected pitches, qualities and mode
+        self.selection = (frozenset(), frozenset(), None)
+        self.nbSelected = 0
+
+        # Shortest time between two reviews of the same item (s)
+        self.minInterval = 60.
+        # Lowest ease factor
+        self.minEase = 1.3
+
+    def IsSelected(self, key):
+        (pitch, quality, mode) = key
+        return pitch in self.selection[0] and quality in self.selection[1] and mode == self.selection[2]
+
+    def SetSelection(self, listPitches, listQualities, mode):
+        """ Restrict the items to pick from (new items are due immediately) """
+        self.selection = (frozenset(listPitches), frozenset(listQualities), mode)
+        for pitch in listPitches:
+            for quality in listQualities:
+                if (pitch, quality, mode) not in self.items:
+                    # Due since the beginning of the epoch, in random order
+                    self.items[(pitch, quality, mode)] = ReviewItem(due=self.rng.random())
+
+        self.queue = []
+        for key in self.items:
+            if self.IsSelected(key):
+                item = self.items[key]
+                item.order = next(self.counter)
+                self.queue.append((item.due, item.order, key))
+        heapq.heapify(self.queue)
+        self.nbSelected = len(self.queue)
+
+    def Schedule(self, key, due):
+        item = self.items[key]
+        item.due = due
+        if not self.IsSelected(key):
+            return
+
+        item.order = next(self.counter)
+        heapq.heappush(self.queue, (due, item.order, key))
+
+        # Drop the outdated entries once they make up most of the queue
+        if len(self.queue) > 2 * self.nbSelected + 64:
+            self.queue = [entry for entry in self.queue if self.items[entry[2]].order == entry[1]]
+            heapq.heapify(self.queue)
+
+    def Pick(self, now=None):
+        """ Return the (pitch, quality, mode) to practise next, None if nothing is selected """
+        if now is None:
+            now = time.time()
+
+        while len(self.queue) > 0:
+            (due, order, key) = self.queue[0]
+            if self.items[key].order == order:
+                break
+            heapq.heappop(self.queue)
+        else:
+            return None
+
+        # Put the item back in the queue until it actually gets reviewed
+        self.Schedule(key, max(due, now) + self.minInterval)
+
+        return key
+
+    def Review(self, key, grade, now=None):
+        """ Update the schedule of an item according to how well it was known """
+        if key not in self.items:
+            return
+        if now is None:
+            now = time.time()
+
+        item = self.items[key]
+        if grade == self.again:
+            item.interval = self.minInterval
+            item.ease = max(self.minEase, item.ease - 0.2)
+        elif grade == self.easy:
+            item.interval = max(self.minInterval, item.interval * item.ease * 1.3)
+            item.ease += 0.15
+        else:
+            item.interval = max(self.minInterval, item.interval * item.ease)
+        item.reps += 1
+
+        self.Schedule(key, now + item.interval)
+
+    def Save(self, savefile):
+        f = open(savefile, "w")
+
+        f.write("#Chord Training review state\n")
+        f.write("#pitch\tquality\tmode\tinterval\tease\tdue\treps\n")
+        for key in sorted(self.items.keys()):
+            item = self.items[key]
+            # Items never reviewed are recreated on demand
+            if item.reps == 0:
+                continue
+            f.write("%s\t%s\t%s\t%r\t%r\t%r\t%d\n" % (key + (item.interval, item.ease, item.due, item.reps)))
+
+        f.close()
+
+    def Load(self, savefile):
+        try:
+            with open(savefile) as f:
+                for line in f:
+                    if line.startswith("#"):
+                        continue
+                    items = line.split()
+                    try:
+                        key = (items[0], items[1], items[2])
+                        self.items[key] = ReviewItem(float(items[3]), float(items[4]), \
+                                                     float(items[5]), int(items[6]))
+                    except (IndexError, ValueError):
+                        pass
+        except IOError:
+            pass
+
+        # Rebuild the queue with the loaded state
+        self.SetSelection(self.selection[0], self.selection[1], self.selection[2])
@@ -0,0 +1,87 @@
+import random
+
+class WeightedSampler():
+    """ Draw items with a probability proportional to their weight
+
+    The weights are kept in a Fenwick tree, so that both changing a weight
+    and drawing an item take O(log n). Items are drawn uniformly as long as
+    no weight is positive.
+    """
+    def __init__(self, items, weights=None):
+        self.items = list(items)
+        self.indices = dict((item, index) for (index, item) in enumerate(self.items))
+        self.weights = [0.] * len(self.items)
+        # Fenwick tree (1-based) of the partial sums of the weights
+        self.tree = [0.] * (len(self.items) + 1)
+        self.total = 0.
+        # Number of items which may be drawn (positive weight)
+        self.nbPositive = 0
+        # Largest power of two not exceeding the number of items
+        self.topBit = 1
+        while self.topBit * 2 <= len(self.items):
+            self.topBit *= 2
+
+        for index in range(len(self.items)):
+            if weights is None:
+                self.Update(index, 1.)
+            else:
+                self.Update(index, weights.get(self.items[index], 1.))
+
+    def __len__(self):
+        return len(self.items)
+
+    def Update(self, index, weight):
+        """ Set the weight of the item at the given index """
+        if weight < 0:
+            raise ValueError("Negative weight %r for %r" % (weight, self.items[index]))
+
+        delta = weight - self.weights[index]
+        if delta == 0:
+            return
+        if self.weights[index] > 0:
+            self.nbPositive -= 1
+        if weight > 0:
+            self.nbPositive += 1
+        self.weights[index] = weight
+        self.total += delta
+
+        position = index + 1
+        while position < len(self.tree):
+            self.tree[position] += delta
+            position += position & -position
+
+    def SetWeight(self, item, weight):
+        self.Update(self.indices[item], weight)
+
+    def GetWeight(self, item):
+        return self.weights[self.indices[item]]
+
+    def GetNbCandidates(self):
+        """ Number of distinct items Draw may return """
+        if self.nbPositive == 0:
+            return len(self.items)
+
+        return self.nbPositive
+
+    def Draw(self, rng=random):
+        """ Return a random item (rng: any object providing random() and choice()) """
+        if self.nbPositive == 0:
+            return rng.choice(self.items)
+
+        # Descend the tree to the first item whose cumulative weight exceeds the target
+        target = rng.random() * self.total
+        position = 0
+        step = self.topBit
+        while step > 0:
+            nextPosition = position + step
+            if nextPosition < len(self.tree) and self.tree[nextPosition] <= target:
+                position = nextPosition
+                target -= self.tree[nextPosition]
+            step //= 2
+
+        # Guard against rounding errors in the partial sums
+        index = min(position, len(self.items) - 1)
+        while self.weights[index] == 0:
+            index = (index - 1) % len(self.items)
+
+        return self.items[index]
@@ -1,35 +1,48 @@
-from distutils import spawn
 from subprocess import call, Popen
 import os
 import re
 
+from voicing import GetVoicing, FormatVoicing
+from spelling import GetChordSpelling, GetScaleSpelling
+
 class Score:
     def __init__(self, directory):
         self.directory = directory
+        # Path the lilypond exe needed to generate score images (see FindLilypond)
         self.lilypond = "lilypond"
+        # Whether PIL is available (see FindImageTools)
+        self.imageToolsAvailable = False
         
-        # Path the lilypond exe needed to generate score images
+    def FindLilypond(self):
+        """ Path of the lilypond exe (slow: meant to be run in the background at startup) """
+        from distutils import spawn
         try:
-            self.lilypond = spawn.find_executable("lilypond")
+            lilypond = spawn.find_executable("lilypond")
             # Special cases for windows and mac
-            if self.lilypond is None:
+            if lilypond is None:
                 if os.name == 'nt':
-                    self.lilypond = os.path.normpath(spawn.find_executable("lilypond", "c:/cygwin/bin"))
+                    lilypond = os.path.normpath(spawn.find_executable("lilypond", "c:/cygwin/bin"))
                 elif os.name == 'posix':
                     import platform
                     if platform.system() == "Darwin":
                         path = os.environ['PATH']
                         path += ":/opt/local/bin/"
-                        self.lilypond = os.path.normpath(spawn.find_executable("lilypond", path))
+                        lilypond = os.path.normpath(spawn.find_executable("lilypond", path))
         except:
-            self.lilypond = "lilypond"
+            lilypond = None
         
-        self.imageToolsAvailable = False
+        if lilypond is None:
+            lilypond = "lilypond"
+        
+        return lilypond
+        
+    def FindImageTools(self):
+        """ Whether PIL is available (slow import: meant to be run in the background at startup) """
         try:
             from PIL import Image
-            self.imageToolsAvailable = True
+            return True
         except:
-            pass
+            return False
         
     def IsLilypondAvailable(self):
         return os.path.isfile(self.lilypond)
@@ -48,7 +61,7 @@ class Score:
 melodicMinor = #`((0 . ,NATURAL) (1 . ,NATURAL) (2 . ,FLAT) (3 . ,NATURAL) (4 . ,NATURAL) (5 . ,NATURAL) (6 . ,NATURAL))
 '''
         basisUpperBeginning = '''
-upper = \\relative c' {
+upper = {
   \\clef treble
   \\key c \\major
   %\\time 4/4
@@ -56,8 +69,8 @@ upper = \\relative c' {
         basisUpperContentChord = '''  
   r1
   r
-  <chordForm1>1
-  <chordForm2>1 
+  <upperForm1>1
+  <upperForm2>1 
 '''
         basisContentII_V_I = '''  
   <IIchordForm1>2
@@ -78,21 +91,27 @@ upper = \\relative c' {
   <VchordForm2>2
   <IchordForm1>2
   <IchordForm2>2
+'''
+        basisUpperContentVoicing = '''  
+  <ledVoicing>1
 '''
         basisUpperEnd = '''
 }
 '''
         basisLowerBeginning = '''
-lower = \\relative c {
+lower = {
   \\clef bass
   \\key c \\major
   %\\time 4/4
 '''
         basisLowerContentChord = '''  
-  <chordForm1>1
-  <chordForm2>1 
+  <lowerForm1>1
+  <lowerForm2>1 
   r1
   r
+'''
+        basisLowerContentVoicing = '''  
+  r1
 '''
         basisLowerEnd = '''
 }
@@ -110,14 +129,26 @@ lower = \\relative c {
 }
 '''
         lyfile = chord.GetLyName(scoreRes)
-        content = basisHeader + \
-        basisUpperBeginning + \
-        basisUpperContentChord + \
-        basisUpperEnd + \
-        basisLowerBeginning + \
-        basisLowerContentChord + \
-        basisLowerEnd + \
-        basisFooter
+        if chord.GetVoicing() is None:
+            content = basisHeader + \
+            basisUpperBeginning + \
+            basisUpperContentChord + \
+            basisUpperEnd + \
+            basisLowerBeginning + \
+            basisLowerContentChord + \
+            basisLowerEnd + \
+            basisFooter
+        else:
+            # Single voicing chosen for the chord (e.g. by voice leading)
+            content = basisHeader + \
+            basisUpperBeginning + \
+            basisUpperContentVoicing + \
+            basisUpperEnd + \
+            basisLowerBeginning + \
+            basisLowerContentVoicing + \
+            basisLowerEnd + \
+            basisFooter
+            content = content.replace("ledVoicing", FormatVoicing(chord.GetVoicing(), chord.GetPitch()))
         
         lyfile = os.path.join(self.directory, lyfile)
         
@@ -125,91 +156,23 @@ lower = \\relative c {
         if not overwrite and os.path.isfile(re.sub(r"\.ly", r".preview.png", lyfile)):
             return
         
-        f = open(lyfile, "w")
-                
-        # Substitute the chord placeholder with the actual chord definition for the appropriate qualities (in C)
-        if chord.GetQuality() == "Maj7":
-            content = re.sub(r"chordForm1", r"b c e g", content)
-            content = re.sub(r"chordForm2", r"e g a d", content)
-        elif chord.GetQuality() == "7":
-            content = re.sub(r"chordForm1", r"e a bf d", content)
-            content = re.sub(r"chordForm2", r"bf d e a", content)
-            content = re.sub(r"\\key c \\major", r"\\key f \\major", content)
-        elif chord.GetQuality() == "min7":
-            content = re.sub(r"chordForm1", r"ef g bf d", content)
-            content = re.sub(r"chordForm2", r"bf d ef g", content)
-            content = re.sub(r"\\key c \\major", r"\\key bf \\major", content)
-        elif chord.GetQuality() == "minMaj7":
-            content = re.sub(r"chordForm1", r"ef g b d", content)
-            content = re.sub(r"chordForm2", r"b d ef g", content)
-            content = re.sub(r"\\key c \\major", r"\\key c \\melodicMinor", content)
-        elif chord.GetQuality() == "alt":
-            if chord.GetPitch() == 'Db' or \
-            chord.GetPitch() == 'Eb' or \
-            chord.GetPitch() == 'F' or \
-            chord.GetPitch() == 'Ab' or \
-            chord.GetPitch() == 'Bb':
-                # Avoid very weird key signatures for certain pitches
-                content = re.sub(r"chordForm1", r"e gs as ds", content)
-                content = re.sub(r"chordForm2", r"as ds e gs", content)
-                content = re.sub(r"\\key c \\major", r"\\key cs \\melodicMinor", content)
-            else:
-                content = re.sub(r"chordForm1", r"ff af bf ef", content)
-                content = re.sub(r"chordForm2", r"bf ef ff af", content)
-                content = re.sub(r"\\key c \\major", r"\\key df \\melodicMinor", content)
-            if chord.GetPitch() == 'G' or \
-            chord.GetPitch() == 'Ab' or \
-            chord.GetPitch() == 'A' or \
-            chord.GetPitch() == 'Bb' or \
-            chord.GetPitch() == 'B':
-                # Avoid large number of ledger notes for higher pitches
-                content = re.sub(r"relative c ", r"relative c, ", content)
-                content = re.sub(r"relative c' ", r"relative c ", content)
-        elif chord.GetQuality() == "min7b5":
-            if chord.GetPitch() == 'Db' or \
-            chord.GetPitch() == 'Eb' or \
-            chord.GetPitch() == 'Ab':
-                # Avoid very weird key signatures for certain pitches
-                content = re.sub(r"chordForm1", r"ds fs as css", content)
-                content = re.sub(r"chordForm2", r"as css ds fs", content)
-                content = re.sub(r"\\key c \\major", r"\\key ds \\melodicMinor", content)
-            else:
-                content = re.sub(r"chordForm1", r"ef gf bf d", content)
-                content = re.sub(r"chordForm2", r"bf d ef gf", content)
-                content = re.sub(r"\\key c \\major", r"\\key ef \\melodicMinor", content)
-        elif chord.GetQuality() == "dim7":
-            content = re.sub(r"chordForm1", r"c ef gf a", content)
-            content = re.sub(r"chordForm2", r"c ef gf b", content)
-            indexPitch = chord.pitches.index(chord.GetPitch())
-            indexPitchCompensated = 12 - indexPitch
-            indexPitchCompensated = indexPitchCompensated % len(chord.pitches)
-            pitchCompensatedLy = chord.ConvertToLy(chord.pitches[indexPitchCompensated])
-            if pitchCompensatedLy == "Fs":
-                # Avoid very weird key signatures for F#
-                content = re.sub(r"\\key c \\major", r"\\key gf \\major", content)
-            else:
-                content = re.sub(r"\\key c \\major", r"\\key %s \\major" % (pitchCompensatedLy.lower()), content)
-        elif chord.GetQuality() == "7b9":
-            content = re.sub(r"chordForm1", r"e a bf df", content)
-            content = re.sub(r"chordForm2", r"bf df e a", content)
-            indexPitch = chord.pitches.index(chord.GetPitch())
-            indexPitchCompensated = 12 - indexPitch
-            indexPitchCompensated = indexPitchCompensated % len(chord.pitches)
-            pitchCompensatedLy = chord.ConvertToLy(chord.pitches[indexPitchCompensated])
-            if pitchCompensatedLy == "Fs":
-                # Avoid very weird key signatures for F#
-                content = re.sub(r"\\key c \\major", r"\\key gf \\major", content)
-            else:
-                content = re.sub(r"\\key c \\major", r"\\key %s \\major" % (pitchCompensatedLy.lower()), content)
-        else:
-            # TODO: Other qualities not yet implemented...
-            content = re.sub(r"chordForm1", r"c e g", content)
-            content = re.sub(r"chordForm2", r"c e g", content)
-            scalePitch = 'C'
+        # Key signature (in C), register and spelling of the voicings, looked up for the chord
+        spelling = GetChordSpelling(chord.GetPitch(), chord.GetQuality())
+        content = content.replace("\\key c \\major", spelling.key)
+        
+        # Substitute the chord placeholders with the voicings of the quality (in C),
+        # the left hand one octave below the right hand
+        for (staff, register) in [("upper", spelling.register), ("lower", spelling.register - 1)]:
+            for (form, family) in [("Form1", 'A'), ("Form2", 'B')]:
+                voicing = GetVoicing('C', chord.GetQuality(), family, register, spelling.enharmonic)
+                if voicing is None:
+                    raise ValueError("No voicing for quality %s (not in the quality registry)" % chord.GetQuality())
+                content = content.replace(staff + form, voicing)
         
         # Transpose if needed
         if chord.GetPitch() != 'C':
-            content = re.sub(r"transpose c c", r"transpose c %s" % chord.GetLyPitch().lower(), content)
+            content = content.replace("transpose c c", "transpose c " + spelling.lyPitch)
+        f = open(lyfile, "w")
         f.write(content)
         f.close()
 
@@ -257,12 +220,8 @@ upper = \\NotesWithKeyboard \\relative c' {
             basisUpperContentMajorScale + \
             basisUpperEnd + \
             basisFooter
-            if chord.GetScaleKind() == 'Major':
-                content = re.sub(r"scaleDefinition", r"c d e f g a b c", content)
-            elif chord.GetScaleKind() == 'Minor':
-                content = re.sub(r"scaleDefinition", r"c d ef f g a b c", content)
-            elif chord.GetScaleKind() == 'Diminished':
-                content = re.sub(r"scaleDefinition", r"c d ef f gf af a b c", content)
+            spelling = GetScaleSpelling(chord.GetScalePitch(), chord.GetScaleKind())
+            content = content.replace("scaleDefinition", spelling.notes)
         else:
             # Unsupported mode
             raise
@@ -277,7 +236,7 @@ upper = \\NotesWithKeyboard \\relative c' {
         
         # Transpose if needed
         if chord.GetScalePitch() != 'C':
-            content = re.sub(r"transpose c c", r"transpose c %s" % chord.GetLyScalePitch().lower(), content)
+            content = content.replace("transpose c c", "transpose c " + spelling.lyPitch)
         f.write(content)
         f.close()
 
@@ -560,7 +519,7 @@ NotesWithKeyboard=
                 rc = call(["cat", lyfile], stdout=f)
                 f.close()
             
-                print "rc = %s" % rc
+                print("rc = %s" % rc)
             
             # The lilypond call apparently won't work properly without an explicit stdout redirection...
             lilypondOutputFile = os.path.join(self.directory, "lilypond_outputFile")
@@ -576,28 +535,28 @@ NotesWithKeyboard=
             f.close()
             
             if dbg:
-                print "rc = %s" % rc
+                print("rc = %s" % rc)
 
 #             # Remove the normal .png file (only the .preview.png file is needed)
 #             pngFile = re.sub(r".ly", r".png", lyfile)
 #             try:
 #                 if dbg:
-#                     print "Trying to remove file '%s'" % pngFile
+#                     print("Trying to remove file '%s'" % pngFile)
 #                 os.remove(pngFile)
 #             except:
 #                 if dbg:
-#                     print "Removing png file failed"
+#                     print("Removing png file failed")
 #                 pass
 
             # Remove the .preview.eps file (only the .preview.png file is needed)
             epsFile = re.sub(r".ly", r".preview.eps", lyfile)
             try:
                 if dbg:
-                    print "Trying to remove file '%s'" % epsFile
+                    print("Trying to remove file '%s'" % epsFile)
                 os.remove(epsFile)
             except:
                 if dbg:
-                    print "Removing eps file failed"
+                    print("Removing eps file failed")
                 pass
         except:
-            print "Call to lilypond failed."
\ No newline at end of file
+            print("Call to lilypond failed.")
\ No newline at end of file
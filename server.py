@@ -0,0 +1,431 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+'''
+Training server for a classroom (Python 3): each browser connected to it
+gets its own chord stream, pushed over a WebSocket, while all of them share
+the settings and the cache of score images of the server.
+Options: --host=<address> --port=<port> --directory=<settings and scores>
+'''
+
+import asyncio
+import base64
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+
+from engine import TrainingEngine
+from repetition import ReviewScheduler
+from settings import Settings
+
+defaultPort = 8080
+
+websocketGuid = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# Opcodes of the WebSocket frames
+opText = 0x1
+opClose = 0x8
+opPing = 0x9
+opPong = 0xA
+# Largest frame accepted from a client (the commands are short)
+maxFrameSize = 4096
+# Clients not reading their updates are dropped once this much is waiting for them
+maxWriteBuffer = 256 * 1024
+
+# Score images of the cache, e.g. /res150/chord_C_7.preview.png
+imagePath = re.compile(r"^/(res\d+/[\w.-]+\.png)$")
+# Time browsers may reuse a score image without asking again (s)
+imageMaxAge = 24 * 3600
+# Number of lilypond runs at a time
+imageWorkers = 2
+
+def ParseOptions(argv):
+    """ Options given as --<name>=<value> """
+    options = {}
+    for argument in argv:
+        match = re.match(r"^--(?P<name>[\w-]+)=(?P<value>.*)$", argument)
+        if match is not None:
+            options[match.group('name')] = match.group('value')
+
+    return options
+
+class WebSocket():
+    """ Minimal WebSocket connection (RFC 6455): text messages, ping and close """
+    def __init__(self, reader, writer, mask=False):
+        self.reader = reader
+        self.writer = writer
+        # Clients have to mask their frames, servers must not
+        self.mask = mask
+        self.closed = False
+
+    @staticmethod
+    def GetAccept(key):
+        """ Value of Sec-WebSocket-Accept answering the Sec-WebSocket-Key of a client """
+        return base64.b64encode(hashlib.sha1(key.encode('ascii') + websocketGuid).digest()).decode('ascii')
+
+    def Send(self, text, opcode=opText):
+        """ Queue a message (without waiting: a slow client is dropped rather than waited for) """
+        if self.closed:
+            return
+        if self.writer.transport.get_write_buffer_size() > maxWriteBuffer:
+            self.Close()
+            return
+
+        payload = text.encode('utf-8') if opcode == opText else text
+        header = bytearray([0x80 | opcode])
+        maskBit = 0x80 if self.mask else 0
+        if len(payload) < 126:
+            header.append(maskBit | len(payload))
+        elif len(payload) < 1 << 16:
+            header.append(maskBit | 126)
+            header += struct.pack('>H', len(payload))
+        else:
+            header.append(maskBit | 127)
+            header += struct.pack('>Q', len(payload))
+        if self.mask:
+            key = os.urandom(4)
+            header += key
+            payload = bytes(byte ^ key[index % 4] for (index, byte) in enumerate(payload))
+        self.writer.write(bytes(header) + payload)
+
+    async def Receive(self):
+        """ Next text message, None once the connection is closed """
+        while not self.closed:
+            try:
+                header = await self.reader.readexactly(2)
+                opcode = header[0] & 0x0F
+                length = header[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack('>H', await self.reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack('>Q', await self.reader.readexactly(8))[0]
+                if length > maxFrameSize:
+                    break
+                key = await self.reader.readexactly(4) if header[1] & 0x80 else None
+                payload = await self.reader.readexactly(length)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            if key is not None:
+                payload = bytes(byte ^ key[index % 4] for (index, byte) in enumerate(payload))
+
+            if opcode == opText:
+                return payload.decode('utf-8', 'replace')
+            elif opcode == opPing:
+                self.Send(payload, opPong)
+            elif opcode == opClose:
+                break
+        self.Close()
+
+        return None
+
+    def Close(self):
+        if not self.closed:
+            try:
+                self.Send(b"", opClose)
+            except Exception:
+                pass
+            self.closed = True
+            self.writer.close()
+
+class TrainingSession():
+    """ Chord stream of one browser: its deadlines and the commands of its user """
+    def __init__(self, server, websocket):
+        self.server = server
+        self.websocket = websocket
+        self.engine = server.engine.Fork()
+        self.engine.Start()
+        # Set to reconsider the deadline (command of the user, end of the connection)
+        self.wakeup = asyncio.Event()
+
+    async def Run(self):
+        receiver = asyncio.ensure_future(self.Receive())
+        try:
+            while not receiver.done():
+                timeout = None
+                if self.engine.IsRunning():
+                    timeout = self.engine.clock.GetRemaining()
+                    if timeout <= 0:
+                        self.OnDeadline()
+                        continue
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            receiver.cancel()
+            self.websocket.Close()
+
+    def OnDeadline(self):
+        if not self.engine.Advance():
+            return
+
+        message = self.GetMessage()
+
+        # Append a new chord to the stack and schedule the deadline of the new chord
+        self.engine.ScheduleNext()
+        message['remaining'] = self.engine.clock.GetRemaining()
+        self.websocket.Send(json.dumps(message))
+
+    async def Receive(self):
+        while True:
+            command = await self.websocket.Receive()
+            if command is None:
+                break
+            if command == "next":
+                if self.engine.Next():
+                    self.SendState()
+            elif command == "prev":
+                if self.engine.Prev():
+                    self.SendState()
+                    # Going back to a chord counts as not knowing it
+                    self.engine.ReviewDisplayed(ReviewScheduler.again)
+            elif command == "pause":
+                self.engine.SetPause(not self.engine.pause)
+                self.SendState()
+            self.wakeup.set()
+        self.wakeup.set()
+
+    def SendState(self):
+        self.websocket.Send(json.dumps(self.GetMessage()))
+
+    def GetMessage(self):
+        """ Display state of the session, with the URLs of the score images available """
+        state = self.engine.GetDisplayState()
+        chord = self.engine.displayedChord
+        message = {'chord': state.chord, 'prevChord': state.prevChord, 'nextChord': state.nextChord, \
+                   'scale': state.scale, 'duration': self.engine.clock.duration, \
+                   'remaining': self.engine.clock.GetRemaining(), 'paused': self.engine.pause}
+        for (field, imageMode) in [('chordImage', "Chord"), ('scaleImage', "Scale")]:
+            imageFile = getattr(state, field)
+            message[field] = self.server.GetImageUrl(imageFile)
+            if message[field] is None and imageFile is not None:
+                # Send the state again once the image is there, if still on display
+                generation = self.server.GenerateImage(self.engine, chord, imageMode, imageFile)
+                if generation is not None:
+                    generation.add_done_callback(lambda result, chord=chord, imageFile=imageFile: \
+                                                 self.OnImage(chord, imageFile))
+
+        return message
+
+    def OnImage(self, chord, imageFile):
+        if chord is self.engine.displayedChord and not self.websocket.closed and os.path.isfile(imageFile):
+            self.SendState()
+
+class TrainingServer():
+    """ HTTP server of the page, of the score images and of the WebSockets of the sessions """
+    def __init__(self, directory=None):
+        # Settings shared by the sessions
+        self.engine = TrainingEngine(directory)
+        Settings(self.engine).LoadSettings()
+
+        # Score images being generated (path: future) and those lilypond failed to generate
+        self.generating = {}
+        self.failed = set()
+        self.imageExecutor = concurrent.futures.ThreadPoolExecutor(imageWorkers)
+        self.sessions = set()
+
+    async def Serve(self, host, port):
+        loop = asyncio.get_running_loop()
+        self.engine.score.lilypond = await loop.run_in_executor(None, self.engine.score.FindLilypond)
+        server = await asyncio.start_server(self.HandleConnection, host, port)
+        return server
+
+    def GetImageUrl(self, imageFile):
+        """ URL of a score image of the cache, None if it does not exist (yet) """
+        if imageFile is None or not os.path.isfile(imageFile):
+            return None
+
+        return "/" + os.path.relpath(imageFile, self.engine.directory).replace(os.sep, "/")
+
+    def GenerateImage(self, engine, chord, imageMode, imageFile):
+        """ Have lilypond generate a score image once for all sessions (future, None if it failed before) """
+        if imageFile in self.failed:
+            return None
+        generation = self.generating.get(imageFile)
+        if generation is None:
+            loop = asyncio.get_running_loop()
+            if imageMode == "Chord":
+                generate = engine.score.GenerateImage
+            else:
+                generate = engine.score.GenerateScaleImage
+            generation = loop.run_in_executor(self.imageExecutor, generate, chord, engine.scoreRes, True)
+            generation.add_done_callback(lambda result: self.OnImage(imageFile))
+            self.generating[imageFile] = generation
+
+        return generation
+
+    def OnImage(self, imageFile):
+        del self.generating[imageFile]
+        if not os.path.isfile(imageFile):
+            self.failed.add(imageFile)
+
+    async def HandleConnection(self, reader, writer):
+        try:
+            while True:
+                request = await self.ReadRequest(reader)
+                if request is None:
+                    break
+                (method, path, headers) = request
+                if path == "/ws" and headers.get('upgrade', '').lower() == "websocket":
+                    await self.RunSession(reader, writer, headers)
+                    break
+                keepAlive = self.Respond(writer, method, path, headers)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def ReadRequest(self, reader):
+        """ Method, path and headers (lower-case names) of the next request, None at the end of the connection """
+        try:
+            data = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        lines = data.decode('latin-1').split("\r\n")
+        (method, path, version) = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                (name, value) = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        if version == "HTTP/1.0" and headers.get('connection', '').lower() != "keep-alive":
+            headers['connection'] = "close"
+
+        return (method, path.split("?", 1)[0], headers)
+
+    async def RunSession(self, reader, writer, headers):
+        key = headers.get('sec-websocket-key')
+        if key is None:
+            return
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n" \
+                      "Sec-WebSocket-Accept: %s\r\n\r\n" % WebSocket.GetAccept(key)).encode('ascii'))
+        session = TrainingSession(self, WebSocket(reader, writer))
+        self.sessions.add(session)
+        try:
+            await session.Run()
+        finally:
+            self.sessions.discard(session)
+
+    def Respond(self, writer, method, path, headers):
+        """ Answer a request for the page or a score image, return whether to keep the connection """
+        keepAlive = headers.get('connection', '').lower() != "close"
+        if method not in ["GET", "HEAD"]:
+            self.WriteResponse(writer, "405 Method Not Allowed", {'Allow': "GET, HEAD"}, b"", keepAlive)
+            return keepAlive
+
+        if path == "/":
+            self.WriteResponse(writer, "200 OK", {'Content-Type': "text/html; charset=utf-8", \
+                                                  'Cache-Control': "no-cache"}, page, keepAlive, method)
+            return keepAlive
+
+        match = imagePath.match(path)
+        imageFile = None
+        if match is not None:
+            imageFile = os.path.join(self.engine.directory, *match.group(1).split("/"))
+        if imageFile is None or not os.path.isfile(imageFile):
+            self.WriteResponse(writer, "404 Not Found", {}, b"", keepAlive)
+            return keepAlive
+
+        # The images of the cache only change if regenerated: revalidate by modification time and size
+        stat = os.stat(imageFile)
+        tag = '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+        cacheHeaders = {'Cache-Control': "public, max-age=%d" % imageMaxAge, 'ETag': tag}
+        if headers.get('if-none-match') == tag:
+            self.WriteResponse(writer, "304 Not Modified", cacheHeaders, b"", keepAlive)
+            return keepAlive
+
+        with open(imageFile, 'rb') as f:
+            body = f.read()
+        cacheHeaders['Content-Type'] = "image/png"
+        self.WriteResponse(writer, "200 OK", cacheHeaders, body, keepAlive, method)
+
+        return keepAlive
+
+    def WriteResponse(self, writer, status, headers, body, keepAlive, method="GET"):
+        lines = ["HTTP/1.1 " + status]
+        for name in sorted(headers.keys()):
+            lines.append("%s: %s" % (name, headers[name]))
+        lines.append("Content-Length: %d" % len(body))
+        lines.append("Connection: " + ("keep-alive" if keepAlive else "close"))
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+        if method != "HEAD":
+            writer.write(body)
+
+# Page of the students: displays the state pushed by the server and sends the keys
+page = b'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Chord Training</title>
+<style>
+body { font-family: sans-serif; text-align: center; }
+#chords { display: flex; justify-content: space-between; align-items: baseline; margin: 1em; }
+#prevChord, #nextChord { color: grey; font-size: 2em; }
+#chord { font-size: 5em; font-weight: bold; }
+#scale { font-size: 2em; }
+#bar { height: 0.5em; background: steelblue; width: 0; }
+</style></head>
+<body>
+<div id="chords"><span id="prevChord"></span><span id="chord"></span><span id="nextChord"></span></div>
+<div id="scale"></div>
+<div><img id="chordImage"> <img id="scaleImage"></div>
+<div id="bar"></div>
+<div id="status"></div>
+<script>
+var socket = new WebSocket((location.protocol == "https:" ? "wss://" : "ws://") + location.host + "/ws");
+socket.onmessage = function(event) {
+  var state = JSON.parse(event.data);
+  ["chord", "prevChord", "nextChord", "scale"].forEach(function(field) {
+    document.getElementById(field).textContent = state[field];
+  });
+  ["chordImage", "scaleImage"].forEach(function(field) {
+    var image = document.getElementById(field);
+    image.style.visibility = state[field] ? "visible" : "hidden";
+    if (state[field]) image.src = state[field];
+  });
+  // Progress of the chord: from the time elapsed to the deadline
+  var bar = document.getElementById("bar");
+  bar.style.transition = "none";
+  bar.style.width = (100 * (1 - state.remaining / state.duration)) + "%";
+  if (!state.paused) {
+    bar.offsetWidth;
+    bar.style.transition = "width " + Math.max(0, state.remaining) + "s linear";
+    bar.style.width = "100%";
+  }
+  document.getElementById("status").textContent = state.paused ? "(Paused)" : "";
+};
+socket.onclose = function() { document.getElementById("status").textContent = "(Disconnected)"; };
+document.onkeydown = function(event) {
+  var commands = {" ": "pause", "ArrowLeft": "prev", "ArrowRight": "next"};
+  if (event.key in commands) {
+    socket.send(commands[event.key]);
+    event.preventDefault();
+  }
+};
+</script>
+</body></html>
+'''
+
+def main():
+    options = ParseOptions(sys.argv[1:])
+    host = options.get('host', "")
+    port = int(options.get('port', defaultPort))
+    trainingServer = TrainingServer(options.get('directory'))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = loop.run_until_complete(trainingServer.Serve(host, port))
+    print("Serving on port %d" % server.sockets[0].getsockname()[1])
+    sys.stdout.flush()
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    server.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,46 +1,82 @@
+import collections
 import re
 
+# Sections of the settings file belonging to the view (the wx frame)
+viewSections = ["WindowSize", "FontSize", "CanvasDisplay", "StayOn", "TimingOverlay"]
+
 class Settings():
-    def __init__(self, chordTraining):
+    """ Settings file of the training engine and of its view
+
+    Without a view (e.g. headless driver of the engine), the sections of
+    the view are kept as read and written back unchanged.
+    """
+    def __init__(self, engine, chordTraining=None):
+        self.engine = engine
         self.chordTraining = chordTraining
+        # Lines of the view sections, when there is no view
+        self.viewLines = collections.OrderedDict()
 
     def SaveSettings(self, event = None, savefile = None):
         # Use the default (autosave) file if none explicitly given
         if (savefile is None):
-            savefile = self.chordTraining.savefile
+            savefile = self.engine.savefile
         
         f = open(savefile, "w")
         
         f.write("#Chord Training settings\n")
         f.write("Tones:\n")
-        for tone in self.chordTraining.pitches.keys():
-            f.write("\t%s\t%s\n" % (tone, self.chordTraining.pitches[tone]))
+        for tone in self.engine.pitches.keys():
+            f.write("\t%s\t%s\n" % (tone, self.engine.pitches[tone]))
         f.write("Qualities:\n")
-        for quality in self.chordTraining.qualities.keys():
-            f.write("\t%s\t%s\n" % (quality, self.chordTraining.qualities[quality]))
+        for quality in self.engine.qualities.keys():
+            f.write("\t%s\t%s\n" % (quality, self.engine.qualities[quality]))
+        f.write("ToneWeights:\n")
+        for tone in self.engine.pitchWeights.keys():
+            f.write("\t%s\t%g\n" % (tone, self.engine.pitchWeights[tone]))
+        f.write("QualityWeights:\n")
+        for quality in self.engine.qualityWeights.keys():
+            f.write("\t%s\t%g\n" % (quality, self.engine.qualityWeights[quality]))
         f.write("Mode:\n")
-        for mode in self.chordTraining.modes.keys():
-            if self.chordTraining.modes[mode]:
+        for mode in self.engine.modes.keys():
+            if self.engine.modes[mode]:
                 f.write("\t%s\n" % mode)
         f.write("Duration:\n")
-        f.write("%d\n" % self.chordTraining.duration)
-        f.write("WindowSize:\n")
-        size = self.chordTraining.GetSize()
-        # Add a pixel to the actual size to prevent messed up layout upon restart
-        correction  = 1
-        f.write("\t%d\t%d\n" % (size.x + correction, size.y + correction))
-        f.write("FontSize:\n")
-        f.write("\t%d\n" % self.chordTraining.fontSize)
+        f.write("%d\n" % self.engine.duration)
         f.write("ScoreResolution:\n")
-        f.write("\t%d\n" % self.chordTraining.scoreRes)
+        f.write("\t%d\n" % self.engine.scoreRes)
         f.write("SingleThread:\n")
-        f.write("\t%r\n" % self.chordTraining.singleThread)
+        f.write("\t%r\n" % self.engine.singleThread)
         f.write("DisplayScore:\n")
-        f.write("\t%s\n" % self.chordTraining.displayScore)
+        f.write("\t%s\n" % self.engine.displayScore)
         f.write("DisplayScale:\n")
-        f.write("\t%s\n" % self.chordTraining.displayScale)
-        f.write("StayOn:\n")
-        f.write("\t%s\n" % self.chordTraining.moveMouse)
+        f.write("\t%s\n" % self.engine.displayScale)
+        f.write("SpacedRepetition:\n")
+        f.write("\t%s\n" % self.engine.spacedRepetition)
+        f.write("VoiceLeading:\n")
+        f.write("\t%s\n" % self.engine.voiceLeading)
+        f.write("Seed:\n")
+        f.write("\t%s\n" % self.engine.seed)
+        f.write("ResumeSession:\n")
+        f.write("\t%s\n" % self.engine.resumeSession)
+        if self.chordTraining is not None:
+            f.write("WindowSize:\n")
+            size = self.chordTraining.GetSize()
+            # Add a pixel to the actual size to prevent messed up layout upon restart
+            correction  = 1
+            f.write("\t%d\t%d\n" % (size.x + correction, size.y + correction))
+            f.write("FontSize:\n")
+            f.write("\t%d\n" % self.chordTraining.fontSize)
+            f.write("CanvasDisplay:\n")
+            f.write("\t%s\n" % self.chordTraining.canvasDisplay)
+            f.write("StayOn:\n")
+            f.write("\t%s\n" % self.chordTraining.moveMouse)
+            f.write("TimingOverlay:\n")
+            f.write("\t%s\n" % self.chordTraining.timingOverlay)
+        else:
+            for section in self.viewLines.keys():
+                f.write("%s:\n" % section)
+                for line in self.viewLines[section]:
+                    f.write("%s\n" % line)
                                 
         f.close()
 
@@ -50,7 +86,7 @@ class Settings():
             context = None
             # Use the default (autosave) file if none explicitly given
             if (savefile is None):
-                savefile = self.chordTraining.savefile
+                savefile = self.engine.savefile
             
             with open(savefile) as f:
                 for line in f:
@@ -62,6 +98,9 @@ class Settings():
                     if match is not None:
                         context = match.group('section')
                         continue
+                    if context in viewSections and self.chordTraining is None:
+                        self.viewLines.setdefault(context, []).append(line)
+                        continue
                     items = line.split()
                     
                     if context == "Tones":
@@ -70,26 +109,36 @@ class Settings():
                             state = items[1].lower() == 'true'
                         except:
                             state = False
-                        if tone in self.chordTraining.pitches.keys():
-                            self.chordTraining.pitches[tone] = state
+                        if tone in self.engine.pitches.keys():
+                            self.engine.pitches[tone] = state
                     elif context == "Qualities":
                         quality = items[0]
                         try:
                             state = items[1].lower() == 'true'
                         except:
                             state = False
-                        if quality in self.chordTraining.qualities.keys():
-                            self.chordTraining.qualities[quality] = state              
+                        if quality in self.engine.qualities.keys():
+                            self.engine.qualities[quality] = state              
+                    elif context == "ToneWeights":
+                        tone = items[0]
+                        weight = float(items[1])
+                        if tone in self.engine.pitchWeights.keys() and weight >= 0:
+                            self.engine.pitchWeights[tone] = weight
+                    elif context == "QualityWeights":
+                        quality = items[0]
+                        weight = float(items[1])
+                        if quality in self.engine.qualityWeights.keys() and weight >= 0:
+                            self.engine.qualityWeights[quality] = weight
                     elif context == "Mode":
                         mode = items[0]
-                        for modeTest in self.chordTraining.modes.keys():
+                        for modeTest in self.engine.modes.keys():
                             if mode == modeTest:
-                                self.chordTraining.modes[modeTest] = True
+                                self.engine.modes[modeTest] = True
                             else:
-                                self.chordTraining.modes[modeTest] = False
+                                self.engine.modes[modeTest] = False
                     elif context == "Duration":
                         duration = int(items[0])
-                        self.chordTraining.duration = duration
+                        self.engine.duration = duration
                     elif context == "WindowSize":
                         self.chordTraining.windowSizeX = int(items[0])
                         self.chordTraining.windowSizeY = int(items[1])
@@ -101,61 +150,92 @@ class Settings():
                             else:
                                 self.chordTraining.fontSizes[fontSize] = False
                     elif context == "ScoreResolution":
-                        self.chordTraining.scoreRes = int(items[0])
-                        for scoreRes in self.chordTraining.scoreRess.keys():
-                            if int(scoreRes) == self.chordTraining.scoreRes:
-                                self.chordTraining.scoreRess[scoreRes] = True
+                        self.engine.scoreRes = int(items[0])
+                        for scoreRes in self.engine.scoreRess.keys():
+                            if int(scoreRes) == self.engine.scoreRes:
+                                self.engine.scoreRess[scoreRes] = True
                             else:
-                                self.chordTraining.scoreRess[scoreRes] = False
+                                self.engine.scoreRess[scoreRes] = False
                     elif context == "SingleThread":
                         if items[0].lower() == 'false':
-                            self.chordTraining.singleThread = False
+                            self.engine.singleThread = False
                         else:
-                            self.chordTraining.singleThread = True
+                            self.engine.singleThread = True
                     elif context == "DisplayScore":
                         if items[0].lower() == 'false':
-                            self.chordTraining.displayScore = False
+                            self.engine.displayScore = False
                         else:
-                            self.chordTraining.displayScore = True
+                            self.engine.displayScore = True
                     elif context == "DisplayScale":
                         if items[0].lower() == 'false':
-                            self.chordTraining.displayScale = False
+                            self.engine.displayScale = False
                         else:
-                            self.chordTraining.displayScale = True
+                            self.engine.displayScale = True
                     elif context == "StayOn":
                         if items[0].lower() == 'false':
                             self.chordTraining.moveMouse = False
                         else:
                             self.chordTraining.moveMouse = True                                
+                    elif context == "SpacedRepetition":
+                        if items[0].lower() == 'false':
+                            self.engine.spacedRepetition = False
+                        else:
+                            self.engine.spacedRepetition = True
+                    elif context == "CanvasDisplay":
+                        if items[0].lower() == 'false':
+                            self.chordTraining.canvasDisplay = False
+                        else:
+                            self.chordTraining.canvasDisplay = True
+                    elif context == "VoiceLeading":
+                        if items[0].lower() == 'false':
+                            self.engine.voiceLeading = False
+                        else:
+                            self.engine.voiceLeading = True
+                    elif context == "TimingOverlay":
+                        if items[0].lower() == 'false':
+                            self.chordTraining.timingOverlay = False
+                        else:
+                            self.chordTraining.timingOverlay = True
+                    elif context == "ResumeSession":
+                        if items[0].lower() == 'false':
+                            self.engine.resumeSession = False
+                        else:
+                            self.engine.resumeSession = True
+                    elif context == "Seed":
+                        if items[0].lower() == 'none':
+                            self.engine.seed = None
+                        else:
+                            self.engine.seed = int(items[0])
         except:
             pass
 
         # Check that the data read makes sense
         # There should be only one mode selected
         nbModes = 0
-        for mode in self.chordTraining.modes.keys():
-            if self.chordTraining.modes[mode]:
+        for mode in self.engine.modes.keys():
+            if self.engine.modes[mode]:
                 nbModes += 1
         if nbModes != 1:
             first = True
-            for mode in self.chordTraining.modes:
+            for mode in self.engine.modes:
                 if first:
-                    self.chordTraining.modes[mode] = True
+                    self.engine.modes[mode] = True
                 else:
-                    self.chordTraining.modes[mode] = False
+                    self.engine.modes[mode] = False
                 first = False
                 
         # The duration should be an integer value between durationMin and durationMax
-        if (self.chordTraining.duration < self.chordTraining.durationMin or \
-            self.chordTraining.duration > self.chordTraining.durationMax):
-            self.chordTraining.duration = int((self.chordTraining.durationMax - self.chordTraining.durationMin) / 2 + 1)
+        if (self.engine.duration < self.engine.durationMin or \
+            self.engine.duration > self.engine.durationMax):
+            self.engine.duration = int((self.engine.durationMax - self.engine.durationMin) / 2 + 1)
             
         # Check that the given font size is legal
         nbFontSizes = 0
-        for fontSize in self.chordTraining.fontSizes.keys():
-            if self.chordTraining.fontSizes[fontSize]:
-                nbFontSizes += 1
-        if nbFontSizes != 1:
+        if self.chordTraining is not None:
+            for fontSize in self.chordTraining.fontSizes.keys():
+                if self.chordTraining.fontSizes[fontSize]:
+                    nbFontSizes += 1
+        if self.chordTraining is not None and nbFontSizes != 1:
             first = True
             for fontSize in self.chordTraining.fontSizes.keys():
                 if first:
@@ -167,46 +247,15 @@ class Settings():
 
         # Check that the given score resolution is legal
         nbScoreRess = 0
-        for scoreRes in self.chordTraining.scoreRess.keys():
-            if self.chordTraining.scoreRess[scoreRes]:
+        for scoreRes in self.engine.scoreRess.keys():
+            if self.engine.scoreRess[scoreRes]:
                 nbScoreRess += 1
         if nbScoreRess != 1:
             first = True
-            for scoreRes in self.chordTraining.scoreRess.keys():
+            for scoreRes in self.engine.scoreRess.keys():
                 if first:
-                    self.chordTraining.scoreRess[scoreRes] = True
-                    self.chordTraining.scoreRes = int(scoreRes)
+                    self.engine.scoreRess[scoreRes] = True
+                    self.engine.scoreRes = int(scoreRes)
                     first = False
                 else:
-                    self.chordTraining.scoreRess[scoreRes] = False
-                    
-        # Synchronize the menus to the data we just read
-        for tone in self.chordTraining.pitches.keys():
-            self.chordTraining.tonesMenu.Check(self.chordTraining.tonesMenuId[tone], self.chordTraining.pitches[tone])
-
-        for mode in self.chordTraining.modes.keys():
-            self.chordTraining.modeMenu.Check(self.chordTraining.modeMenuId[mode], self.chordTraining.modes[mode])
-            
-        for quality in self.chordTraining.qualities.keys():
-            self.chordTraining.qualitiesMenu.Check(self.chordTraining.qualitiesMenuId[quality], \
-                                                   self.chordTraining.qualities[quality])
-
-        try:
-            self.chordTraining.durationMenu.Check(self.chordTraining.durationMenuId[self.chordTraining.duration], True)
-        except:
-            pass
-                
-        try:
-            self.chordTraining.fontSizeMenu.Check(self.chordTraining.fontSizeMenuId[str(self.chordTraining.fontSize)], True)
-        except:
-            pass
-
-        try:
-            self.chordTraining.scoreResMenu.Check(self.chordTraining.scoreResMenuId[str(self.chordTraining.scoreRes)], True)
-        except:
-            pass
-        
-        self.chordTraining.settingsMenu.Check(self.chordTraining.singleThreadId, self.chordTraining.singleThread)
-        self.chordTraining.settingsMenu.Check(self.chordTraining.displayScoreId, self.chordTraining.displayScore)
-        self.chordTraining.settingsMenu.Check(self.chordTraining.displayScaleId, self.chordTraining.displayScale)
-        self.chordTraining.settingsMenu.Check(self.chordTraining.stayOnId, self.chordTraining.moveMouse)
\ No newline at end of file
+                    self.engine.scoreRess[scoreRes] = False
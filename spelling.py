@@ -0,0 +1,110 @@
+import collections
+
+from theory import circleOfFifths, scaleSteps
+from voicing import letters, naturals, ParsePitch
+from quality import qualities
+
+# Lilypond spelling of a chord:
+# - lyPitch: lilypond name of the root (for '\transpose c <lyPitch>')
+# - key: key signature written in C, before the transposition to the root
+# - enharmonic: whether the voicings use the alternative (sharp) spelling
+# - register: octave of the c closest to the lowest note of the upper voicings
+ChordSpelling = collections.namedtuple('ChordSpelling', ['lyPitch', 'key', 'enharmonic', 'register'])
+
+# Key signature of each quality, as candidate tonics (staff steps and semitones
+# above the root) with their scale; the candidate leading to the fewest
+# accidentals is taken, the first one in case of a tie. The second candidate,
+# if any, is the alternative spelling of the voicings.
+qualityKeys = dict((name, qualities[name].keys) for name in qualities if qualities[name].keys is not None)
+
+# Qualities written without key signature (no key fits the diminished scale)
+atonalQualities = [name for name in qualities if qualities[name].keys is None]
+
+# Roots for which the upper voicings are written an octave lower, to avoid
+# a large number of ledger lines
+lowRoots = dict((name, qualities[name].lowRoots) for name in qualities)
+
+# Lilypond names of the modes of the scales
+lyModes = {'Major': "major", 'Minor': "melodicMinor"}
+
+lyAccidentals = {-2: 'ff', -1: 'f', 0: '', 1: 's', 2: 'ss'}
+
+def ConvertToLy(pitch):
+    """ Lilypond (english) name of a pitch, keeping the case of the letter ('Bb' -> 'Bf') """
+    if pitch in lyNames:
+        return lyNames[pitch]
+
+    return pitch[:1] + pitch[1:].replace('b', 'f').replace('#', 's')
+
+def GetLyTonic(letter, semitones):
+    """ Lilypond name of the note with the given letter index and semitones above c (modulo 12) """
+    alteration = (semitones - naturals[letter] + 6) % 12 - 6
+    return letters[letter] + lyAccidentals[alteration]
+
+def CountAccidentals(letter, semitones, kind):
+    """ Number of accidentals (a double one counting twice) of the scale on the given tonic """
+    count = 0
+    for (index, step) in enumerate(scaleSteps[kind]):
+        noteLetter = (letter + index) % 7
+        count += abs((semitones + step - naturals[noteLetter] + 6) % 12 - 6)
+
+    return count
+
+def BuildChordSpelling(pitch, quality):
+    (rootLetter, rootAlteration) = ParsePitch(pitch)
+    rootSemitones = naturals[rootLetter] + rootAlteration
+
+    enharmonic = False
+    if quality in qualityKeys:
+        best = None
+        for (index, ((steps, semitones), kind)) in enumerate(qualityKeys[quality]):
+            # Accidentals of the key once transposed to the root
+            count = CountAccidentals((rootLetter + steps) % 7, rootSemitones + semitones, kind)
+            if best is None or count < best[0]:
+                best = (count, index, GetLyTonic(steps, semitones), kind)
+        (count, index, tonic, kind) = best
+        key = "\\key %s \\%s" % (tonic, lyModes[kind])
+        enharmonic = index > 0
+    elif quality in atonalQualities:
+        # C major once transposed to the root
+        key = "\\key %s \\major" % GetLyTonic(-rootLetter % 7, -rootSemitones)
+    else:
+        key = "\\key c \\major"
+
+    register = 1
+    if pitch in lowRoots.get(quality, []):
+        register = 0
+
+    return ChordSpelling(ConvertToLy(pitch).lower(), key, enharmonic, register)
+
+# Lilypond names of all pitches
+lyNames = dict((pitch, pitch[:1] + pitch[1:].replace('b', 'f').replace('#', 's')) for pitch in circleOfFifths)
+
+# Spelling of every chord (pitch, quality)
+chordSpellings = dict(((pitch, quality), BuildChordSpelling(pitch, quality)) \
+                      for pitch in circleOfFifths for quality in qualities)
+
+def GetChordSpelling(pitch, quality):
+    """ Spelling of the chord, computed on the fly for chords outside the table """
+    spelling = chordSpellings.get((pitch, quality))
+    if spelling is None:
+        spelling = ChordSpelling(ConvertToLy(pitch).lower(), "\\key c \\major", False, 1)
+
+    return spelling
+
+# Lilypond spelling of a scale: name of its root (for '\transpose c <lyPitch>')
+# and notes of the scale in C
+ScaleSpelling = collections.namedtuple('ScaleSpelling', ['lyPitch', 'notes'])
+
+# Notes of each scale kind in C (relative octaves)
+scaleNotes = {}
+scaleNotes['Major'] = "c d e f g a b c"
+scaleNotes['Minor'] = "c d ef f g a b c"
+scaleNotes['Diminished'] = "c d ef f gf af a b c"
+
+# Spelling of every scale (pitch, kind)
+scaleSpellings = dict(((pitch, kind), ScaleSpelling(ConvertToLy(pitch).lower(), scaleNotes[kind])) \
+                      for pitch in circleOfFifths for kind in scaleNotes)
+
+def GetScaleSpelling(pitch, kind):
+    return scaleSpellings[(pitch, kind)]
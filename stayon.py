@@ -1,53 +1,172 @@
 import os
+import subprocess
+import threading
+
+def findProgram(name):
+    # Path of the program in the PATH, None if not found
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+class WindowsBackend:
+    """ Reset the idle timers of Windows """
+    name = "windows"
+
+    # Flags of SetThreadExecutionState: keep the system and the display on
+    systemRequired = 0x1
+    displayRequired = 0x2
+
+    def initialise(self):
+        if os.name != 'nt':
+            return False
+        import ctypes
+        self.setExecutionState = ctypes.windll.kernel32.SetThreadExecutionState
+        return True
+
+    def poke(self):
+        self.setExecutionState(self.systemRequired | self.displayRequired)
+
+class XdgScreensaverBackend:
+    """ Reset the screensaver through xdg-utils (desktops of Linux and the like) """
+    name = "xdg-screensaver"
+
+    def initialise(self):
+        if os.name != 'posix' or "DISPLAY" not in os.environ:
+            return False
+        self.program = findProgram("xdg-screensaver")
+        return self.program is not None
+
+    def poke(self):
+        with open(os.devnull, "w") as devnull:
+            subprocess.call([self.program, "reset"], stdout=devnull, stderr=devnull)
+
+class MouseBackend:
+    """ Move the mouse by one pixel, in turn in each direction (needs the PyMouse framework) """
+    name = "mouse"
 
-class StayOn:
     def __init__(self):
-        self.pyMouseEnabled = False
-        # Disable import of pymouse for debug purposes 
-        # (makes startup extremely slow)
-        if "DISABLE_STAYON" in os.environ:
-            return
-     
+        # Mouse displacement
+        self.mouseDx = (0,1)
+
+        # Movement amplitude
+        self.amplitude = 1
+
+    def initialise(self):
         # Use the PyMouse framework to move the mouse periodically
+        # (its import is extremely slow)
         try:
             from pymouse import PyMouse
-            self.pyMouseEnabled = True
         except:
             # Give up in case the PyMouse framework cannot be found
-            return
+            return False
 
-        # Total time elapsed since the mouse was last moved to avoid letting the screensavec start
-        self.mouseElapsedTime = 0
-    
-        # Time period after which the mouse should be moved in order to prevent the screensaver from starting (s)
-        self.mouseRefreshPeriod = 30
-        
         # Mouse object to prevent the screensaver from starting
         self.mouse = PyMouse()
-        
-        # Mouse displacement
-        self.mouseDx = (0,1)
-        
-        # Movement amplitude
-        self.amplitude = 1
-        
+        return True
+
+    def poke(self):
+        position = self.mouse.position()
+        self.mouse.move(position[0] + self.mouseDx[0]*self.amplitude, position[1] + self.mouseDx[1]*self.amplitude)
+        if self.mouseDx == (0,1):
+            self.mouseDx = (1,0)
+        elif self.mouseDx == (1,0):
+            self.mouseDx = (0,-1)
+        elif self.mouseDx == (0,-1):
+            self.mouseDx = (-1,0)
+        elif self.mouseDx == (-1,0):
+            self.mouseDx = (0,1)
+
+class DummyBackend:
+    """ Stand-in counting the requests (for tests) """
+    name = "dummy"
+
+    def __init__(self, available=True):
+        self.available = available
+        self.pokes = 0
+
+    def initialise(self):
+        return self.available
+
+    def poke(self):
+        self.pokes += 1
+
+class StayOn:
+    """ Service preventing the screensaver from starting, on its own thread
+
+    The first backend that can be initialised is taken (in the background,
+    since some are slow to initialise); while the service is active, the
+    backend is poked at regular intervals.
+    """
+    def __init__(self, backends=None, period=30):
+        if backends is None:
+            backends = [WindowsBackend(), XdgScreensaverBackend(), MouseBackend()]
+        self.backends = backends
+        # Backend in use (None: none available)
+        self.backend = None
+
+        # Time period after which the screensaver should be prevented again from starting (s)
+        self.period = period
+
+        self.active = False
+        self.running = False
+        self.thread = None
+        # Set once the backend was chosen
+        self.ready = threading.Event()
+        # Set to interrupt the wait between two pokes
+        self.wakeup = threading.Event()
+
+    def start(self):
+        # Initialise the backend and run the service in the background
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+    def waitReady(self, timeout=None):
+        # Wait until the backend is chosen, return whether it is
+        self.ready.wait(timeout)
+        return self.ready.is_set()
+
     def isEnabled(self):
-        return self.pyMouseEnabled
-    
-    def moveMouse(self, elapsedTime):
-        # elapsedTime: Time elapsed since last call (in s)
-        if self.pyMouseEnabled:
-            self.mouseElapsedTime += elapsedTime
-            if self.mouseElapsedTime >= self.mouseRefreshPeriod:
-                self.mouseElapsedTime = 0
-                position = self.mouse.position()
-                self.mouse.move(position[0] + self.mouseDx[0]*self.amplitude, position[1] + self.mouseDx[1]*self.amplitude)
-                if self.mouseDx == (0,1):
-                    self.mouseDx = (1,0)
-                elif self.mouseDx == (1,0):
-                    self.mouseDx = (0,-1)
-                elif self.mouseDx == (0,-1):
-                    self.mouseDx = (-1,0)
-                elif self.mouseDx == (-1,0):
-                    self.mouseDx = (0,1)
-        
+        return self.backend is not None
+
+    def getName(self):
+        if self.backend is None:
+            return None
+        return self.backend.name
+
+    def setActive(self, active):
+        # Prevent the screensaver from starting (or not) from now on
+        if active != self.active:
+            self.active = active
+            self.wakeup.set()
+
+    def run(self):
+        # Disable the service for debug purposes
+        if "DISABLE_STAYON" not in os.environ:
+            for backend in self.backends:
+                try:
+                    available = backend.initialise()
+                except:
+                    available = False
+                if available:
+                    self.backend = backend
+                    break
+        self.ready.set()
+
+        while self.running and self.backend is not None:
+            if self.active:
+                try:
+                    self.backend.poke()
+                except:
+                    pass
+            self.wakeup.wait(self.period)
+            self.wakeup.clear()
@@ -0,0 +1,143 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Terminal frontend of the chord training (curses: serial console, SSH),
+without wx nor X. Same keys as the window: space (pause), left/right
+(previous/next chord), Esc (quit), F5 (redraw).
+'''
+
+import curses
+import locale
+import os
+
+from engine import TrainingEngine
+from repetition import ReviewScheduler
+from settings import Settings
+
+# Do not wait a second to tell the Esc key from the start of an escape sequence
+os.environ.setdefault("ESCDELAY", "25")
+
+# Longest and shortest wait for a key between two updates of the progress bar (s)
+maxPeriod = 1.
+minPeriod = .05
+
+class TerminalTraining():
+    """ Training session displayed in a terminal """
+    def __init__(self, screen, engine=None):
+        self.screen = screen
+        if engine is None:
+            engine = TrainingEngine()
+        self.engine = engine
+        # Settings without view: the sections of the window are kept as they are
+        self.settings = Settings(self.engine)
+        self.settings.LoadSettings()
+        self.engine.Start()
+
+        # Encoding of the chord names for Python 2 (sharps, flats and the like)
+        self.encoding = locale.getpreferredencoding() or "ascii"
+        self.state = None
+        self.running = True
+
+        self.screen.keypad(True)
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+
+    def Run(self):
+        try:
+            while self.running:
+                if self.engine.IsRunning() and self.engine.clock.GetRemaining() <= 0:
+                    self.OnDeadline()
+                if self.state is None:
+                    self.state = self.engine.GetDisplayState()
+                self.Draw()
+
+                self.screen.timeout(int(self.GetPeriod() * 1000))
+                self.OnKey(self.screen.getch())
+        except KeyboardInterrupt:
+            pass
+        self.Quit()
+
+    def GetPeriod(self):
+        # Wake up for the deadline, and in between to advance the progress bar by about a character
+        if not self.engine.IsRunning():
+            return maxPeriod
+        (height, width) = self.screen.getmaxyx()
+        period = float(self.engine.clock.duration) / max(1, width - 2)
+        period = min(period, self.engine.clock.GetRemaining())
+
+        return min(maxPeriod, max(minPeriod, period))
+
+    def OnDeadline(self):
+        if not self.engine.Advance():
+            return
+
+        self.state = self.engine.GetDisplayState()
+
+        # Append a new chord to the stack and schedule the deadline of the new chord
+        self.engine.ScheduleNext()
+
+    def OnKey(self, key):
+        if key == 27:
+            self.running = False
+        elif key == ord(' '):
+            self.engine.SetPause(not self.engine.pause)
+        elif key == curses.KEY_LEFT:
+            if self.engine.Prev():
+                self.state = self.engine.GetDisplayState()
+                # Going back to a chord counts as not knowing it
+                self.engine.ReviewDisplayed(ReviewScheduler.again)
+        elif key == curses.KEY_RIGHT:
+            if self.engine.Next():
+                self.state = self.engine.GetDisplayState()
+        elif key in [curses.KEY_F5, curses.KEY_RESIZE]:
+            self.screen.clear()
+
+    def Draw(self):
+        (height, width) = self.screen.getmaxyx()
+        self.screen.erase()
+
+        # Previous chord on the left, next one on the right, current one in the middle
+        top = max(0, height // 2 - 2)
+        self.AddText(top, 1, self.state.prevChord)
+        self.AddText(top, width - 1 - len(self.state.nextChord), self.state.nextChord)
+        self.AddCentered(top + 1, self.state.chord, curses.A_BOLD)
+        self.AddCentered(top + 3, self.state.scale)
+
+        # Progress of the current chord
+        barWidth = max(0, width - 2)
+        filled = int(round(self.engine.clock.GetProgress() * barWidth))
+        self.AddText(height - 2, 1, "#" * filled + "-" * (barWidth - filled))
+        if self.engine.pause:
+            self.AddText(height - 1, 1, "(Paused)")
+
+        self.screen.refresh()
+
+    def AddCentered(self, y, text, attributes=0):
+        (height, width) = self.screen.getmaxyx()
+        self.AddText(y, max(0, (width - len(text)) // 2), text, attributes)
+
+    def AddText(self, y, x, text, attributes=0):
+        if not isinstance(text, str):
+            text = text.encode(self.encoding, 'replace')
+        try:
+            self.screen.addstr(y, max(0, x), text, attributes)
+        except curses.error:
+            # Terminal too small: leave the text out
+            pass
+
+    def Quit(self):
+        self.settings.SaveSettings()
+        self.engine.Save()
+
+def Main(screen):
+    TerminalTraining(screen).Run()
+
+def main():
+    locale.setlocale(locale.LC_ALL, "")
+    curses.wrapper(Main)
+
+if __name__ == '__main__':
+    main()
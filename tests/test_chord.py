@@ -0,0 +1,59 @@
+from chord import ChordStack
+from progression import progressions
+
+def test_fixed_quality_modes_ignore_the_quality_selection():
+    for mode in progressions.keys():
+        stack = ChordStack(1)
+        stack.Initialize(['C', 'F', 'Bb'], [], mode)
+        chords = [(element.GetPitch(), element.GetQuality()) for element in stack.elements]
+        if progressions[mode].HasFreeQuality():
+            assert all(chord == ('-', '-') for chord in chords), mode
+        else:
+            assert all(chord != ('-', '-') for chord in chords), mode
+
+def test_II_V_I_without_quality_selection():
+    stack = ChordStack(1)
+    stack.Initialize(['C', 'F', 'Bb'], [], 'II-V-I')
+    chords = [(element.GetPitch(), element.GetQuality()) for element in stack.elements[:3]]
+    assert [quality for (pitch, quality) in chords] == ['min7', '7', 'Maj7']
+    assert chords[2][0] in ['C', 'F', 'Bb']
+
+def GetChords(stack):
+    return [(element.GetPitch(), element.GetQuality(), element.GetMode()) for element in stack.elements]
+
+def test_seeded_stack_is_replayed_from_its_session():
+    stack = ChordStack(1234)
+    stack.Initialize(['C', 'F', 'Bb', 'Eb'], ['7', 'min7'], 'Chord')
+    for index in range(5):
+        stack.UpdateStack(['C', 'F', 'Bb', 'Eb'], ['7', 'min7'], 'Chord')
+    # Changes of the selection and of the mode, then of the weights (the chords
+    # drawn after the last changes stay in the stack)
+    stack.RecreateNext(['G', 'D', 'A'], ['Maj7', 'min7'], 'Markov')
+    for index in range(3):
+        stack.UpdateStack(['G', 'D', 'A'], ['Maj7', 'min7'], 'Markov')
+    stack.RecreateNext(['E', 'B'], [], 'II-V-I')
+    for index in range(3):
+        stack.UpdateStack(['E', 'B'], [], 'II-V-I')
+    stack.RecreateNext(['C', 'F', 'Bb', 'Eb'], ['7', 'min7'], 'Chord')
+    stack.SetWeights({'C': 4}, {'7': 3})
+    for index in range(3):
+        stack.UpdateStack(['C', 'F', 'Bb', 'Eb'], ['7', 'min7'], 'Chord')
+    modes = set(element.GetMode() for element in stack.elements)
+    assert modes == set(['Markov', 'II-V-I', 'Chord'])
+
+    replayed = ChordStack.FromSession(stack.GetSession())
+    assert GetChords(replayed) == GetChords(stack)
+    assert replayed.curr == stack.curr
+    assert replayed.GetCurrent().GetName() == stack.GetCurrent().GetName()
+
+    # Both go on with the same chords
+    for index in range(6):
+        for element in [stack, replayed]:
+            element.UpdateStack(['C', 'F', 'Bb', 'Eb'], ['7', 'min7'], 'Chord')
+    assert GetChords(replayed) == GetChords(stack)
+
+def test_different_seeds_give_different_chords():
+    stacks = [ChordStack(seed) for seed in [1, 2]]
+    for stack in stacks:
+        stack.Initialize(['C', 'F', 'Bb', 'Eb', 'Ab', 'Db'], ['7', 'min7', 'Maj7'], 'Chord')
+    assert GetChords(stacks[0]) != GetChords(stacks[1])
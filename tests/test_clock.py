@@ -0,0 +1,54 @@
+import time
+
+from clock import DeadlineClock, GetMonotonicFallback
+
+class SteppingClock():
+    """ Clock advanced by hand """
+    def __init__(self, start=1000.):
+        self.time = start
+
+    def __call__(self):
+        return self.time
+
+    def Step(self, delay):
+        self.time += delay
+
+def test_deadlines_do_not_drift():
+    now = SteppingClock()
+    clock = DeadlineClock(5, now)
+    for index in range(10):
+        # The switch happens slightly after each deadline
+        now.Step(5.2 if index == 0 else 5.)
+        assert clock.GetRemaining() <= 0
+        clock.Advance()
+    assert clock.deadline == 1000. + 11 * 5
+    assert abs(clock.GetRemaining() - 4.8) < 1e-9
+
+def test_late_switch_starts_from_now():
+    now = SteppingClock()
+    clock = DeadlineClock(5, now)
+    # e.g. the system was asleep
+    now.Step(60.)
+    clock.Advance()
+    assert clock.GetRemaining() == 5.
+
+def test_suspend_keeps_the_time_left():
+    now = SteppingClock()
+    clock = DeadlineClock(5, now)
+    now.Step(2.)
+    clock.Suspend()
+    now.Step(100.)
+    assert clock.GetRemaining() == 3.
+    clock.Resume()
+    assert clock.GetRemaining() == 3.
+    now.Step(1.)
+    assert clock.GetRemaining() == 2.
+    assert abs(clock.GetProgress() - .6) < 1e-9
+
+def test_fallback_is_monotonic():
+    monotonic = GetMonotonicFallback()
+    times = [monotonic() for index in range(1000)]
+    assert all(later >= earlier for (earlier, later) in zip(times, times[1:]))
+    start = monotonic()
+    time.sleep(.05)
+    assert monotonic() - start >= .04
@@ -0,0 +1,102 @@
+import socket
+import threading
+import time
+
+from control import ControlServer, ParseCommand
+from timing import Timings
+
+class SteppingClock():
+    """ Clock advanced by hand """
+    def __init__(self):
+        self.time = 0.
+
+    def __call__(self):
+        return self.time
+
+class FakeHandler():
+    """ Records the commands, each taking the given time """
+    def __init__(self, clock, duration=0.):
+        self.clock = clock
+        self.duration = duration
+        self.commands = []
+
+    def __call__(self, name, arguments, receiveTime):
+        self.commands.append((name, arguments))
+        self.clock.time += self.duration
+        if name == 'mode' and arguments[0] != 'II-V-I':
+            return "unknown mode " + arguments[0]
+        return None
+
+def test_parse_command():
+    assert ParseCommand("next\n") == ('next', [])
+    assert ParseCommand("  mode II-V-I ") == ('mode', ['II-V-I'])
+    assert ParseCommand("tones C F Bb") == ('tones', ['C', 'F', 'Bb'])
+    assert ParseCommand("qualities 7") == ('qualities', ['7'])
+    # Wrong number of arguments
+    assert ParseCommand("next now") is None
+    assert ParseCommand("mode") is None
+    assert ParseCommand("mode II-V-I Chord") is None
+    assert ParseCommand("tones") is None
+    # Unknown commands
+    assert ParseCommand("") is None
+    assert ParseCommand("skip") is None
+    assert ParseCommand("Next") is None
+
+def Connect(server, lines):
+    """ Send the lines to the server, return the client side once they are queued """
+    (client, connection) = socket.socketpair()
+    thread = threading.Thread(target=server.Read, args=(connection,))
+    thread.daemon = True
+    thread.start()
+    client.sendall("".join(line + "\n" for line in lines).encode('utf-8'))
+    end = time.time() + 2.
+    while server.commands.qsize() < len(lines) and time.time() < end:
+        time.sleep(.01)
+    assert server.commands.qsize() == len(lines)
+    return client
+
+def ReadAnswers(client, number):
+    answers = client.makefile('r')
+    return [answers.readline().strip() for index in range(number)]
+
+def test_answers_keep_the_order_of_the_commands():
+    clock = SteppingClock()
+    notifications = []
+    server = ControlServer(lambda: notifications.append(True), Timings(now=clock), path="unused")
+    lines = ["next", "skip", "mode Chord", "mode II-V-I", "tones", "prev"]
+    client = Connect(server, lines)
+    # Notified once, until the queue is processed
+    assert len(notifications) == 1
+
+    handler = FakeHandler(clock)
+    assert not server.Process(handler)
+    assert handler.commands == [('next', []), ('mode', ['Chord']), ('mode', ['II-V-I']), ('prev', [])]
+    assert ReadAnswers(client, len(lines)) == \
+        ["ok", "error unknown command", "error unknown mode Chord", "ok", "error unknown command", "ok"]
+    client.close()
+
+def test_commands_are_run_in_batches():
+    clock = SteppingClock()
+    notifications = []
+    server = ControlServer(lambda: notifications.append(True), Timings(now=clock), path="unused")
+    client = Connect(server, ["next"] * 10)
+    assert len(notifications) == 1
+
+    # 3 ms per command: the 10 ms budget is exceeded after the fourth one
+    handler = FakeHandler(clock, .003)
+    assert server.Process(handler, budget=.01)
+    assert len(handler.commands) == 4
+    assert server.Process(handler, budget=.01)
+    assert len(handler.commands) == 8
+    assert not server.Process(handler, budget=.01)
+    assert len(handler.commands) == 10
+    assert ReadAnswers(client, 10) == ["ok"] * 10
+    assert len(notifications) == 1
+
+    # Notified again once the queue was emptied
+    client.sendall(b"pause\n")
+    end = time.time() + 2.
+    while len(notifications) < 2 and time.time() < end:
+        time.sleep(.01)
+    assert len(notifications) == 2
+    client.close()
@@ -0,0 +1,121 @@
+import shutil
+import tempfile
+
+from chord import Chord
+from engine import TrainingEngine
+from progression import progressions
+from repetition import ReviewScheduler
+
+def CreateEngine(directory, mode):
+    engine = TrainingEngine(directory)
+    engine.spacedRepetition = True
+    engine.SetMode(mode)
+    engine.Start()
+    return engine
+
+def test_reviews_grade_the_key_once_per_progression():
+    for mode in progressions.keys():
+        directory = tempfile.mkdtemp()
+        try:
+            engine = CreateEngine(directory, mode)
+            nbProgressions = 0
+            for index in range(12):
+                engine.GetCurrentChords()
+                chord = engine.displayedChord
+                key = chord.GetKey() + (mode,)
+                reps = engine.scheduler.items[key].reps
+                assert engine.Advance()
+                # Reviewed on the last chord of the progression only
+                if chord.IsLast():
+                    nbProgressions += 1
+                    assert engine.scheduler.items[key].reps == reps + 1, (mode, key)
+                else:
+                    assert engine.scheduler.items[key].reps == reps, (mode, key)
+                engine.ScheduleNext()
+            assert nbProgressions > 0, mode
+            assert sum(item.reps for item in engine.scheduler.items.values()) == nbProgressions, mode
+        finally:
+            shutil.rmtree(directory)
+
+def test_lowest_grade_of_the_progression_is_kept():
+    directory = tempfile.mkdtemp()
+    try:
+        engine = CreateEngine(directory, 'II-V-I')
+        # Move to the beginning of a progression
+        while not engine.GetCurrentChords()[1].IsLast():
+            assert engine.Advance()
+            engine.ScheduleNext()
+        chord = engine.displayedChord
+        key = chord.GetKey() + ('II-V-I',)
+        reps = engine.scheduler.items[key].reps
+        engine.ReviewDisplayed(ReviewScheduler.again)
+        for index in range(3):
+            engine.GetCurrentChords()
+            assert engine.Advance()
+            engine.ScheduleNext()
+        item = engine.scheduler.items[key]
+        assert item.reps == reps + 1
+        assert item.interval == engine.scheduler.minInterval
+    finally:
+        shutil.rmtree(directory)
+
+def test_placeholder_of_voiced_images():
+    directory = tempfile.mkdtemp()
+    try:
+        engine = TrainingEngine(directory)
+        engine.voiceLeading = True
+        engine.Start()
+        (currChord, prevChord, nextChord) = engine.GetCurrentChords()
+        assert currChord.GetVoicing() is not None
+        placeholder = engine.GetPlaceholderImageFile(currChord, "Chord")
+        # Image of the standard voicings of the same chord
+        assert placeholder != engine.GetImageFile(currChord, "Chord")
+        assert placeholder == engine.GetImageFile(Chord(currChord.GetPitch(), currChord.GetQuality()), "Chord")
+        assert engine.GetPlaceholderImageFile(currChord, "Scale") is None
+        assert engine.GetPlaceholderImageFile(Chord(currChord.GetPitch(), currChord.GetQuality()), "Chord") is None
+    finally:
+        shutil.rmtree(directory)
+
+def test_session_round_trip():
+    directory = tempfile.mkdtemp()
+    try:
+        engine = TrainingEngine(directory)
+        engine.SetMode('II-V-I')
+        engine.Start()
+        for index in range(5):
+            engine.GetCurrentChords()
+            engine.Advance()
+            engine.ScheduleNext()
+        displayed = engine.GetCurrentChords()[0]
+        chordStack = engine.chordStack
+        view = {'imageSizes': {'res150/chord_c_7.preview.png': [120, 80]}, 'hotImages': {}}
+        engine.SaveSession(view)
+
+        resumed = TrainingEngine(directory)
+        resumed.SetMode('II-V-I')
+        resumed.resumeSession = True
+        resumed.Start()
+        assert resumed.sessionView == view
+        stack = resumed.chordStack
+        assert stack.GetCurrent().GetName() == displayed.GetName()
+        assert stack.elements.index(stack.GetCurrent()) == chordStack.elements.index(displayed)
+        assert [(element.GetName(), element.GetKey(), element.IsLast()) for element in stack.elements] == \
+            [(element.GetName(), element.GetKey(), element.IsLast()) for element in chordStack.elements]
+        assert stack.segments == chordStack.segments
+        assert stack.rng.getstate() == chordStack.rng.getstate()
+    finally:
+        shutil.rmtree(directory)
+
+def test_damaged_session_is_ignored():
+    directory = tempfile.mkdtemp()
+    try:
+        engine = TrainingEngine(directory)
+        assert engine.LoadSession() is None
+        with open(engine.sessionfile, "wb") as f:
+            f.write(b"not a session")
+        assert engine.LoadSession() is None
+        engine.resumeSession = True
+        engine.Start()
+        assert engine.chordStack.GetCurrent().GetPitch() != '-'
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,18 @@
+import random
+
+from chord import ChordStream
+from progression import progressions
+
+def test_streams_keep_their_own_selection():
+    qualities = ['min7', '7', 'Maj7']
+    selections = [['C', 'F', 'Bb', 'Eb', 'Ab', 'Db'], ['F#', 'B', 'E', 'A', 'D', 'G']]
+    streams = [iter(ChordStream(pitches, qualities, 'Markov', random.Random(index))) \
+               for (index, pitches) in enumerate(selections)]
+    # Draw from both streams in turn
+    for index in range(200):
+        for (stream, pitches) in zip(streams, selections):
+            event = next(stream)
+            assert event.pitch in pitches and event.quality in qualities
+
+    # The definition of the mode keeps no selection
+    assert progressions['Markov'].chain.selection == (frozenset(), frozenset())
@@ -0,0 +1,65 @@
+import collections
+import random
+
+import pytest
+
+from sampler import WeightedSampler
+
+def GetPrefixSum(sampler, length):
+    """ Sum of the first weights, read from the Fenwick tree """
+    total = 0.
+    position = length
+    while position > 0:
+        total += sampler.tree[position]
+        position -= position & -position
+    return total
+
+def Count(sampler, rng, nbDraws):
+    return collections.Counter(sampler.Draw(rng) for index in range(nbDraws))
+
+def test_prefix_sums_stay_consistent():
+    rng = random.Random(1)
+    items = list(range(37))
+    sampler = WeightedSampler(items)
+    for index in range(500):
+        sampler.SetWeight(rng.choice(items), rng.choice([0., rng.random() * 10]))
+        for length in range(len(items) + 1):
+            assert abs(GetPrefixSum(sampler, length) - sum(sampler.weights[:length])) < 1e-9
+        assert abs(sampler.total - sum(sampler.weights)) < 1e-9
+        assert sampler.nbPositive == len([weight for weight in sampler.weights if weight > 0])
+
+def test_zero_weights_are_never_drawn():
+    rng = random.Random(2)
+    items = ['C', 'F', 'Bb', 'Eb', 'Ab', 'Db']
+    sampler = WeightedSampler(items, {'F': 0, 'Ab': 0})
+    sampler.SetWeight('Db', 0.)
+    counts = Count(sampler, rng, 5000)
+    assert set(counts.keys()) == set(['C', 'Bb', 'Eb'])
+    assert sampler.GetNbCandidates() == 3
+
+def test_updated_weights_change_the_distribution():
+    rng = random.Random(3)
+    items = ['a', 'b', 'c', 'd']
+    sampler = WeightedSampler(items)
+    nbDraws = 20000
+    counts = Count(sampler, rng, nbDraws)
+    for item in items:
+        assert abs(counts[item] / float(nbDraws) - .25) < .02
+
+    sampler.SetWeight('a', 5.)
+    sampler.SetWeight('c', 2.)
+    counts = Count(sampler, rng, nbDraws)
+    expected = {'a': 5. / 9, 'b': 1. / 9, 'c': 2. / 9, 'd': 1. / 9}
+    for item in items:
+        assert abs(counts[item] / float(nbDraws) - expected[item]) < .02
+
+def test_uniform_draws_without_positive_weight():
+    rng = random.Random(4)
+    sampler = WeightedSampler(['a', 'b', 'c'], {'a': 0, 'b': 0, 'c': 0})
+    assert set(Count(sampler, rng, 300).keys()) == set(['a', 'b', 'c'])
+    assert sampler.GetNbCandidates() == 3
+
+def test_negative_weight_is_refused():
+    sampler = WeightedSampler(['a', 'b'])
+    with pytest.raises(ValueError):
+        sampler.SetWeight('a', -1.)
@@ -0,0 +1,106 @@
+import os
+import re
+import shutil
+import tempfile
+
+import pytest
+
+from chord import Chord, ChordStack
+from score import Score
+from theory import circleOfFifths, chordTones
+from voicing import letters, VoiceLeading
+
+# Voicings (in C) written out in relative mode by the score templates before
+# they were generated from the degrees: quality -> (Form1, Form2), and the
+# pitches using the alternative spelling
+baselineVoicings = {'Maj7': ("b c e g", "e g a d"), '7': ("e a bf d", "bf d e a"), \
+                    'min7': ("ef g bf d", "bf d ef g"), 'minMaj7': ("ef g b d", "b d ef g"), \
+                    'alt': ("ff af bf ef", "bf ef ff af"), 'min7b5': ("ef gf bf d", "bf d ef gf"), \
+                    'dim7': ("c ef gf a", "c ef gf b"), '7b9': ("e a bf df", "bf df e a")}
+baselineEnharmonicVoicings = {'alt': ("e gs as ds", "as ds e gs"), 'min7b5': ("ds fs as css", "as css ds fs")}
+baselineEnharmonicPitches = {'alt': ['Db', 'Eb', 'F', 'Ab', 'Bb'], 'min7b5': ['Db', 'Eb', 'Ab']}
+# Alt voicings one octave lower for the higher pitches
+baselineLowPitches = ['G', 'Ab', 'A', 'Bb', 'B']
+
+def GetAbsolute(chords, reference):
+    """ Absolute notes of chords in lilypond's relative mode (reference: staff step of the
+    \\relative pitch, 0: c): each chord starts from the first note of the previous one """
+    result = []
+    for chord in chords:
+        notes = []
+        previous = reference
+        for note in chord.split():
+            step = letters.index(note[0])
+            step += 7 * ((previous - step + 3) // 7)
+            if len(notes) == 0:
+                reference = step
+            octave = step // 7
+            notes.append(note + ("'" * octave if octave > 0 else "," * -octave))
+            previous = step
+        result.append(" ".join(notes))
+
+    return result
+
+def GetBaseline(pitch, quality):
+    """ Notes of the upper and lower staves expected for the chord """
+    voicings = baselineVoicings[quality]
+    if pitch in baselineEnharmonicPitches.get(quality, []):
+        voicings = baselineEnharmonicVoicings[quality]
+    register = 1
+    if quality == 'alt' and pitch in baselineLowPitches:
+        register = 0
+
+    return GetAbsolute(voicings, 7 * register) + GetAbsolute(voicings, 7 * (register - 1))
+
+def test_voicings_match_baseline():
+    directory = tempfile.mkdtemp()
+    scoreRes = 100
+    os.mkdir(os.path.join(directory, "res%d" % scoreRes))
+    score = Score(directory)
+    score.CallLilypond = lambda lyfile, scoreRes, singleThread = False: None
+    try:
+        for pitch in circleOfFifths:
+            for quality in chordTones:
+                chord = Chord(pitch, quality)
+                score.GenerateImage(chord, scoreRes, True, True)
+                with open(os.path.join(directory, chord.GetLyName(scoreRes))) as f:
+                    notes = re.findall(r"<([^>]*)>1", f.read())
+                assert notes == GetBaseline(pitch, quality), (pitch, quality)
+    finally:
+        shutil.rmtree(directory)
+
+def test_led_voicings_match_key_signature():
+    directory = tempfile.mkdtemp()
+    scoreRes = 100
+    os.mkdir(os.path.join(directory, "res%d" % scoreRes))
+    score = Score(directory)
+    score.CallLilypond = lambda lyfile, scoreRes, singleThread = False: None
+    try:
+        for (quality, pitches) in baselineEnharmonicPitches.items():
+            # Names of the notes (in C) of the standard voicings, spelled as the key signature
+            names = set(note.rstrip("',") for voicing in baselineEnharmonicVoicings[quality] for note in voicing.split())
+            for pitch in pitches:
+                stack = ChordStack(1)
+                stack.SetVoiceLeading(VoiceLeading())
+                stack.Initialize([pitch], [quality], 'Chord')
+                assert stack.GetCurrentVoicing() is not None
+                chord = stack.GetCurrent()
+                score.GenerateImage(chord, scoreRes, True, True)
+                with open(os.path.join(directory, chord.GetLyName(scoreRes))) as f:
+                    notes = re.findall(r"<([^>]*)>1", f.read())
+                assert len(notes) == 1
+                assert set(note.rstrip("',") for note in notes[0].split()) <= names, (pitch, quality, notes)
+    finally:
+        shutil.rmtree(directory)
+
+def test_unknown_quality_is_refused():
+    directory = tempfile.mkdtemp()
+    scoreRes = 100
+    os.mkdir(os.path.join(directory, "res%d" % scoreRes))
+    score = Score(directory)
+    score.CallLilypond = lambda lyfile, scoreRes, singleThread = False: None
+    try:
+        with pytest.raises(ValueError):
+            score.GenerateImage(Chord('C', 'maj13#11'), scoreRes, True, True)
+    finally:
+        shutil.rmtree(directory)
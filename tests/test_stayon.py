@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from stayon import StayOn, DummyBackend
+
+class FailingBackend(DummyBackend):
+    name = "failing"
+
+    def initialise(self):
+        raise OSError("not available")
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.delenv("DISABLE_STAYON", raising=False)
+
+def WaitFor(condition, timeout=2.):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(.01)
+    return condition()
+
+def test_first_available_backend_is_taken():
+    backends = [FailingBackend(), DummyBackend(False), DummyBackend(), DummyBackend()]
+    stayOn = StayOn(backends, period=.01)
+    stayOn.start()
+    assert stayOn.waitReady(2.)
+    assert stayOn.isEnabled()
+    assert stayOn.backend is backends[2]
+    assert stayOn.getName() == "dummy"
+    stayOn.stop()
+    stayOn.thread.join(2.)
+    assert not stayOn.thread.is_alive()
+
+def test_no_backend_available():
+    stayOn = StayOn([DummyBackend(False)], period=.01)
+    stayOn.start()
+    assert stayOn.waitReady(2.)
+    assert not stayOn.isEnabled()
+    assert stayOn.getName() is None
+    stayOn.thread.join(2.)
+    assert not stayOn.thread.is_alive()
+
+def test_pokes_only_while_active():
+    backend = DummyBackend()
+    stayOn = StayOn([backend], period=.01)
+    stayOn.start()
+    assert stayOn.waitReady(2.)
+    time.sleep(.05)
+    assert backend.pokes == 0
+
+    stayOn.setActive(True)
+    assert WaitFor(lambda: backend.pokes >= 3)
+
+    stayOn.setActive(False)
+    time.sleep(.05)
+    pokes = backend.pokes
+    time.sleep(.05)
+    assert backend.pokes == pokes
+
+    stayOn.stop()
+    stayOn.thread.join(2.)
+    assert not stayOn.thread.is_alive()
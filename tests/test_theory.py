@@ -0,0 +1,40 @@
+from chord import Chord
+from quality import qualities
+from theory import circleOfFifths, chordTones, Mask, Transpose, Contains, IsCompatible, GetCompatibleScales
+
+# Scale of each quality in Chord.DetermineScale before the chord/scale table:
+# kind and offset of its pitch along the circle of fifths (modulo 3 for the
+# diminished scales)
+baselineScales = {'Maj7': ('Major', 0), '7': ('Major', 1), 'min7': ('Major', 2), \
+                  'minMaj7': ('Minor', 0), 'alt': ('Minor', 5), 'min7b5': ('Minor', 3), \
+                  'dim7': ('Diminished', 0), '7b9': ('Diminished', 2)}
+
+def GetBaselineScale(pitch, quality):
+    if quality not in baselineScales:
+        return (pitch, "-")
+    (kind, offset) = baselineScales[quality]
+    index = (circleOfFifths.index(pitch) + offset) % len(circleOfFifths)
+    if kind == 'Diminished':
+        index %= 3
+    return (circleOfFifths[index], kind)
+
+def test_scales_match_baseline():
+    for quality in qualities:
+        for pitch in circleOfFifths:
+            chord = Chord(pitch, quality)
+            chord.DetermineScale()
+            assert (chord.scalePitch, chord.scaleKind) == GetBaselineScale(pitch, quality), (pitch, quality)
+
+def test_scales_contain_their_chords():
+    for quality in chordTones:
+        for pitch in circleOfFifths:
+            (scalePitch, scaleKind) = GetBaselineScale(pitch, quality)
+            assert IsCompatible(pitch, quality, scalePitch, scaleKind)
+            assert (scalePitch, scaleKind) in GetCompatibleScales(pitch, quality)
+
+def test_masks():
+    assert Mask([0, 4, 7, 12]) == 0b10010001
+    assert Transpose(Mask([0, 4, 7]), 5) == Mask([5, 9, 0])
+    assert Transpose(Mask([11]), 1) == Mask([0])
+    assert Contains(Mask([0, 2, 4, 5, 7, 9, 11]), Mask([2, 5, 9, 0]))
+    assert not Contains(Mask([0, 2, 4, 5, 7, 9, 11]), Mask([1]))
@@ -0,0 +1,123 @@
+import itertools
+import re
+
+import voicing
+from chord import ChordStack
+from spelling import GetChordSpelling
+from voicing import GetTones, ParseDegree, ScoreShape, SearchShapes, SearchVoicings, Mask, Contains, VoiceLeading
+
+def SearchShapesExhaustively(quality, nbNotes, maxSpan, maxGap):
+    """ Shapes of SearchShapes, from all the combinations of notes """
+    tones = GetTones(quality)
+    voicingTones = set(ParseDegree(degree)[1] % 12 for degree in voicing.voicingDegrees[quality])
+    guideTones = set(ParseDegree(degree)[1] % 12 for degree in voicing.chordDegrees[quality] \
+                     if re.match(r"^[b#]*[347]$", degree))
+    notes = sorted(((tone, octave) for tone in range(len(tones)) for octave in range(3)), \
+                   key=lambda note: tones[note[0]][2] + 12 * note[1])
+
+    shapes = []
+    for shape in itertools.combinations(notes, nbNotes):
+        semitones = [tones[tone][2] + 12 * octave for (tone, octave) in shape]
+        if shape[0][1] != 0 or semitones[-1] - semitones[0] > maxSpan or \
+        any(semitones[index] - semitones[index - 1] > maxGap for index in range(1, nbNotes)):
+            continue
+        if Contains(Mask(semitone for semitone in semitones), Mask(guideTones)):
+            shapes.append((ScoreShape(shape, tones, voicingTones), tuple(shape)))
+
+    shapes.sort()
+    return shapes
+
+def test_pruned_search_matches_exhaustive_search():
+    for quality in ['Maj7', '7', 'min7', 'alt']:
+        for (nbNotes, maxSpan, maxGap) in [(3, 12, 7), (4, 14, 7), (4, 19, 9)]:
+            pruned = SearchShapes(quality, nbNotes, maxSpan, maxGap, False)
+            exhaustive = SearchShapesExhaustively(quality, nbNotes, maxSpan, maxGap)
+            assert len(pruned) > 0
+            assert pruned[0] == exhaustive[0], (quality, nbNotes)
+            assert pruned == exhaustive, (quality, nbNotes)
+
+def test_voicings_are_ranked_and_within_range():
+    voicings = SearchVoicings('Eb', 'min7', low=10, high=30)
+    assert len(voicings) > 0
+    assert all(voicings[index].cost <= voicings[index + 1].cost for index in range(len(voicings) - 1))
+    for found in voicings:
+        assert found.semitones[0] >= 10 and found.semitones[-1] <= 30
+        assert found.semitones[-1] - found.semitones[0] <= 14
+
+def test_cache_hits_return_the_same_voicings():
+    first = SearchVoicings('F', '7', low=9, high=29)
+    assert SearchVoicings('F', '7', low=9, high=29) is first
+    # Searched again from scratch
+    voicing.searchCache.clear()
+    voicing.shapeCache.clear()
+    assert SearchVoicings('F', '7', low=9, high=29) == first
+    # Shapes shared with the other pitches
+    assert SearchVoicings('Bb', '7', low=9, high=29) != first
+    assert len(voicing.shapeCache) == 1
+
+def GetPathCost(voiceLeading, path):
+    """ Cost of a sequence of voicings, as minimised by VoiceLeading """
+    cost = sum(voiceLeading.costWeight * voicing.cost for voicing in path)
+    for index in range(1, len(path)):
+        cost += voiceLeading.motionWeight * voiceLeading.GetMotion(path[index - 1], path[index])
+    return cost
+
+def GetBestPath(voiceLeading, first=None):
+    """ Best sequence of the candidates found by trying them all (first: voicing of the first chord) """
+    candidates = list(voiceLeading.candidates)
+    if first is not None:
+        candidates[0] = [first]
+    return min(itertools.product(*candidates), key=lambda path: GetPathCost(voiceLeading, path))
+
+def test_voice_leading_minimises_the_motion():
+    voiceLeading = VoiceLeading(nbCandidates=5)
+    for (pitch, quality) in [('D', 'min7'), ('G', '7'), ('C', 'Maj7')]:
+        voiceLeading.Append(pitch, quality)
+    path = tuple(voiceLeading.GetVoicing(position) for position in range(3))
+    best = GetBestPath(voiceLeading)
+    assert abs(GetPathCost(voiceLeading, path) - GetPathCost(voiceLeading, best)) < 1e-9
+    # Better than the best voicings taken one by one
+    assert GetPathCost(voiceLeading, path) <= \
+        GetPathCost(voiceLeading, [candidates[0] for candidates in voiceLeading.candidates])
+
+def test_pinned_voicing_is_kept():
+    voiceLeading = VoiceLeading(nbCandidates=5)
+    voiceLeading.Append('D', 'min7')
+    voiceLeading.Append('G', '7')
+    # Pin another voicing than the one chosen
+    pinned = [candidate for candidate in voiceLeading.candidates[0] if candidate != voiceLeading.GetVoicing(0)][0]
+    voiceLeading.Pin(0, pinned)
+    voiceLeading.Append('C', 'Maj7')
+    path = tuple(voiceLeading.GetVoicing(position) for position in range(3))
+    assert path[0] == pinned
+    best = GetBestPath(voiceLeading, pinned)
+    assert abs(GetPathCost(voiceLeading, path) - GetPathCost(voiceLeading, best)) < 1e-9
+
+def CheckStack(stack):
+    voiceLeading = stack.voiceLeading
+    assert len(voiceLeading) == len(stack.elements)
+    for (position, element) in enumerate(stack.elements):
+        assert voiceLeading.candidates[position] == \
+            SearchVoicings(element.GetPitch(), element.GetQuality(), \
+                           enharmonic=GetChordSpelling(element.GetPitch(), element.GetQuality()).enharmonic)[:8]
+        # The voicings shown stay on the path
+        if element.GetVoicing() is not None:
+            assert voiceLeading.GetVoicing(position) == element.GetVoicing()
+
+def test_voice_leading_follows_the_stack():
+    stack = ChordStack(5)
+    stack.SetVoiceLeading(VoiceLeading())
+    selection = (['C', 'F', 'Bb', 'Eb', 'Ab'], ['min7', '7', 'Maj7'], 'II-V-I')
+    stack.Initialize(*selection)
+    for index in range(40):
+        # Display of the current chord, then deadline
+        stack.GetCurrentVoicing()
+        CheckStack(stack)
+        stack.UpdateStack(*selection)
+        if index == 20:
+            # Change of the mode (Truncate)
+            selection = (['D', 'G'], ['7', 'min7'], 'Chord')
+            stack.RecreateNext(*selection)
+        CheckStack(stack)
+    # The older chords were dropped from the stack (DropFirst)
+    assert stack.drawnIndices[0] > 0
@@ -0,0 +1,107 @@
+import collections
+
+from quality import qualities
+
+# Pitches ordered along the circle of fifths (ascending in fourths)
+circleOfFifths = ['C', 'F', 'Bb', 'Eb', 'Ab', 'Db', 'F#', 'B', 'E', 'A', 'D', 'G']
+
+# Pitch class (semitones above C) of each pitch
+pitchClasses = dict((pitch, (5 * index) % 12) for (index, pitch) in enumerate(circleOfFifths))
+# Pitch for each pitch class
+pitchNames = dict((pitchClasses[pitch], pitch) for pitch in circleOfFifths)
+
+# Chord tones of each quality with a scale (semitones above the root)
+chordTones = collections.OrderedDict((name, qualities[name].intervals) \
+                                     for name in qualities if qualities[name].scale is not None)
+
+# Steps of each scale kind (semitones above the root)
+scaleSteps = collections.OrderedDict()
+scaleSteps['Major'] = [0, 2, 4, 5, 7, 9, 11]
+scaleSteps['Minor'] = [0, 2, 3, 5, 7, 9, 11]
+scaleSteps['Diminished'] = [0, 2, 3, 5, 6, 8, 9, 11]
+
+# Scale played over each quality: (kind, semitones from the chord root to the scale root)
+preferredScales = dict((name, qualities[name].scale) for name in chordTones)
+
+allPitches = (1 << 12) - 1
+
+def Mask(intervals):
+    """ 12-bit mask of a set of pitch classes """
+    mask = 0
+    for interval in intervals:
+        mask |= 1 << (interval % 12)
+
+    return mask
+
+def Transpose(mask, semitones):
+    """ Transpose a pitch class mask by rotating its bits """
+    semitones %= 12
+    return ((mask << semitones) | (mask >> (12 - semitones))) & allPitches
+
+def Contains(mask, subMask):
+    """ Whether all pitch classes of subMask belong to mask """
+    return subMask & ~mask == 0
+
+
+# Masks of all chords (pitch, quality)
+chordMasks = dict(((pitch, quality), Transpose(Mask(chordTones[quality]), pitchClasses[pitch])) \
+                  for pitch in circleOfFifths for quality in chordTones)
+
+def BuildScales():
+    """ Distinct scales (e.g. only three diminished scales), each named after
+    the first of its pitches along the circle of fifths """
+    scales = []
+    scaleIds = {}
+    scaleMasks = []
+    for kind in scaleSteps:
+        for pitch in circleOfFifths:
+            mask = Transpose(Mask(scaleSteps[kind]), pitchClasses[pitch])
+            if mask in scaleMasks:
+                scaleIds[(pitch, kind)] = scaleMasks.index(mask)
+            else:
+                scaleIds[(pitch, kind)] = len(scales)
+                scales.append((pitch, kind))
+                scaleMasks.append(mask)
+
+    return (scales, scaleIds, scaleMasks)
+
+def BuildCompatibility():
+    """ For each chord, mask of the scales containing it """
+    compatibleScales = {}
+    for chord in chordMasks:
+        compatible = 0
+        for scaleId in range(len(scales)):
+            if Contains(scaleMasks[scaleId], chordMasks[chord]):
+                compatible |= 1 << scaleId
+        compatibleScales[chord] = compatible
+
+    return compatibleScales
+
+def BuildChordScales():
+    """ Scale played over each chord """
+    chordScales = {}
+    for (pitch, quality) in chordMasks:
+        (kind, offset) = preferredScales[quality]
+        scaleId = scaleIds[(pitchNames[(pitchClasses[pitch] + offset) % 12], kind)]
+        if not compatibleScales[(pitch, quality)] >> scaleId & 1:
+            raise ValueError("Scale %s %s does not contain %s%s" % (scales[scaleId] + (pitch, quality)))
+        chordScales[(pitch, quality)] = scales[scaleId]
+
+    return chordScales
+
+(scales, scaleIds, scaleMasks) = BuildScales()
+compatibleScales = BuildCompatibility()
+chordScales = BuildChordScales()
+
+def IsCompatible(pitch, quality, scalePitch, scaleKind):
+    """ Whether the scale contains all tones of the chord """
+    return compatibleScales[(pitch, quality)] >> scaleIds[(scalePitch, scaleKind)] & 1 == 1
+
+def GetCompatibleScales(pitch, quality):
+    """ List of the scales (pitch, kind) containing all tones of the chord """
+    compatible = compatibleScales[(pitch, quality)]
+    return [scales[scaleId] for scaleId in range(len(scales)) if compatible >> scaleId & 1]
+
+def GetScale(pitch, quality):
+    """ Scale (pitch, kind) played over the chord, None if unknown """
+    return chordScales.get((pitch, quality))
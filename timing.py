@@ -0,0 +1,78 @@
+import collections
+import functools
+import threading
+
+from clock import monotonic
+
+class Measurement():
+    """ Context recording the time spent in it """
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = self.timings.now()
+        return self
+
+    def __exit__(self, *args):
+        self.timings.Record(self.name, self.timings.now() - self.start)
+
+
+class Timings():
+    """ Durations measured on the hot paths of the program
+
+    The latest durations of each path are kept in a ring buffer: recording one
+    is a mere append, so that the instrumentation may always stay on, and the
+    percentiles are only computed when asked for.
+    """
+    def __init__(self, size=200, now=monotonic):
+        # Number of durations kept for each path
+        self.size = size
+        # Source of the current time (s)
+        self.now = now
+        # Latest durations of each path (s), in the order the paths were first met
+        self.samples = collections.OrderedDict()
+        # Paths may be recorded from worker threads
+        self.lock = threading.Lock()
+
+    def Record(self, name, duration):
+        samples = self.samples.get(name)
+        if samples is None:
+            with self.lock:
+                samples = self.samples.setdefault(name, collections.deque(maxlen=self.size))
+        samples.append(duration)
+
+    def Measure(self, name):
+        """ Context recording the duration of a block, e.g. 'with timings.Measure("Decode"):' """
+        return Measurement(self, name)
+
+    def GetPercentiles(self, name, fractions=(.5, .95)):
+        """ Durations (s) below which the given fractions of the recorded ones lie, None if none recorded """
+        samples = sorted(list(self.samples.get(name, [])))
+        if len(samples) == 0:
+            return None
+
+        return [samples[min(len(samples) - 1, int(fraction * len(samples)))] for fraction in fractions]
+
+    def GetSummary(self, fractions=(.5, .95)):
+        """ Percentiles of each path in ms, e.g. 'RefreshChord 1.2/3.4' """
+        with self.lock:
+            names = list(self.samples.keys())
+
+        summary = []
+        for name in names:
+            percentiles = self.GetPercentiles(name, fractions)
+            summary.append("%s %s" % (name, "/".join("%.1f" % (duration * 1000.) for duration in percentiles)))
+
+        return "  ".join(summary)
+
+
+def Timed(name):
+    """ Decorator recording the duration of a method in the 'timings' attribute of its object """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.timings.Measure(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
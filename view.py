@@ -0,0 +1,30 @@
+import collections
+
+# Content of the main window: names of the current, previous and next
+# chords, name of the scale and image files of the scores (None: no image)
+DisplayState = collections.namedtuple('DisplayState', \
+    ['chord', 'prevChord', 'nextChord', 'scale', 'chordImage', 'scaleImage'])
+
+class ViewModel():
+    """ Display state last rendered, so that only the widgets whose content changed get updated """
+    def __init__(self):
+        # Rendered value of each field of the display state (missing: unknown)
+        self.rendered = {}
+
+    def GetChanges(self, state):
+        """ Return the fields of the state differing from what is displayed """
+        return [field for field in state._fields \
+                if field not in self.rendered or self.rendered[field] != getattr(state, field)]
+
+    def IsRendered(self, field, value):
+        return field in self.rendered and self.rendered[field] == value
+
+    def SetRendered(self, field, value):
+        self.rendered[field] = value
+
+    def Invalidate(self, field=None):
+        """ Force the update of a field (default: of all fields) on the next refresh """
+        if field is None:
+            self.rendered = {}
+        elif field in self.rendered:
+            del self.rendered[field]
@@ -0,0 +1,417 @@
+import collections
+import re
+
+from theory import Mask, Contains
+from quality import qualities
+
+# Voicing tones of each quality as degrees above the root, in the order of
+# the 'A' voicing (the 'B' voicing starts from the second half of the tones)
+voicingDegrees = collections.OrderedDict((name, qualities[name].voicing) for name in qualities)
+
+# Voicings deviating from the rule above: quality -> {family: degrees}
+specialVoicings = dict((name, qualities[name].specialVoicings) for name in qualities)
+
+# Alternative (sharp) spelling of the voicing tones, used where the usual
+# spelling leads to awkward key signatures
+enharmonicDegrees = dict((name, qualities[name].enharmonicVoicing) for name in qualities \
+                         if qualities[name].enharmonicVoicing is not None)
+
+# Chord tones of each quality, for the closed voicing in root position
+chordDegrees = collections.OrderedDict((name, qualities[name].chordDegrees) for name in qualities)
+
+# Available voicing families
+families = ['A', 'B', 'Closed']
+
+letters = 'cdefgab'
+# Semitones above c of the natural notes
+naturals = [0, 2, 4, 5, 7, 9, 11]
+# Semitones above the root of the degrees of the major scale (by number minus 1)
+majorDegrees = [0, 2, 4, 5, 7, 9, 11]
+accidentals = {-2: 'ff', -1: 'f', 0: '', 1: 's', 2: 'ss'}
+
+def ParseDegree(degree):
+    """ Return (number of staff steps, semitones) above the root for a degree like 'b7' or '#9' """
+    match = re.match(r"^(b*|#*)(\d+)$", degree)
+    number = int(match.group(2)) - 1
+    alteration = len(match.group(1))
+    if match.group(1).startswith('b'):
+        alteration = -alteration
+
+    semitones = 12 * (number // 7) + majorDegrees[number % 7] + alteration
+    return (number, semitones)
+
+def ParsePitch(pitch):
+    """ Return (letter index, alteration) for a pitch name like 'Bb' or 'F#' """
+    letter = letters.index(pitch[0].lower())
+    alteration = pitch.count('#') - pitch[1:].count('b')
+    return (letter, alteration)
+
+def GetLyNote(step, semitones):
+    """ Absolute lilypond note at the given staff step (0: c) and pitch (0: c, MIDI 48) """
+    (octave, letter) = divmod(step, 7)
+    alteration = semitones - 12 * octave - naturals[letter]
+    if octave > 0:
+        octaveMarks = "'" * octave
+    else:
+        octaveMarks = "," * (-octave)
+
+    return letters[letter] + accidentals[alteration] + octaveMarks
+
+def GetDegrees(quality, family, enharmonic=False):
+    """ Degrees of the voicing, from the lowest note up (None if the quality is unknown) """
+    if family == 'Closed':
+        return chordDegrees.get(quality)
+
+    if quality in specialVoicings and family in specialVoicings[quality] and not enharmonic:
+        return specialVoicings[quality][family]
+
+    if enharmonic and quality in enharmonicDegrees:
+        degrees = enharmonicDegrees[quality]
+    else:
+        degrees = voicingDegrees.get(quality)
+    if degrees is None:
+        return None
+
+    if family == 'B':
+        half = len(degrees) // 2
+        degrees = degrees[half:] + degrees[:half]
+
+    return degrees
+
+def GetClosestStep(step, reference):
+    """ Staff step of the same letter as step lying within a fourth of the reference (lilypond's relative mode) """
+    return step + 7 * ((reference - step + 3) // 7)
+
+def StackVoicing(pitch, degrees, reference):
+    """ Absolute staff steps and semitones of the degrees above the pitch: the lowest note
+    within a fourth of the reference step, the following ones stacked upwards """
+    (rootLetter, rootAlteration) = ParsePitch(pitch)
+    rootSemitones = naturals[rootLetter] + rootAlteration
+
+    notes = []
+    for degree in degrees:
+        (steps, semitones) = ParseDegree(degree)
+        step = rootLetter + steps % 7
+        semitones = rootSemitones + semitones - 12 * (steps // 7)
+        if len(notes) == 0:
+            shifted = GetClosestStep(step, reference)
+        else:
+            shifted = step + ((notes[-1][0] - step) // 7 + 1) * 7
+        notes.append((shifted, semitones + (shifted - step) // 7 * 12))
+
+    return notes
+
+def GenerateVoicing(pitch, quality, family, register, enharmonic):
+    degrees = GetDegrees(quality, family, enharmonic)
+    if degrees is None:
+        return None
+
+    # The lowest note is the one closest to c in the octave of the register, except
+    # for the B voicing, placed from the lowest note of the A voicing (as the two
+    # chords following each other in lilypond's relative mode)
+    reference = 7 * register
+    if family == 'B':
+        degreesA = GetDegrees(quality, 'A', enharmonic)
+        if degreesA is not None:
+            reference = StackVoicing(pitch, degreesA, reference)[0][0]
+
+    return " ".join(GetLyNote(step, semitones) for (step, semitones) in StackVoicing(pitch, degrees, reference))
+
+# Voicings already generated: (pitch, quality, family, register, enharmonic) -> lilypond notes
+voicingCache = {}
+
+def GetVoicing(pitch, quality, family='A', register=1, enharmonic=False):
+    """ Lilypond notes (absolute octaves) of a voicing of the chord, None if the quality is unknown
+
+    register: octave of the c closest to the lowest note (1: c')
+    enharmonic: use the alternative spelling of the quality, if any
+    """
+    key = (pitch, quality, family, register, enharmonic)
+    if key not in voicingCache:
+        voicingCache[key] = GenerateVoicing(pitch, quality, family, register, enharmonic)
+
+    return voicingCache[key]
+
+
+# Voicing found by the search: absolute staff steps and semitones of its
+# notes (0: c, as in GetLyNote), from the lowest up, and its cost
+Voicing = collections.namedtuple('Voicing', ['steps', 'semitones', 'cost'])
+
+def GetTones(quality, enharmonic=False):
+    """ Distinct pitch classes available for the quality, as (degree, staff
+    steps, semitones) within the octave above the root, None if unknown
+
+    The spelling of the rootless voicings is preferred over that of the chord tones.
+    """
+    if quality not in voicingDegrees:
+        return None
+    degrees = GetDegrees(quality, 'A', enharmonic) + GetDegrees(quality, 'B', enharmonic) + \
+              chordDegrees.get(quality, [])
+
+    tones = []
+    pitchClasses = set()
+    for degree in degrees:
+        (steps, semitones) = ParseDegree(degree)
+        semitones -= 12 * (steps // 7)
+        steps %= 7
+        if semitones % 12 not in pitchClasses:
+            pitchClasses.add(semitones % 12)
+            tones.append((degree, steps, semitones))
+
+    return tones
+
+def ScoreShape(shape, tones, voicingTones):
+    """ Cost of a voicing shape: the lower the better """
+    semitones = [tones[tone][2] + 12 * octave for (tone, octave) in shape]
+    pitchClasses = [semitone % 12 for semitone in semitones]
+
+    # Wide voicings are harder to play
+    cost = (semitones[-1] - semitones[0]) / 12.
+    # Clusters of minor seconds sound muddy
+    for index in range(1, len(semitones)):
+        if semitones[index] - semitones[index - 1] == 1:
+            cost += 2.
+    # Doubled tones waste a finger
+    cost += 3. * (len(pitchClasses) - len(set(pitchClasses)))
+    # Missing tones of the rootless voicing weaken the colour of the chord
+    cost += 2. * len(voicingTones - set(pitchClasses))
+
+    return cost
+
+def SearchShapes(quality, nbNotes, maxSpan, maxGap, enharmonic):
+    """ All voicing shapes of the quality, ranked by cost
+
+    A shape is a tuple of (tone index, octave above the root) in ascending
+    order; shapes do not depend on the root, which is what makes it possible
+    to share them among the 12 pitches. Branches are pruned as soon as the
+    span or the interval between two neighbouring notes gets too large.
+    """
+    tones = GetTones(quality, enharmonic)
+    if tones is None:
+        return []
+    voicingTones = set(ParseDegree(degree)[1] % 12 for degree in voicingDegrees[quality])
+    # The third (or fourth) and the seventh define the chord: they must be present
+    guideTones = set(ParseDegree(degree)[1] % 12 for degree in chordDegrees[quality] \
+                     if re.match(r"^[b#]*[347]$", degree))
+
+    # Candidate notes above the root, ascending
+    candidates = sorted(((tone, octave) for tone in range(len(tones)) \
+                        for octave in range(maxSpan // 12 + 2)), \
+                        key=lambda note: tones[note[0]][2] + 12 * note[1])
+
+    shapes = []
+    def Extend(shape, lowest, previous):
+        if len(shape) == nbNotes:
+            if Contains(Mask(tones[tone][2] for (tone, octave) in shape), Mask(guideTones)):
+                shapes.append((ScoreShape(shape, tones, voicingTones), tuple(shape)))
+            return
+        for (tone, octave) in candidates:
+            semitone = tones[tone][2] + 12 * octave
+            if semitone <= previous:
+                continue
+            if semitone - previous > maxGap or semitone - lowest > maxSpan:
+                # Candidates are sorted: all the following ones are out of reach too
+                break
+            shape.append((tone, octave))
+            Extend(shape, lowest, semitone)
+            shape.pop()
+
+    # The lowest note lies in the first octave above the root
+    for (tone, octave) in candidates:
+        if octave == 0:
+            semitone = tones[tone][2]
+            Extend([(tone, octave)], semitone, semitone)
+
+    shapes.sort()
+    return shapes
+
+# Shapes already searched: (quality, nbNotes, maxSpan, maxGap, enharmonic) -> ranked shapes
+shapeCache = {}
+# Voicings already placed: search parameters and range -> ranked voicings
+searchCache = {}
+
+def SearchVoicings(pitch, quality, nbNotes=4, low=7, high=31, maxSpan=14, maxGap=7, enharmonic=False):
+    """ All voicings of the chord within the range, ranked by cost (best first)
+
+    low, high: lowest and highest notes allowed, in semitones above c (12: c')
+    maxSpan: largest interval between the lowest and the highest note (hand span)
+    maxGap: largest interval between two neighbouring notes
+    """
+    key = (pitch, quality, nbNotes, low, high, maxSpan, maxGap, enharmonic)
+    if key in searchCache:
+        return searchCache[key]
+
+    shapeKey = (quality, nbNotes, maxSpan, maxGap, enharmonic)
+    if shapeKey not in shapeCache:
+        shapeCache[shapeKey] = SearchShapes(quality, nbNotes, maxSpan, maxGap, enharmonic)
+    if len(shapeCache[shapeKey]) == 0:
+        searchCache[key] = []
+        return []
+    tones = GetTones(quality, enharmonic)
+
+    (rootLetter, rootAlteration) = ParsePitch(pitch)
+    rootSemitones = naturals[rootLetter] + rootAlteration
+
+    voicings = []
+    centre = (low + high) / 2.
+    for (cost, shape) in shapeCache[shapeKey]:
+        steps = [rootLetter + tones[tone][1] + 7 * octave for (tone, octave) in shape]
+        semitones = [rootSemitones + tones[tone][2] + 12 * octave for (tone, octave) in shape]
+        # Every octave transposition of the shape within the range
+        for shift in range((low - semitones[0]) // 12, (high - semitones[-1]) // 12 + 1):
+            if semitones[0] + 12 * shift < low:
+                continue
+            # Slightly prefer voicings in the middle of the range
+            middle = (semitones[0] + semitones[-1]) / 2. + 12 * shift
+            voicings.append(Voicing(tuple(step + 7 * shift for step in steps), \
+                                    tuple(semitone + 12 * shift for semitone in semitones), \
+                                    cost + abs(middle - centre) / 24.))
+
+    voicings.sort(key=lambda voicing: voicing.cost)
+    searchCache[key] = voicings
+
+    return voicings
+
+def FormatVoicing(voicing, pitch=None):
+    """ Lilypond notes (absolute octaves) of a voicing found by SearchVoicings
+
+    pitch: root of the chord, to write the voicing in C (for '\\transpose c <pitch>')
+    """
+    (rootLetter, rootSemitones) = (0, 0)
+    if pitch is not None:
+        (rootLetter, rootAlteration) = ParsePitch(pitch)
+        rootSemitones = naturals[rootLetter] + rootAlteration
+
+    return " ".join(GetLyNote(step - rootLetter, semitones - rootSemitones) \
+                    for (step, semitones) in zip(voicing.steps, voicing.semitones))
+
+
+class VoiceLeading():
+    """ Choice of the voicings of a sequence of chords minimising the motion of the voices
+
+    Each chord is given the best few voicings found by SearchVoicings as
+    candidates. A dynamic programme keeps, for every candidate, the cost of
+    the best sequence of voicings ending with it (sum of the voicing costs
+    and of the semitones travelled by the voices) and the candidate of the
+    previous chord on that sequence. Appending a chord costs O(k^2) for k
+    candidates per chord; the voicings are read back from the best candidate
+    of the last chord.
+
+    Chords whose voicing has been shown are pinned: the candidates of the
+    later chords whose best sequence goes through another voicing of the
+    pinned chord are discarded, so that the sequences read back afterwards
+    always agree with what was shown, without solving the window again.
+    """
+    def __init__(self, nbCandidates=8, motionWeight=1., costWeight=2., **searchParameters):
+        self.nbCandidates = nbCandidates
+        # Relative importance of the motion of the voices (per semitone) and
+        # of the cost of the voicings themselves
+        self.motionWeight = motionWeight
+        self.costWeight = costWeight
+        # Parameters passed to SearchVoicings
+        self.searchParameters = searchParameters
+        # Per chord: candidate voicings, cost of the best sequence ending with
+        # each of them and index of the previous candidate on that sequence
+        self.candidates = []
+        self.costs = []
+        self.previous = []
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def GetMotion(self, voicing, nextVoicing):
+        """ Number of semitones travelled by the voices (voicings with the same number of notes) """
+        return sum(abs(a - b) for (a, b) in zip(voicing.semitones, nextVoicing.semitones))
+
+    def Append(self, pitch, quality, enharmonic=False):
+        """ Add a chord (enharmonic: spelling of its key signature, see spelling.GetChordSpelling) """
+        candidates = SearchVoicings(pitch, quality, enharmonic=enharmonic, **self.searchParameters)[:self.nbCandidates]
+        costs = []
+        previous = []
+        if len(self.candidates) > 0:
+            lastCandidates = self.candidates[-1]
+            lastCosts = self.costs[-1]
+        else:
+            lastCandidates = []
+        for candidate in candidates:
+            best = None
+            bestIndex = None
+            for (index, lastCandidate) in enumerate(lastCandidates):
+                if lastCosts[index] is None or len(lastCandidate.semitones) != len(candidate.semitones):
+                    continue
+                cost = lastCosts[index] + self.motionWeight * self.GetMotion(lastCandidate, candidate)
+                if best is None or cost < best:
+                    best = cost
+                    bestIndex = index
+            if best is None:
+                # No way to connect to the previous chord: start a new sequence
+                best = 0.
+            costs.append(best + self.costWeight * candidate.cost)
+            previous.append(bestIndex)
+
+        self.candidates.append(candidates)
+        self.costs.append(costs)
+        self.previous.append(previous)
+
+    def Truncate(self, length):
+        """ Forget the chords from the given position on """
+        del self.candidates[length:]
+        del self.costs[length:]
+        del self.previous[length:]
+
+    def DropFirst(self, number):
+        """ Forget the first chords (their voicings are no longer needed) """
+        del self.candidates[:number]
+        del self.costs[:number]
+        del self.previous[:number]
+        if len(self.previous) > 0:
+            self.previous[0] = [None] * len(self.previous[0])
+
+    def GetChoices(self):
+        """ Index of the candidate chosen for each chord (None: no voicing available) """
+        choices = [None] * len(self.candidates)
+        choice = None
+        for position in range(len(self.candidates) - 1, -1, -1):
+            if choice is None:
+                # Best end of a sequence
+                costs = self.costs[position]
+                valid = [index for index in range(len(costs)) if costs[index] is not None]
+                if len(valid) > 0:
+                    choice = min(valid, key=lambda index: costs[index])
+            choices[position] = choice
+            if choice is not None:
+                choice = self.previous[position][choice]
+
+        return choices
+
+    def GetVoicing(self, position):
+        """ Voicing chosen for the chord at the given position (None if not available) """
+        choice = self.GetChoices()[position]
+        if choice is None:
+            return None
+
+        return self.candidates[position][choice]
+
+    def Pin(self, position, voicing):
+        """ Keep the given voicing for the chord at the given position """
+        if voicing not in self.candidates[position]:
+            return
+
+        kept = self.candidates[position].index(voicing)
+        costs = self.costs[position]
+        valid = [index == kept for index in range(len(costs))]
+        for index in range(len(costs)):
+            if not valid[index]:
+                costs[index] = None
+
+        # Discard the candidates of the later chords whose sequence went through another voicing
+        for later in range(position + 1, len(self.candidates)):
+            previous = self.previous[later]
+            costs = self.costs[later]
+            laterValid = []
+            for index in range(len(costs)):
+                isValid = costs[index] is not None and (previous[index] is None or valid[previous[index]])
+                if not isValid:
+                    costs[index] = None
+                laterValid.append(isValid)
+            valid = laterValid